@@ -0,0 +1,91 @@
+"""partition activity history by month
+
+Revision ID: e7a2b9d4f610
+Revises: c41a9e0b6f13
+Create Date: 2026-10-17 23:31:52.604117
+
+"""
+from datetime import date, datetime
+
+from alembic import op
+import sqlalchemy as sa
+from dateutil.relativedelta import relativedelta
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2b9d4f610'
+down_revision = 'c41a9e0b6f13'
+branch_labels = ()
+depends_on = None
+
+PARTITIONS_AHEAD = 3
+
+
+def _create_history(partitioned: bool):
+    op.create_table('activity_history',
+        sa.Column('activity_id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('start', sa.DateTime(), nullable=not partitioned),
+        sa.Column('env', sa.JSON(), nullable=True),
+        sa.Column('created', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['activity_id'], ['collection_builder.activities.id'], name=op.f('activity_history_activity_id_activities_fkey'), onupdate='CASCADE', ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['task_id'], ['celery_taskmeta.id'], name=op.f('activity_history_task_id_celery_taskmeta_fkey'), onupdate='CASCADE', ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint(*(['activity_id', 'task_id', 'start'] if partitioned else ['activity_id', 'task_id']), name=op.f('activity_history_pkey')),
+        schema='collection_builder',
+        **(dict(postgresql_partition_by='RANGE (start)') if partitioned else dict())
+    )
+    op.create_index(op.f('idx_collection_builder_activity_history_task_id'), 'activity_history', ['task_id'], unique=False, schema='collection_builder')
+    op.create_index(op.f('idx_collection_builder_activity_history_start'), 'activity_history', ['start'], unique=False, schema='collection_builder')
+    op.create_index(op.f('idx_collection_builder_activity_history_activity_id_start'), 'activity_history', ['activity_id', 'start'], unique=False, schema='collection_builder')
+
+
+def upgrade():
+    connection = op.get_bind()
+
+    op.rename_table('activity_history', 'activity_history_legacy', schema='collection_builder')
+    op.execute('ALTER TABLE collection_builder.activity_history_legacy RENAME CONSTRAINT activity_history_pkey TO activity_history_legacy_pkey')
+    op.drop_index(op.f('idx_collection_builder_activity_history_activity_id_start'), table_name='activity_history_legacy', schema='collection_builder')
+    op.drop_index(op.f('idx_collection_builder_activity_history_start'), table_name='activity_history_legacy', schema='collection_builder')
+    op.drop_index(op.f('idx_collection_builder_activity_history_task_id'), table_name='activity_history_legacy', schema='collection_builder')
+
+    _create_history(partitioned=True)
+
+    op.execute('CREATE TABLE collection_builder.activity_history_default PARTITION OF collection_builder.activity_history DEFAULT')
+
+    first = connection.execute('SELECT min(coalesce(start, created)) FROM collection_builder.activity_history_legacy').scalar()
+    today = datetime.utcnow()
+    month = date((first or today).year, (first or today).month, 1)
+    last = date(today.year, today.month, 1) + relativedelta(months=PARTITIONS_AHEAD)
+
+    while month <= last:
+        upper = month + relativedelta(months=1)
+        op.execute(f"CREATE TABLE collection_builder.activity_history_{month:%Y_%m} "
+                   f"PARTITION OF collection_builder.activity_history FOR VALUES FROM ('{month}') TO ('{upper}')")
+        month = upper
+
+    # The executions without start (never started) use the creation date as partition key
+    op.execute('''
+        INSERT INTO collection_builder.activity_history (activity_id, task_id, start, env, created, updated)
+        SELECT activity_id, task_id, coalesce(start, created AT TIME ZONE 'UTC'), env, created, updated
+          FROM collection_builder.activity_history_legacy
+    ''')
+    op.drop_table('activity_history_legacy', schema='collection_builder')
+
+
+def downgrade():
+    op.rename_table('activity_history', 'activity_history_partitioned', schema='collection_builder')
+    op.execute('ALTER TABLE collection_builder.activity_history_partitioned RENAME CONSTRAINT activity_history_pkey TO activity_history_partitioned_pkey')
+    op.drop_index(op.f('idx_collection_builder_activity_history_activity_id_start'), table_name='activity_history_partitioned', schema='collection_builder')
+    op.drop_index(op.f('idx_collection_builder_activity_history_start'), table_name='activity_history_partitioned', schema='collection_builder')
+    op.drop_index(op.f('idx_collection_builder_activity_history_task_id'), table_name='activity_history_partitioned', schema='collection_builder')
+
+    _create_history(partitioned=False)
+
+    op.execute('''
+        INSERT INTO collection_builder.activity_history (activity_id, task_id, start, env, created, updated)
+        SELECT DISTINCT ON (activity_id, task_id) activity_id, task_id, start, env, created, updated
+          FROM collection_builder.activity_history_partitioned
+         ORDER BY activity_id, task_id, start
+    ''')
+    # The partitions are removed with the partitioned table
+    op.drop_table('activity_history_partitioned', schema='collection_builder')
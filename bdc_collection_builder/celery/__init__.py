@@ -25,6 +25,7 @@ import flask
 from bdc_catalog.models import db
 from celery import Celery
 from flask import Flask
+from sqlalchemy.orm import Session
 
 from ..config import Config
 
@@ -96,18 +97,46 @@ def create_celery_app(flask_app: Flask):
             creates scoped session at startup.
             FMI: https://gist.github.com/twolfson/a1b329e9353f9b575131
             """
-            if flask_app.config['SQLALCHEMY_COMMIT_ON_TEARDOWN']:
-                if not isinstance(retval, Exception):
-                    db.session.commit()
-                else:
+            try:
+                if isinstance(retval, Exception):
                     try:
                         db.session.rollback()
                     except BaseException:
                         logging.warning('Error rollback transaction')
                         pass
+                elif flask_app.config['SQLALCHEMY_COMMIT_ON_TEARDOWN']:
+                    db.session.commit()
 
-            if not celery.conf.CELERY_ALWAYS_EAGER:
-                db.session.remove()
+                self.update_activity_status(task_id, status)
+            finally:
+                if not celery.conf.CELERY_ALWAYS_EAGER:
+                    db.session.remove()
+
+        @staticmethod
+        def update_activity_status(task_id, status):
+            """Update the latest activity status and the daily counters of the task execution.
+
+            The status is written in its own session, so the pending changes of the task
+            session are not committed with it. The hook runs after the task context,
+            so the engine is retrieved from the Flask app.
+            """
+            from ..collections.status import update_execution_status
+
+            session = None
+
+            try:
+                session = Session(bind=db.get_engine(flask_app))
+
+                if update_execution_status(task_id, status, session=session):
+                    session.commit()
+            except BaseException as e:
+                logging.warning(f'Could not update the activity status of task {task_id} - {str(e)}')
+
+                if session is not None:
+                    session.rollback()
+            finally:
+                if session is not None:
+                    session.close()
 
     celery.Task = ContextTask
 
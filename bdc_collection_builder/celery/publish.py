@@ -38,9 +38,11 @@ from geoalchemy2.shape import from_shape
 from numpngw import write_png
 from PIL import Image
 
+from ..collections.archive import (METADATA_PATTERNS, RASTER_EXTENSIONS,
+                                   ArchiveIndex, is_vsi_path, match)
 from ..collections.index_generator import generate_band_indexes
-from ..collections.utils import (generate_cogs, get_epsg_srid, get_or_create_model,
-                                 is_sen2cor, raster_convexhull, raster_extent)
+from ..collections.utils import (generate_cogs, generate_cogs_parallel, get_epsg_srid,
+                                 get_or_create_model, is_sen2cor, raster_footprint)
 from ..config import Config
 from ..constants import COG_MIME_TYPE, DEFAULT_SRID
 import re
@@ -174,6 +176,23 @@ def get_footprint_sentinel(mtd_file: str) -> shapely.geometry.Polygon:
     return shapely.geometry.Polygon(footprint_linear_ring)
 
 
+def _is_raster(path: Path) -> bool:
+    """Check if the given file is a raster file to be published as COG."""
+    return path.suffix.lower() in ('.tif', '.jp2')
+
+
+def _band_target_file(destination: Path, band_name: str, path: Path) -> Path:
+    """Retrieve the Cloud Optimized GeoTIFF path of a band file."""
+    basedir = destination.parent
+    filename, total_sub = re.subn('(MSIL1C|MSIL2A)', band_name, destination.name)
+
+    if total_sub == 0:  # fallback to default path handler, todo: review it as module path resolver
+        filename = path.stem
+        basedir = destination
+
+    return basedir / f'{filename}.tif'
+
+
 def generate_quicklook_pvi(safe_folder: Path, quicklook: Path):
     """Generate QuickLook preview from a Sentinel-2 PVI file."""
     pvi = list(safe_folder.rglob('**/*PVI*.jp2'))[0]
@@ -233,6 +252,9 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
 
     is_compressed = str(file).endswith('.zip') or str(file).endswith('.tar.gz')
     quicklook = None
+    archive = None
+
+    items_to_publish = kwargs['activity'].get('items_to_publish')
 
     if is_compressed:
         destination = data.compressed_file(collection, path_include_month=path_include_month).parent
@@ -245,10 +267,8 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
 
         file = file if file_path.exists() else destination_file
 
-        shutil.unpack_archive(
-            file,
-            temporary_dir.name
-        )
+        # Index the archive members once and extract only what is required to publish.
+        archive = ArchiveIndex(file)
 
         quicklook = Path(destination) / f'{scene_id}.png'
 
@@ -260,16 +280,28 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
         )
 
         if scene_id.startswith('S2'):
-            pvi = list(tmp.rglob('**/*PVI*.jp2'))[0]
-            band2 = list(tmp.rglob('**/*B02.jp2'))[0]
-            srid = get_epsg_srid(str(band2))
-
-            mtd = '**/MTD_MSIL1C.xml'
+            mtd = 'MTD_MSIL1C.xml'
             if '_MSIL2A_' in scene_id:
-                mtd = '**/MTD_MSIL2A.xml'
-            mtd = list(tmp.rglob(mtd))[0]
-
-            geom = from_shape(raster_extent(str(band2)), srid=4326)
+                mtd = 'MTD_MSIL2A.xml'
+
+            members = [archive.find('*PVI*.jp2'), archive.find(mtd)]
+            if items_to_publish:
+                # The extra assets are retrieved from the extracted tree (See data.get_assets).
+                # Only the rasters are left in archive, since they are read straight from there.
+                members.extend([
+                    member for member in archive.members
+                    if Path(member).suffix.lower() not in RASTER_EXTENSIONS and member not in members
+                ])
+
+            extracted = archive.extract(members, tmp)
+            pvi, mtd = extracted[members[0]], extracted[members[1]]
+
+            # Read band straight from archive. The Sentinel-2 footprint comes from MTD file.
+            band2 = archive.vsi_path(archive.find('*B02.jp2'))
+            footprint = raster_footprint(band2, with_convex_hull=False)
+            srid = footprint.srid
+
+            geom = from_shape(footprint.extent, srid=4326)
             convex_hull = from_shape(get_footprint_sentinel(str(mtd)), srid=4326)
 
             quicklook.parent.mkdir(exist_ok=True, parents=True)
@@ -282,13 +314,38 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
                 file=str(quicklook)
             )
         elif data.parser.source() in ('LC09', 'LC08', 'LE07', 'LT05', 'LT04'):
-            file_band_map = data.get_files(collection, path=tmp)
             band_ref = 'B2' if int(data.parser.level()) == 1 else 'SR_B2'
+            band_names = [b.name.upper() for b in collection.bands] + [band_ref]
+
+            def _is_required(member: str) -> bool:
+                if Path(member).suffix.lower() in RASTER_EXTENSIONS:
+                    return any(Path(member).stem.upper().endswith(f'_{band_name}') for band_name in band_names)
+                return match(member, *METADATA_PATTERNS)
+
+            # Index and extract in a single pass (tar.gz is read as a stream)
+            archive.extract_matching(_is_required, tmp)
+
+            file_band_map = data.get_files(collection, path=tmp)
+            # The bands which do not follow the suffix (QA, angles) require the entire archive.
+            # The index bands are generated later (See generate_band_indexes).
+            missing_bands = {
+                b.name for b in collection.bands
+                if not (b.metadata_ and b.metadata_.get('expression') and b.metadata_['expression'].get('value'))
+            }.union([band_ref]).difference(file_band_map)
+            if missing_bands:
+                logging.warning(f'Bands {", ".join(sorted(missing_bands))} not matched in {file}. '
+                                f'Extracting the entire archive.')
+                archive.extract_all(tmp)
+                file_band_map = data.get_files(collection, path=tmp)
+
             band2 = str(file_band_map[band_ref])
-            srid = get_epsg_srid(str(band2))
-            geom = from_shape(raster_extent(band2), srid=4326)
-            convex_hull = from_shape(raster_convexhull(band2, no_data=0), srid=4326)
+            footprint = raster_footprint(band2, no_data=0)
+            srid = footprint.srid
+            geom = from_shape(footprint.extent, srid=4326)
+            convex_hull = from_shape(footprint.convex_hull, srid=4326)
             file = Path(file).parent
+        else:
+            archive.extract_all(tmp)
     else:
         destination.mkdir(parents=True, exist_ok=True)
 
@@ -334,14 +391,12 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
             cloud_cover = item_result.cloud_cover
 
             ref = list(item_result.files.values())[0]
-            srid = get_epsg_srid(str(ref))
-
-            geom = from_shape(raster_extent(str(ref)), srid=4326)
-
-            with rasterio.open(ref) as d:
-                nodata = d.profile.get('nodata')
             # Trust in band metadata (no data)
-            convex_hull = raster_convexhull(str(ref), no_data=nodata)
+            footprint = raster_footprint(str(ref))
+            srid = footprint.srid
+
+            geom = from_shape(footprint.extent, srid=4326)
+            convex_hull = footprint.convex_hull
 
             if convex_hull.area > 0.0:
                 convex_hull = from_shape(convex_hull, srid=4326)
@@ -373,8 +428,6 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
         if not is_compressed:
             files = data.get_files(collection, path=file)
 
-    items_to_publish = kwargs['activity'].get('items_to_publish')
-
     extra_assets = data.get_assets(collection, path=file)
 
     if items_to_publish:
@@ -388,9 +441,13 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
         extra_assets['PVI'] = str(quicklook)
 
         for item in items_to_publish:
+            member = archive.find(item['pattern'])
 
-            files[item['name']] = list(tmp.rglob(item['pattern']))[0]
-
+            if Path(member).suffix.lower() in RASTER_EXTENSIONS:
+                # Translate to COG straight from archive
+                files[item['name']] = archive.vsi_path(member)
+            else:
+                files[item['name']] = archive.extract([member], tmp)[member]
 
     tile = Tile.query().filter(
         Tile.name == tile_id,
@@ -399,27 +456,26 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
 
     collection_band_map = {b.name: b for b in collection.bands}
 
+    # Translate all the raster bands at once. When any band fails, the item is not published.
+    cog_tasks = {
+        band_name: (str(file), str(_band_target_file(destination, band_name, Path(file))))
+        for band_name, file in files.items()
+        if _is_raster(Path(file)) and band_name not in ('AOT', 'WVP')
+    }
+    generate_cogs_parallel(cog_tasks, max_workers=Config.PUBLISH_COG_WORKERS)
+
     for band_name, file in files.items():
         path = Path(file)
         file = str(file)
 
         # TODO: Define way to identify raster to support others collection
-        is_raster = path.suffix.lower() in ('.tif', '.jp2')
+        is_raster = _is_raster(path)
 
         if is_raster:
-            basedir = destination.parent
-            filename, total_sub = re.subn('(MSIL1C|MSIL2A)', band_name, destination.name)
-
-            if total_sub == 0:  # fallback to default path handler, todo: review it as module path resolver
-                filename = path.stem
-                basedir = destination
-
-            target_file = basedir / f'{filename}.tif'
+            target_file = _band_target_file(destination, band_name, path)
 
             if band_name not in ('AOT', 'WVP'):
-                generate_cogs(file, target_file)
-
-                if str(target_file) != file:
+                if str(target_file) != file and not is_vsi_path(file):
                     os.remove(file)
 
                 if band_name in extra_assets:
@@ -452,9 +508,10 @@ def publish_collection_item(scene_id: str, data: BaseCollection, collection: Col
                 file_band_map[band.name] = file
 
                 if geom is None or convex_hull is None:
-                    geom = from_shape(raster_extent(file), srid=4326)
                     # Trust in band metadata (no data)
-                    convex_hull = raster_convexhull(file, no_data=band.nodata)
+                    footprint = raster_footprint(file, no_data=band.nodata)
+                    geom = from_shape(footprint.extent, srid=4326)
+                    convex_hull = footprint.convex_hull
 
                     if convex_hull.area > 0.0:
                         convex_hull = from_shape(convex_hull, srid=4326)
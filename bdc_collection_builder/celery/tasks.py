@@ -22,6 +22,7 @@ import logging
 import os
 import shutil
 import subprocess
+import time
 from datetime import datetime
 from pathlib import Path
 from tempfile import TemporaryDirectory
@@ -29,66 +30,40 @@ from tempfile import TemporaryDirectory
 from bdc_catalog.models import Collection, Item, db
 from bdc_collectors.base import BaseCollection
 from bdc_collectors.exceptions import DataOfflineError, DownloadError
-from celery import current_app, current_task
-from celery.backends.database import Task
+from celery import current_app, current_task, states
 from sentinelsat.exceptions import InvalidChecksumError
 
-from ..collections.collect import get_provider_order
-from ..collections.models import RadcorActivity, RadcorActivityHistory
+from ..collections.collect import DownloadRace, get_provider_order
+from ..collections.download import StagingArea, StagingLockError
+from ..collections.jobs import CheckScenesJob
+from ..collections.models import RadcorActivityHistory, RadcorSubmission
 from ..collections.processor import sen2cor
-from ..collections.utils import (get_or_create_model, get_provider,
-                                 is_valid_compressed_file, post_processing, safe_request)
+from ..collections.status import register_execution, upsert_execution
+from ..collections.utils import (get_provider, is_valid_compressed_file,
+                                 post_processing, safe_request)
 from ..config import Config
 from .publish import get_item_path, publish_collection_item
 
+_DOWNLOAD_RETRY_ERRORS = (DataOfflineError, InvalidChecksumError,)
+"""The errors which retry the download task."""
+
 
 def create_execution(activity):
     """Create a radcor activity once a celery task is running.
 
+    The Celery task, the activity (merging the ``args``) and the execution are written
+    in a single statement. See :func:`bdc_collection_builder.collections.status.upsert_execution`.
+
     Args:
         activity (dict) - Radcor activity as dict
     """
-    model = RadcorActivityHistory.query().filter(
-        RadcorActivityHistory.task.has(task_id=current_task.request.id)
-    ).first()
-
-    if model is None:
-        where = dict(
-            sceneid=activity.get('sceneid'),
-            activity_type=activity.get('activity_type'),
-            collection_id=activity.get('collection_id')
-        )
-
-        defaults = dict(
-            tags=activity.get('tags', []),
-            scene_type=activity.get('scene_type'),
-            sceneid=activity['sceneid']
-        )
-
-        activity.pop('history', None)
-        activity.pop('children', None)
-        activity.pop('parents', None)
-        activity.pop('id', None)
-        activity.pop('last_execution', None)
-
-        activity_model, _ = get_or_create_model(RadcorActivity, defaults=defaults, **where)
+    model = upsert_execution(activity, task_id=current_task.request.id)
 
-        model = RadcorActivityHistory()
+    logging.info(f"Task {model.task} - {model.task.task_id}")
 
-        task, _ = get_or_create_model(Task, defaults={}, task_id=current_task.request.id)
-        db.session.add(task)
-        logging.info(f"Task {task} - {task.task_id}")
+    register_execution(model, task_id=current_task.request.id)
 
-        model.task = task
-        model.activity = activity_model
-        model.start = datetime.utcnow()
-
-    # Ensure that args values is always updated
-    copy_args = dict(**model.activity.args or {})
-    copy_args.update(activity['args'] or dict())
-    model.activity.args = copy_args
-
-    model.save()
+    db.session.commit()
 
     return model
 
@@ -129,7 +104,7 @@ def refresh_execution_args(execution: RadcorActivityHistory, activity: dict, **k
 @current_app.task(
     queue=os.getenv('QUEUE_DOWNLOAD', 'download'),
     max_retries=int(os.getenv("TASK_RETRY_COUNT", "72")),
-    autoretry_for=(DataOfflineError, InvalidChecksumError,),
+    autoretry_for=_DOWNLOAD_RETRY_ERRORS + (StagingLockError,),
     default_retry_delay=Config.TASK_RETRY_DELAY
 )
 def download(activity: dict, **kwargs):
@@ -202,38 +177,75 @@ def download(activity: dict, **kwargs):
         else:
             download_file.parent.mkdir(exist_ok=True, parents=True)
 
-        with TemporaryDirectory(prefix='download_', suffix=f'_{scene_id}', dir=Config.WORKING_DIR) as tmp:
+        # Keep the partial files between retries. The providers which support resume continue from there.
+        # In the last attempt, the staged files are removed whatever the result.
+        last_attempt = download.request.retries >= download.max_retries
+        staging_area = StagingArea(scene_id, collection.id, validate=is_valid_compressed_file,
+                                   retry_errors=() if last_attempt else _DOWNLOAD_RETRY_ERRORS)
+
+        with staging_area as staging:
+            tmp = str(staging.path)
             temp_file: Path = None
 
             should_retry = False
+            download_stats = []
 
-            for collector in download_order:
-                try:
-                    logging.info(f'Trying to download from {collector.provider_name}(id={collector.instance.id})')
+            options = dict()
+            options['glob_pattern'] = activity['args']['glob_pattern']
 
-                    options = dict()
-                    options['glob_pattern'] = activity['args']['glob_pattern']
+            if Config.DOWNLOAD_RACE_PROVIDERS > 1 and len(download_order) > 1:
+                race = DownloadRace(download_order, max_providers=Config.DOWNLOAD_RACE_PROVIDERS,
+                                    hedge_delay=Config.DOWNLOAD_HEDGE_DELAY)
 
-                    with safe_request():
-                        temp_file = Path(collector.download(scene_id, output=tmp, kwargs=options))
+                logging.info(f'Racing download of {scene_id} in {[c.provider_name for c in race.collectors]}')
 
+                with safe_request():
+                    collector, temp_file = race.run(scene_id, tmp, kwargs=options)
+
+                download_stats = race.stats
+
+                if collector is not None:
                     activity['args']['provider_id'] = collector.instance.id
 
-                    break
-                except (DownloadError, DataOfflineError, InvalidChecksumError):
-                    should_retry = True
-                except Exception as e:
-                    logging.error(f'Download error in provider {collector.provider_name} - {str(e)}')
+                should_retry = any(isinstance(e, (DownloadError, DataOfflineError, InvalidChecksumError))
+                                   for e in race.errors)
+            else:
+                for collector in download_order:
+                    stats = dict(provider=collector.provider_name, provider_id=collector.instance.id, status='FAILURE')
+                    start = time.perf_counter()
+
+                    try:
+                        logging.info(f'Trying to download from {collector.provider_name}(id={collector.instance.id})')
+
+                        with safe_request():
+                            temp_file = Path(collector.download(scene_id, output=tmp, kwargs=options))
+
+                        activity['args']['provider_id'] = collector.instance.id
+                        stats['status'] = 'SUCCESS'
+
+                        break
+                    except (DownloadError, DataOfflineError, InvalidChecksumError) as e:
+                        stats['error'] = str(e)
+                        should_retry = True
+                    except Exception as e:
+                        stats['error'] = str(e)
+                        logging.error(f'Download error in provider {collector.provider_name} - {str(e)}')
+                    finally:
+                        stats['elapsed'] = round(time.perf_counter() - start, 3)
+                        download_stats.append(stats)
+
+            # Keep the latency of each provider to tune the provider priority
+            refresh_execution_args(execution, activity, download_stats=download_stats,
+                                   provider_id=activity['args'].get('provider_id'))
 
             if temp_file is None or not temp_file.exists():
                 if should_retry:
                     raise DataOfflineError(scene_id)
                 raise RuntimeError(f'Download fails {activity["sceneid"]}.')
 
+            staging.complete(temp_file)
+
             shutil.move(str(temp_file), str(download_file))
-        if tmp and Path(tmp).exists():
-            logging.info(f'Cleaning up {tmp}')
-            shutil.rmtree(tmp)
 
     refresh_execution_args(execution, activity, compressed_file=str(download_file))
 
@@ -429,3 +441,90 @@ def post(activity: dict, collection_id=None, **kwargs):
 
     return activity
 
+
+@current_app.task(queue=os.getenv('QUEUE_CHECK_SCENES', 'check-scenes'))
+def check_scenes(job_id: str, params: dict):
+    """Celery task to compare the provider scenes with the published items tile by tile.
+
+    The partial result of each tile is appended to the job as soon as it is processed.
+
+    Args:
+        job_id: The job identifier (See :class:`bdc_collection_builder.collections.jobs.CheckScenesJob`).
+        params: The parameters of ``CheckScenesForm``.
+    """
+    from ..controller import RadcorBusiness
+    from ..forms import CheckScenesForm
+
+    job = CheckScenesJob(job_id)
+
+    try:
+        data = CheckScenesForm().load(params)
+
+        total, tiles = RadcorBusiness.check_scenes_by_tile(**data)
+
+        job.start(total)
+
+        items = dict()
+        external_scenes = set()
+        errors = []
+
+        for tile_result in tiles:
+            job.push(tile_result)
+
+            external_scenes.update(tile_result['scenes'])
+            errors.extend(tile_result['errors'])
+
+            for collection, names in tile_result['items'].items():
+                items.setdefault(collection, set()).update(names)
+
+        job.finish(RadcorBusiness.check_scenes_report(items, external_scenes, errors))
+    except Exception as e:
+        logging.error(f'Check scenes job {job_id} failed - {str(e)}')
+        job.fail(str(e))
+        raise
+
+    return job_id
+
+
+@current_app.task(queue=os.getenv('QUEUE_DISPATCH', 'dispatch'))
+def dispatch_submission(submission_id: int):
+    """Celery task to process a radcor submission.
+
+    Search for the scenes, write the activities and publish the tasks in chunks
+    of ``Config.DISPATCH_CHUNK_SIZE``, updating the submission counters.
+
+    Args:
+        submission_id: The submission identifier (See :class:`bdc_collection_builder.collections.models.RadcorSubmission`).
+    """
+    from ..controller import RadcorBusiness
+    from ..forms import SearchImageForm
+
+    submission = RadcorSubmission.query().get(submission_id)
+
+    if submission is None:
+        logging.warning(f'Submission {submission_id} not found.')
+        return None
+
+    submission.status = states.STARTED
+    submission.started = datetime.utcnow()
+    submission.save()
+
+    try:
+        data = SearchImageForm().load(submission.args)
+
+        RadcorBusiness.radcor(data, submission=submission)
+    except Exception as e:
+        logging.error(f'Submission {submission_id} failed - {str(e)}')
+        db.session.rollback()
+
+        submission.status = states.FAILURE
+        submission.error = str(e)
+        submission.finished = datetime.utcnow()
+        submission.save()
+        raise
+
+    submission.status = states.SUCCESS
+    submission.finished = datetime.utcnow()
+    submission.save()
+
+    return submission_id
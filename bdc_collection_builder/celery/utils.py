@@ -18,7 +18,11 @@
 
 """Defines the utility functions to use among celery tasks."""
 
-from celery import current_app
+import itertools
+import time
+from typing import Callable, Iterable, Optional
+
+from celery import current_app, group
 from celery.backends.database.models import Task, TaskSet
 
 from bdc_collection_builder.config import Config
@@ -45,3 +49,51 @@ def load_celery_models():
     session = SessionManager()
     engine = session.get_engine(Config.SQLALCHEMY_DATABASE_URI)
     session.prepare_models(engine)
+
+
+def publish_in_chunks(signatures: Iterable, chunk_size: int = None, delay: float = None,
+                      on_publish: Optional[Callable[[int], None]] = None) -> int:
+    """Publish the task signatures (or canvases) in groups of ``chunk_size``.
+
+    The signatures are consumed lazily, so a generator keeps only a single chunk
+    of canvases in memory. Each chunk is published as an individual group message
+    and the next one waits ``delay`` seconds in order to feed the broker at a controlled rate.
+
+    Note:
+        The ``celery.chunks`` primitive is not used since it runs several items
+        in a single task message with the same task id. The collection builder tasks
+        create the activity execution by task id (``create_execution``) and retry
+        each scene individually, so every scene must have its own task.
+
+    Args:
+        signatures: The task signatures or canvases (one per scene).
+        chunk_size: Number of signatures per group. Default is ``Config.DISPATCH_CHUNK_SIZE``.
+        delay: Seconds between the chunks. Default is ``Config.DISPATCH_CHUNK_DELAY``.
+        on_publish: Optional callback called with the number of signatures of each published chunk.
+
+    Returns:
+        The number of signatures published.
+    """
+    chunk_size = max(1, chunk_size or Config.DISPATCH_CHUNK_SIZE)
+    delay = Config.DISPATCH_CHUNK_DELAY if delay is None else delay
+
+    iterator = iter(signatures)
+    total = 0
+
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+
+        if not chunk:
+            break
+
+        if total > 0 and delay > 0:
+            time.sleep(delay)
+
+        group(chunk).apply_async()
+
+        total += len(chunk)
+
+        if on_publish is not None:
+            on_publish(len(chunk))
+
+    return total
@@ -30,8 +30,12 @@ from bdc_catalog.models import Collection
 from flask.cli import FlaskGroup
 
 from . import create_app
+from .collections.cache import invalidate_search_cache as _invalidate_search_cache
 from .collections.collect import create_provider, get_provider_order
 from .collections.models import CollectionProviderSetting
+from .collections.partitions import archive_history_partitions, get_archive_partitions
+from .collections.partitions import create_history_partitions as _create_history_partitions
+from .collections.status import backfill_activity_status as _backfill_activity_status
 from .collections.utils import delete_collection_provider, get_provider, get_or_create_model
 
 
@@ -169,6 +173,86 @@ def overview(collection: str):
                     f'priority={entry.priority}, active={entry.active}')
 
 
+@cli.command('invalidate-search-cache')
+@click.option('--provider', type=click.STRING, required=False, help='The catalog (provider) name.')
+@click.option('--dataset', type=click.STRING, required=False, help='The dataset name. Requires --provider.')
+def invalidate_search_cache(provider: str = None, dataset: str = None):
+    """Remove the cached provider search results."""
+    if dataset and not provider:
+        raise click.BadParameter('Requires --provider to invalidate a dataset.')
+
+    total = _invalidate_search_cache(provider=provider, dataset=dataset)
+
+    click.secho(f'{total} cached searches removed.', fg='green', bold=True)
+
+
+@cli.command('backfill-activity-status')
+def backfill_activity_status():
+    """Rebuild the latest activity status and the daily execution counters from the execution history.
+
+    The tables are maintained by the tasks, so this command is only required when the
+    counters are out of sync (e.g. executions removed or tasks killed).
+    """
+    from bdc_catalog.models import db
+
+    result = _backfill_activity_status()
+    db.session.commit()
+
+    click.secho(f'{result["activities"]} activities and {result["daily"]} daily counters updated.',
+                fg='green', bold=True)
+
+
+@cli.command('create-history-partitions')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m']), required=False,
+              help='The first month (YYYY-MM). Default is the current month.')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m']), required=False,
+              help='The last month (YYYY-MM). Default is ACTIVITY_HISTORY_PARTITIONS_AHEAD months after start.')
+def create_history_partitions(start=None, end=None):
+    """Create the monthly partitions of the activity history.
+
+    Run it periodically (e.g. monthly cron), so the partitions exist before the executions of the month.
+    """
+    from bdc_catalog.models import db
+
+    created = _create_history_partitions(start=start, end=end)
+    db.session.commit()
+
+    for name in created:
+        click.secho(f'Partition {name} created.', fg='green')
+
+    click.secho(f'{len(created)} partitions created.', fg='green', bold=True)
+
+
+@cli.command('archive-history')
+@click.option('--before', type=click.DateTime(formats=['%Y-%m-%d', '%Y-%m']), required=True,
+              help='Archive the months which end before this date.')
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False, writable=True), required=False,
+              help='The output directory. Default is ACTIVITY_HISTORY_ARCHIVE_DIR.')
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              help='The archive format. Parquet requires "pyarrow".')
+@click.option('--keep', is_flag=True, default=False, help='Only export the partitions, without removing them.')
+@click.option('--dry-run', is_flag=True, default=False)
+def archive_history(before, output_dir=None, output_format='csv', keep=False, dry_run=False):
+    """Archive the old executions of the activity history to files and remove their partitions.
+
+    The Celery task meta of the archived executions are also removed.
+    """
+    if dry_run:
+        for partition in get_archive_partitions(before.date()):
+            click.secho(f'Partition {partition["name"]} (~{partition["rows"]} executions) would be archived.')
+
+        return
+
+    archived = archive_history_partitions(before.date(), directory=output_dir, output_format=output_format,
+                                          drop=not keep)
+
+    for partition in archived:
+        click.secho(f'Partition {partition["name"]}: {partition["rows"]} executions archived '
+                    f'in {partition["file"]}', fg='green')
+
+    click.secho(f'{len(archived)} partitions archived.', fg='green', bold=True)
+
+
 def main(as_module=False):
     """Load Brazil Data Cube (bdc_collection_builder) as module."""
     import sys
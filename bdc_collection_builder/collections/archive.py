@@ -0,0 +1,172 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to read the members of compressed scenes (zip/tar) without unpacking the whole archive."""
+
+import tarfile
+from pathlib import Path, PurePosixPath
+from typing import Callable, Dict, Iterable, List, Optional
+from zipfile import ZipFile, is_zipfile
+
+RASTER_EXTENSIONS = ('.tif', '.tiff', '.jp2')
+"""The member extensions which GDAL can read straight from archive."""
+
+METADATA_PATTERNS = ('*.xml', '*.txt', '*.json', '*MTL*')
+"""Patterns of the small metadata members usually required to publish a scene."""
+
+
+class ArchiveIndex:
+    """Index the members of a zip or tar archive once to extract or read them selectively.
+
+    Members are matched with the same semantics of :meth:`pathlib.Path.rglob`, which means
+    the pattern is matched from the right side of the member path (``**/`` prefixes are ignored).
+
+    The zip members are read from the central directory. The tar members are only known after a pass
+    through the archive, so the tar archives are read as a stream and indexed while extracting
+    (See :meth:`extract_matching`).
+
+    Example:
+        Read a band through GDAL without extraction and extract only the quicklook:
+
+        >>> archive = ArchiveIndex('/data/S2A_MSIL1C_20200101T132231_N0208_R038_T23LLF.zip')  # doctest: +SKIP
+        >>> band2 = archive.vsi_path(archive.find('*B02.jp2'))  # doctest: +SKIP
+        >>> files = archive.extract(archive.glob('*PVI*.jp2'), '/tmp/scene')  # doctest: +SKIP
+    """
+
+    def __init__(self, file_path: str):
+        """Build the archive index.
+
+        Raises:
+            IOError When the file is not a zip or tar archive.
+        """
+        self.file_path = Path(file_path).absolute()
+        self.is_zip = is_zipfile(str(self.file_path))
+        self._members = None
+
+        if self.is_zip:
+            with ZipFile(str(self.file_path)) as archive:
+                self._members = [info.filename for info in archive.infolist() if not info.is_dir()]
+        elif not tarfile.is_tarfile(str(self.file_path)):
+            raise IOError(f'File {str(file_path)} is not a supported archive.')
+
+    @property
+    def members(self) -> List[str]:
+        """Retrieve the file members of the archive.
+
+        For tar files which were not read yet, it requires a pass through the archive.
+        """
+        if self._members is None:
+            self.extract_matching(lambda member: False, None)
+
+        return self._members
+
+    def glob(self, *patterns: str) -> List[str]:
+        """Retrieve the members which match any of the given patterns."""
+        return [member for member in self.members if match(member, *patterns)]
+
+    def find(self, pattern: str) -> str:
+        """Retrieve the first member matching the pattern.
+
+        Raises:
+            FileNotFoundError When no member found.
+        """
+        members = self.glob(pattern)
+
+        if not members:
+            raise FileNotFoundError(f'No member "{pattern}" in {str(self.file_path)}')
+
+        return members[0]
+
+    def vsi_path(self, member: str) -> str:
+        """Retrieve the GDAL Virtual File System path to read the member without extraction.
+
+        See Also:
+            https://gdal.org/user/virtual_file_systems.html
+        """
+        prefix = '/vsizip/' if self.is_zip else '/vsitar/'
+
+        return f'{prefix}{str(self.file_path)}/{member}'
+
+    def extract(self, members: Iterable[str], destination: str) -> Dict[str, Path]:
+        """Extract only the given members into destination folder.
+
+        For tar files, all the members are extracted in a single pass through the archive.
+
+        Returns:
+            Map of member and the path of the extracted file. The path may differ from the member name,
+            since the unsafe names (absolute or with ``..``) are sanitized by zip.
+        """
+        members = set(members)
+
+        if not members:
+            return dict()
+
+        return self.extract_matching(lambda member: member in members, destination)
+
+    def extract_matching(self, predicate: Callable[[str], bool], destination: Optional[str]) -> Dict[str, Path]:
+        """Extract the members accepted by the predicate into destination folder.
+
+        The tar files are read as a stream (a single decompression pass), which also builds the member index.
+
+        Args:
+            predicate: Function which receives the member name and tells if it must be extracted.
+            destination: The destination folder.
+
+        Returns:
+            Map of member and the path of the extracted file.
+        """
+        extracted = dict()
+
+        if self.is_zip:
+            with ZipFile(str(self.file_path)) as archive:
+                for member in self.members:
+                    if predicate(member):
+                        extracted[member] = Path(archive.extract(member, str(destination)))
+
+            return extracted
+
+        members = []
+
+        with tarfile.open(str(self.file_path), mode='r|*') as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+
+                members.append(member.name)
+
+                if predicate(member.name):
+                    archive.extract(member, str(destination))
+                    extracted[member.name] = Path(destination) / member.name
+
+        self._members = members
+
+        return extracted
+
+    def extract_all(self, destination: str) -> Dict[str, Path]:
+        """Extract the entire archive into destination folder."""
+        return self.extract_matching(lambda member: True, destination)
+
+
+def match(member: str, *patterns: str) -> bool:
+    """Check if the archive member matches any of the given patterns (See :meth:`ArchiveIndex.glob`)."""
+    return any(PurePosixPath(member).match(pattern.replace('**/', '')) for pattern in patterns)
+
+
+def is_vsi_path(file_path: str) -> bool:
+    """Check if the given path points to a GDAL Virtual File System."""
+    return str(file_path).startswith('/vsi')
@@ -0,0 +1,509 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to cache the data provider search results.
+
+The cache is keyed by a canonical hash of the search parameters (provider, dataset, geometry, dates, cloud
+cover and extra arguments) and supports Redis or an in-process LRU (used when Redis is not available).
+
+The provider settings and the data collector instances are also cached in process
+(See :func:`get_provider_cache`).
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import shapely.geometry
+import shapely.wkt
+from shapely.geometry.base import BaseGeometry
+
+from ..config import Config
+
+KEY_PREFIX = 'search'
+"""Prefix of the search cache keys (``search:<provider>:<dataset>:<hash>``)."""
+
+PROVIDER_KEY_PREFIX = 'provider'
+"""Prefix of the provider cache keys (``provider:<kind>:<name>:<hash>``)."""
+
+PROVIDER_VERSION_KEY = f'{PROVIDER_KEY_PREFIX}:version'
+"""Redis key incremented whenever the provider settings change (See :func:`invalidate_provider_cache`)."""
+
+_DATE_KEYS = ('start', 'end', 'start_date', 'end_date')
+
+
+def _normalize(name: Optional[str], value: Any) -> Any:
+    """Normalize a search parameter value in order to generate the same key for equivalent searches."""
+    if isinstance(value, BaseGeometry):
+        return shapely.wkt.dumps(value, rounding_precision=6)
+    if isinstance(value, dict) and 'type' in value and 'coordinates' in value:
+        return _normalize(name, shapely.geometry.shape(value))
+    if isinstance(value, dict):
+        return {k: _normalize(k, v) for k, v in value.items() if v is not None}
+    if isinstance(value, (list, tuple, set)):
+        values = [_normalize(None, v) for v in value]
+        return sorted(values, key=str) if isinstance(value, set) else values
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return round(float(value), 6)
+    if isinstance(value, str) and name in _DATE_KEYS:
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    if isinstance(value, datetime):
+        value = value.replace(tzinfo=None)
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+
+    return value
+
+
+class CachedScene(dict):
+    """Scene rebuilt from the search cache.
+
+    It has the attributes used from ``bdc_collectors.base.SceneResult`` (``scene_id``, ``cloud_cover`` and ``link``).
+    """
+
+    @property
+    def scene_id(self) -> str:
+        """Retrieve the scene identifier."""
+        return self['scene_id']
+
+    @property
+    def cloud_cover(self) -> Optional[float]:
+        """Retrieve the scene cloud cover."""
+        return self['cloud_cover']
+
+    @property
+    def link(self) -> Optional[str]:
+        """Retrieve the scene download link."""
+        return self['link']
+
+
+def dump_scenes(scenes: Iterable[Any]) -> bytes:
+    """Serialize the scenes of a search result to JSON (only ``scene_id``, ``cloud_cover`` and ``link``).
+
+    Example:
+        >>> load_scenes(dump_scenes([CachedScene(scene_id='S2A', cloud_cover=10, link=None)]))
+        [{'scene_id': 'S2A', 'cloud_cover': 10, 'link': None}]
+    """
+    return json.dumps([
+        dict(scene_id=scene.scene_id, cloud_cover=scene.cloud_cover, link=scene.link) for scene in scenes
+    ], default=str).encode()
+
+
+def load_scenes(value: bytes) -> List[CachedScene]:
+    """Rebuild the scenes serialized by :func:`dump_scenes`."""
+    return [
+        CachedScene(scene_id=scene['scene_id'], cloud_cover=scene.get('cloud_cover'), link=scene.get('link'))
+        for scene in json.loads(value)
+    ]
+
+
+def search_key(provider: str, dataset: str, **params) -> str:
+    """Generate the cache key for a search.
+
+    Example:
+        >>> search_key('USGS', 'LC08_C01_T1', start_date='2020-01-01', bbox=[-54, -12, -53, -11], cloud_cover=100) \\
+        ...     == search_key('USGS', 'LC08_C01_T1', start_date='2020-01-01T00:00:00', bbox=(-54., -12., -53., -11.),
+        ...                   cloud_cover=100.0)
+        True
+    """
+    params = _normalize(None, params)
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    return f'{KEY_PREFIX}:{provider}:{dataset}:{digest}'
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with TTL, used when Redis is not available."""
+
+    def __init__(self, max_entries: int = 10000):
+        """Create the memory cache."""
+        self.max_entries = max_entries
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Retrieve the values of the given keys. The missing or expired ones are None."""
+        now = time.monotonic()
+        output = []
+
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+
+                if entry is None or entry[0] < now:
+                    self._data.pop(key, None)
+                    output.append(None)
+                    continue
+
+                self._data.move_to_end(key)
+                output.append(entry[1])
+
+        return output
+
+    def set_many(self, values: Dict[str, bytes], ttl: Dict[str, int]):
+        """Store the values with the respective TTL (seconds), evicting the least recently used keys."""
+        now = time.monotonic()
+
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (now + ttl[key], value)
+                self._data.move_to_end(key)
+
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete_matching(self, pattern_prefix: str) -> int:
+        """Remove the keys starting with the given prefix."""
+        with self._lock:
+            keys = [key for key in self._data if key.startswith(pattern_prefix)]
+
+            for key in keys:
+                del self._data[key]
+
+        return len(keys)
+
+
+class RedisCacheBackend:
+    """Redis cache backend.
+
+    The entries expire by TTL (``SET EX``) and a sorted set indexes the keys by expiry time
+    in order to bound the number of entries (the entries which expire first are evicted).
+    """
+
+    def __init__(self, client, max_entries: int = 10000):
+        """Create the redis cache backend."""
+        self.client = client
+        self.max_entries = max_entries
+        self.index_key = f'{KEY_PREFIX}:index'
+
+    def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Retrieve the values of the given keys with a single MGET."""
+        if not keys:
+            return []
+
+        return self.client.mget(keys)
+
+    def set_many(self, values: Dict[str, bytes], ttl: Dict[str, int]):
+        """Store the values in a single pipeline and evict the oldest entries when the cache is full."""
+        if not values:
+            return
+
+        now = time.time()
+
+        with self.client.pipeline() as pipe:
+            for key, value in values.items():
+                pipe.set(key, value, ex=ttl[key])
+
+            pipe.zadd(self.index_key, {key: now + ttl[key] for key in values})
+            # Remove the index of the expired entries
+            pipe.zremrangebyscore(self.index_key, '-inf', now)
+            pipe.zcard(self.index_key)
+
+            total = pipe.execute()[-1]
+
+        if total > self.max_entries:
+            oldest = self.client.zrange(self.index_key, 0, total - self.max_entries - 1)
+
+            with self.client.pipeline() as pipe:
+                pipe.delete(*oldest)
+                pipe.zrem(self.index_key, *oldest)
+                pipe.execute()
+
+    def delete_matching(self, pattern_prefix: str) -> int:
+        """Remove the keys starting with the given prefix."""
+        keys = list(self.client.scan_iter(match=f'{pattern_prefix}*', count=1000))
+
+        if keys:
+            with self.client.pipeline() as pipe:
+                pipe.delete(*keys)
+                pipe.zrem(self.index_key, *keys)
+                pipe.execute()
+
+        return len(keys)
+
+
+class SearchCache:
+    """Cache of the data provider search results.
+
+    The scenes are stored as JSON (See :func:`dump_scenes`) and read as :class:`CachedScene`.
+
+    Example:
+        >>> cache = SearchCache(MemoryCacheBackend())
+        >>> key = cache.key('USGS', 'LC08_C01_T1', tile='220069', start_date='2020-01-01')
+        >>> scene = CachedScene(scene_id='LC08_L1TP_220069_20200101_20200113_01_T1', cloud_cover=2.5, link=None)
+        >>> cache.set_many({key: [scene]}, provider='USGS')
+        >>> [scene.scene_id for scene in cache.get_many([key])[0]]
+        ['LC08_L1TP_220069_20200101_20200113_01_T1']
+
+    Args:
+        backend: The cache backend (:class:`RedisCacheBackend` or :class:`MemoryCacheBackend`).
+        ttl: Default time to live (seconds). Default is ``Config.SEARCH_CACHE_TTL``.
+        provider_ttl: Time to live by provider name. Default is ``Config.SEARCH_CACHE_PROVIDER_TTL``.
+    """
+
+    def __init__(self, backend, ttl: int = None, provider_ttl: Dict[str, int] = None):
+        """Create the search cache."""
+        self.backend = backend
+        self.ttl = ttl or Config.SEARCH_CACHE_TTL
+        self.provider_ttl = provider_ttl if provider_ttl is not None else Config.SEARCH_CACHE_PROVIDER_TTL
+
+    @staticmethod
+    def key(provider: str, dataset: str, **params) -> str:
+        """Generate the cache key for a search. See :func:`search_key`."""
+        return search_key(provider, dataset, **params)
+
+    def get_ttl(self, provider: str) -> int:
+        """Retrieve the time to live of the provider entries."""
+        return int(self.provider_ttl.get(provider, self.ttl))
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[CachedScene]]]:
+        """Retrieve the cached scenes. The missing (or unreadable) keys are None."""
+        output = []
+
+        try:
+            values = self.backend.get_many(keys)
+        except Exception as e:
+            logging.warning(f'Could not read the search cache - {str(e)}')
+            return [None] * len(keys)
+
+        for value in values:
+            try:
+                output.append(load_scenes(value) if value is not None else None)
+            except Exception:
+                output.append(None)
+
+        return output
+
+    def get(self, key: str) -> Optional[List[CachedScene]]:
+        """Retrieve the cached scenes or None."""
+        return self.get_many([key])[0]
+
+    def set_many(self, values: Dict[str, Iterable[Any]], provider: str = None):
+        """Store the search results (list of scenes)."""
+        ttl = self.get_ttl(provider)
+
+        try:
+            self.backend.set_many({key: dump_scenes(value) for key, value in values.items()},
+                                  {key: ttl for key in values})
+        except Exception as e:
+            logging.warning(f'Could not write the search cache - {str(e)}')
+
+    def set(self, key: str, value: Iterable[Any], provider: str = None):
+        """Store a search result (list of scenes)."""
+        self.set_many({key: value}, provider=provider)
+
+    def invalidate(self, provider: str = None, dataset: str = None) -> int:
+        """Remove the cached searches of a provider (and dataset). Without arguments, removes all the entries.
+
+        Returns:
+            The number of entries removed.
+        """
+        prefix = f'{KEY_PREFIX}:'
+
+        if provider:
+            prefix += f'{provider}:'
+
+            if dataset:
+                prefix += f'{dataset}:'
+
+        return self.backend.delete_matching(prefix)
+
+
+def provider_key(kind: str, name: str, **params) -> str:
+    """Generate the key of a cached provider setting (``kind=setting``) or data collector instance.
+
+    The parameters (like the credentials) are hashed, so the keys do not expose them.
+
+    Example:
+        >>> provider_key('collector', 'SciHub', credentials=dict(username='user', password='secret'), lazy=True) \\
+        ...     == provider_key('collector', 'SciHub', lazy=True, credentials=dict(password='secret', username='user'))
+        True
+    """
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+    return f'{PROVIDER_KEY_PREFIX}:{kind}:{name}:{digest}'
+
+
+_redis_connection = None
+_search_cache: Optional[SearchCache] = None
+_provider_cache: Optional[MemoryCacheBackend] = None
+_provider_version: Optional[int] = None
+_provider_version_error = float('-inf')
+_provider_version_checked = float('-inf')
+_PROVIDER_VERSION_RETRY = 30
+_lock = threading.Lock()
+
+
+def get_redis_connection():
+    """Retrieve the Redis connection of Flask application or create one from ``Config.REDIS_URL``.
+
+    The Celery workers do not run ``before_first_request``, so they use their own connection.
+    """
+    global _redis_connection
+
+    from flask import current_app, has_app_context
+
+    if has_app_context() and getattr(current_app, 'redis', None) is not None:
+        return current_app.redis
+
+    with _lock:
+        if _redis_connection is None:
+            import redis
+
+            _redis_connection = redis.from_url(Config.REDIS_URL)
+
+    return _redis_connection
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Retrieve the search cache of the process.
+
+    It uses Redis when ``Config.SEARCH_CACHE_BACKEND`` is ``redis`` and the server is available.
+    Otherwise, the searches are cached in memory.
+
+    Returns:
+        The search cache or None when ``Config.SEARCH_CACHE_ENABLED`` is not set.
+    """
+    global _search_cache
+
+    if not Config.SEARCH_CACHE_ENABLED:
+        return None
+
+    with _lock:
+        if _search_cache is not None:
+            return _search_cache
+
+    backend = None
+
+    if Config.SEARCH_CACHE_BACKEND == 'redis':
+        try:
+            client = get_redis_connection()
+            client.ping()
+            backend = RedisCacheBackend(client, max_entries=Config.SEARCH_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            logging.warning(f'Redis is not available for search cache ({str(e)}). Using memory cache.')
+
+    with _lock:
+        if _search_cache is None:
+            _search_cache = SearchCache(backend or MemoryCacheBackend(max_entries=Config.SEARCH_CACHE_MAX_ENTRIES))
+
+        return _search_cache
+
+
+def invalidate_search_cache(provider: str = None, dataset: str = None) -> int:
+    """Remove the cached searches of a provider (and dataset). See :meth:`SearchCache.invalidate`."""
+    cache = get_search_cache()
+
+    return cache.invalidate(provider=provider, dataset=dataset) if cache is not None else 0
+
+
+def _get_provider_version() -> Optional[int]:
+    """Retrieve the version of the provider settings shared in Redis or None when Redis is not available.
+
+    The version is read from Redis at most once every ``Config.PROVIDER_CACHE_VERSION_INTERVAL`` seconds.
+    In the meantime, the version already known by the process is returned.
+    Once Redis fails, it is not requested again for ``_PROVIDER_VERSION_RETRY`` seconds.
+    """
+    global _provider_version_checked, _provider_version_error
+
+    now = time.monotonic()
+
+    if now - _provider_version_error < _PROVIDER_VERSION_RETRY:
+        return None
+
+    if now - _provider_version_checked < Config.PROVIDER_CACHE_VERSION_INTERVAL:
+        return _provider_version
+
+    _provider_version_checked = now
+
+    try:
+        return int(get_redis_connection().get(PROVIDER_VERSION_KEY) or 0)
+    except Exception as e:
+        logging.warning(f'Could not read the provider cache version - {str(e)}')
+        _provider_version_error = time.monotonic()
+        return None
+
+
+def get_provider_cache() -> Optional[MemoryCacheBackend]:
+    """Retrieve the in-process cache of provider settings and data collector instances.
+
+    The cache is not shared between processes: each process keeps its own entries for
+    ``Config.PROVIDER_CACHE_TTL`` seconds. The entries are dropped once the version of the
+    provider settings in Redis changes (See :func:`invalidate_provider_cache`), which is checked
+    every ``Config.PROVIDER_CACHE_VERSION_INTERVAL`` seconds. When Redis is not available,
+    the changes made by other processes are only seen after the TTL.
+
+    Returns:
+        The cache or None when ``Config.PROVIDER_CACHE_TTL`` is 0.
+    """
+    global _provider_cache, _provider_version
+
+    if Config.PROVIDER_CACHE_TTL <= 0:
+        return None
+
+    version = _get_provider_version()
+
+    with _lock:
+        if _provider_cache is None:
+            _provider_cache = MemoryCacheBackend(max_entries=Config.PROVIDER_CACHE_MAX_ENTRIES)
+
+        if version is not None and version != _provider_version:
+            _provider_cache.delete_matching(f'{PROVIDER_KEY_PREFIX}:')
+            _provider_version = version
+
+        return _provider_cache
+
+
+def invalidate_provider_cache() -> int:
+    """Remove the cached provider settings and data collector instances.
+
+    The version of the provider settings in Redis is incremented, so every process (API and workers)
+    drops its entries on the next read.
+
+    Returns:
+        The number of entries removed in the current process.
+    """
+    if Config.PROVIDER_CACHE_TTL <= 0:
+        return 0
+
+    global _provider_version
+
+    version = None
+
+    try:
+        version = int(get_redis_connection().incr(PROVIDER_VERSION_KEY))
+    except Exception as e:
+        logging.warning(f'Could not notify the provider cache invalidation - {str(e)}. '
+                        f'The other processes keep their entries up to {Config.PROVIDER_CACHE_TTL} seconds.')
+
+    with _lock:
+        if version is not None:
+            _provider_version = version
+
+        return _provider_cache.delete_matching(f'{PROVIDER_KEY_PREFIX}:') if _provider_cache is not None else 0
@@ -19,13 +19,20 @@
 """Module to deal with BDC-Collector integration."""
 
 import logging
-from typing import Any, List, Type, Tuple
+import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
 
 from bdc_catalog.models import Provider, db
 from bdc_collectors.base import BaseProvider
 
+from ..config import Config
+from .cache import invalidate_provider_cache
 from .models import CollectionProviderSetting, ProviderSetting
-from .utils import get_provider_type
+from .utils import get_provider_instance, get_provider_type, is_valid_compressed_file
 
 
 class DataCollector:
@@ -36,16 +43,12 @@ class DataCollector:
     _collection_provider: Any
 
     def __init__(self, instance, provider: Type[BaseProvider], collection_provider: Any, **kwargs):
-        """Create a data collector instance."""
-        self._db_provider = instance
-
-        if isinstance(instance.credentials, dict):
-            copy_args = instance.credentials.copy()
-            copy_args.update(**kwargs)
+        """Create a data collector instance.
 
-            self._provider = provider(**copy_args)
-        else:
-            self._provider = provider(*instance.credentials, **kwargs)
+        The provider instance is reused while cached in process (See :func:`.utils.get_provider_instance`).
+        """
+        self._db_provider = instance
+        self._provider = get_provider_instance(provider, instance.credentials, **kwargs)
 
         self._collection_provider = collection_provider
 
@@ -137,6 +140,131 @@ def get_provider_order(collection: Any, include_inactive=False, **kwargs) -> Lis
     return result
 
 
+class DownloadRace:
+    """Download a scene from several providers concurrently and keep the first valid file.
+
+    The providers are started following the given order. With ``hedge_delay`` greater than zero,
+    the next provider is only started when the running ones did not finish after the delay (hedged requests).
+    Each provider writes into its own sub directory of ``output`` and, once a provider wins, the
+    pending providers are cancelled and the files of the other providers are removed.
+
+    Note:
+        The running downloads can not be interrupted since ``bdc_collectors`` drivers do not support
+        cancellation. The losers are signaled to discard their files and :meth:`run` waits for them
+        up to ``cancel_timeout`` seconds, so they do not write into ``output`` once the race returns.
+        The losers which still run after that are left in background and their files are removed as they finish.
+
+    Args:
+        collectors: The ordered list of DataCollector (See :func:`get_provider_order`).
+        max_providers: Maximum number of providers racing.
+        hedge_delay: Seconds to wait before starting the next provider. Use 0 to start all at once.
+        validate: Function to check the downloaded file. Default is :func:`is_valid_compressed_file`.
+        cancel_timeout: Seconds to wait for the losers once the race has a winner.
+            Default is ``Config.DOWNLOAD_RACE_CANCEL_TIMEOUT``.
+    """
+
+    def __init__(self, collectors: List[DataCollector], max_providers: int = 2, hedge_delay: float = 0,
+                 validate: Callable[[str], bool] = None, cancel_timeout: float = None):
+        """Create a download race."""
+        self.collectors = collectors[:max(1, max_providers)]
+        self.hedge_delay = hedge_delay
+        self.validate = validate or is_valid_compressed_file
+        self.cancel_timeout = Config.DOWNLOAD_RACE_CANCEL_TIMEOUT if cancel_timeout is None else cancel_timeout
+        self.stats: List[Dict[str, Any]] = []
+        self.errors: List[Exception] = []
+        self._finished = threading.Event()
+
+    def _download(self, collector: DataCollector, provider_name: str, scene_id: str,
+                  output: Path, **kwargs) -> Optional[Path]:
+        if self._finished.is_set():
+            return None
+
+        output.mkdir(parents=True, exist_ok=True)
+        stats = dict(provider=provider_name, provider_id=collector.instance.id, status='FAILURE')
+        start = time.perf_counter()
+
+        try:
+            file_path = Path(collector.download(scene_id, output=str(output), **kwargs))
+
+            if not file_path.exists() or (file_path.is_file() and not self.validate(str(file_path))):
+                raise IOError(f'Invalid file {str(file_path)} downloaded from {provider_name}')
+
+            stats['status'] = 'SUCCESS'
+
+            return file_path
+        except Exception as e:
+            stats['error'] = str(e)
+            self.errors.append(e)
+            raise
+        finally:
+            stats['elapsed'] = round(time.perf_counter() - start, 3)
+            self.stats.append(stats)
+
+            logging.info(f'Download {scene_id} from {provider_name}: {stats["status"]} in {stats["elapsed"]}s')
+
+            # The race has a winner already: remove the late files
+            if self._finished.is_set() and output.exists():
+                shutil.rmtree(str(output), ignore_errors=True)
+
+    def run(self, scene_id: str, output: str, **kwargs) -> Tuple[Optional[DataCollector], Optional[Path]]:
+        """Start the race.
+
+        Args:
+            scene_id: The scene identifier.
+            output: Directory to store the downloaded files.
+            **kwargs: Extra parameters to the collector download.
+
+        Returns:
+            The winner DataCollector and the downloaded file. Both are None when all providers fail.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(self.collectors), thread_name_prefix='download')
+        pending = list(enumerate(self.collectors))
+        running = dict()
+        winner = None, None
+
+        try:
+            while pending or running:
+                if pending:
+                    idx, collector = pending.pop(0)
+                    name = collector.provider_name
+                    future = executor.submit(self._download, collector, name, scene_id,
+                                             Path(output) / f'{idx}_{name}', **kwargs)
+                    running[future] = idx, collector
+
+                    # Start the next provider right away in concurrent mode or when there is nothing running.
+                    if self.hedge_delay <= 0 and pending:
+                        continue
+
+                done, _ = wait(list(running), timeout=self.hedge_delay if pending else None,
+                               return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    idx, collector = running.pop(future)
+
+                    if future.exception() is None:
+                        winner = collector, future.result()
+                        break
+
+                if winner[0] is not None:
+                    break
+        finally:
+            self._finished.set()
+
+            started = [future for future in running if not future.cancel()]
+            _, not_done = wait(started, timeout=self.cancel_timeout)
+
+            for future, (idx, collector) in running.items():
+                if future in not_done:
+                    logging.warning(f'Download {scene_id} from {collector.provider_name} still running after '
+                                    f'{self.cancel_timeout}s. Its files are removed when it finishes.')
+                else:
+                    shutil.rmtree(str(Path(output) / f'{idx}_{collector.provider_name}'), ignore_errors=True)
+
+            executor.shutdown(wait=False)
+
+        return winner
+
+
 def create_provider(name: str, driver_name: str,
                     url: str = None, description: str = None,
                     update: bool = False, **credentials) -> Tuple[ProviderSetting, bool]:
@@ -149,6 +277,7 @@ def create_provider(name: str, driver_name: str,
                     provider_setting.driver_name = driver_name
                     provider_setting.credentials = credentials
                 db.session.commit()
+                invalidate_provider_cache()
 
             return provider_setting, False
 
@@ -166,4 +295,6 @@ def create_provider(name: str, driver_name: str,
         provider_setting.save(commit=False)
 
     db.session.commit()
+    invalidate_provider_cache()
+
     return provider_setting, True
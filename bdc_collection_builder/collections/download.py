@@ -0,0 +1,348 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to keep partial downloads between task retries and resume them."""
+
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Type
+
+import requests
+
+from ..config import Config
+
+CHECKPOINT_FILE = '.checkpoint.json'
+"""Name of the file which tracks the progress of a staged download."""
+
+
+class StagingLockError(RuntimeError):
+    """Error raised when the staging directory is locked by another task for too long."""
+
+
+class StagingArea:
+    """Persistent directory to download a scene of a collection, kept between the task retries.
+
+    Differently of :class:`tempfile.TemporaryDirectory`, the directory is only removed when the
+    download finishes with success or fails with an error which is not retried. The partial files
+    are kept in order to be resumed in the next retry by the providers which support it
+    (or by :func:`resumable_download`).
+    The progress (attempts, last error, staged bytes and the files in progress) is tracked in a checkpoint file.
+
+    The directory is locked while in use, so the concurrent tasks of the same scene wait for each other,
+    up to ``lock_timeout`` seconds.
+
+    Example:
+        >>> with StagingArea('LC08_L1TP_220069_20200101_20200113_01_T1', collection_id=1) as staging:  # doctest: +SKIP
+        ...     file_path = collector.download(scene_id, output=str(staging.path))
+
+    Args:
+        scene_id: The scene identifier.
+        collection_id: The collection identifier.
+        base_dir: The staging directory. Default is ``Config.DOWNLOAD_STAGING_DIR``.
+        validate: Function to check the integrity of the files completed by a previous attempt
+            (See :meth:`complete`). The invalid files are removed before the download
+            (See :func:`.utils.is_valid_compressed_file`). The files in progress are kept to be resumed.
+        retry_errors: The errors which keep the partial files for the next retry.
+            Use an empty tuple in the last attempt, so the directory is always removed.
+        lock_timeout: Seconds to wait for the lock of the staging directory.
+            Default is ``Config.DOWNLOAD_STAGING_LOCK_TIMEOUT``.
+
+    Raises:
+        StagingLockError When the lock is not acquired in ``lock_timeout`` seconds.
+    """
+
+    def __init__(self, scene_id: str, collection_id: int, base_dir: str = None,
+                 validate: Optional[Callable[[str], bool]] = None,
+                 retry_errors: Tuple[Type[BaseException], ...] = (Exception,),
+                 lock_timeout: float = None):
+        """Create the staging area for the given scene."""
+        self.scene_id = scene_id
+        self.collection_id = collection_id
+        self.path = Path(base_dir or Config.DOWNLOAD_STAGING_DIR) / str(collection_id) / scene_id
+        self.validate = validate
+        self.retry_errors = retry_errors
+        self.lock_timeout = Config.DOWNLOAD_STAGING_LOCK_TIMEOUT if lock_timeout is None else lock_timeout
+        self.progress = dict()
+        self._lock_fd = None
+
+    @property
+    def checkpoint_file(self) -> Path:
+        """Retrieve the path to the checkpoint file."""
+        return self.path / CHECKPOINT_FILE
+
+    @property
+    def lock_file(self) -> Path:
+        """Retrieve the path to the lock file of the staging directory."""
+        return self.path.with_name(f'{self.path.name}.lock')
+
+    def staged_files(self):
+        """List the files already staged for the scene."""
+        return [entry for entry in self.path.rglob('*') if entry.is_file() and entry.name != CHECKPOINT_FILE]
+
+    def staged_bytes(self) -> int:
+        """Retrieve the amount of bytes already staged for the scene."""
+        return sum(entry.stat().st_size for entry in self.staged_files())
+
+    def checkpoint(self, **kwargs):
+        """Update the progress of the download."""
+        self.progress.update(**kwargs)
+        self.progress['updated'] = datetime.utcnow().isoformat()
+
+        self.checkpoint_file.write_text(json.dumps(self.progress))
+
+    def complete(self, file_path):
+        """Mark a staged file as completely downloaded.
+
+        The completed files are checked with ``validate`` in the next retry.
+        The other staged files are in progress and kept to be resumed.
+        """
+        try:
+            name = str(Path(file_path).relative_to(self.path))
+        except ValueError:
+            return  # Not staged
+
+        completed = self.progress.get('completed', [])
+
+        if name not in completed:
+            self.checkpoint(completed=completed + [name])
+
+    def _lock(self):
+        """Wait for the exclusive lock of the staging directory, up to ``lock_timeout`` seconds."""
+        self.lock_file.parent.mkdir(parents=True, exist_ok=True)
+
+        deadline = time.monotonic() + self.lock_timeout
+
+        while True:
+            fd = os.open(str(self.lock_file), os.O_CREAT | os.O_RDWR)
+
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+
+                if time.monotonic() >= deadline:
+                    raise StagingLockError(f'Staging directory {str(self.path)} is locked by another task '
+                                           f'for more than {self.lock_timeout} seconds')
+
+                time.sleep(0.1)
+                continue
+
+            try:
+                # The lock file may be removed by the previous holder while waiting
+                if os.fstat(fd).st_ino == os.stat(str(self.lock_file)).st_ino:
+                    self._lock_fd = fd
+                    return
+            except FileNotFoundError:
+                pass
+
+            os.close(fd)
+
+    def _unlock(self):
+        """Release the lock of the staging directory."""
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def _remove(self):
+        """Remove the staging directory and its lock file."""
+        shutil.rmtree(str(self.path), ignore_errors=True)
+
+        try:
+            self.lock_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _discard_invalid(self):
+        """Remove the completed files which fail the integrity check.
+
+        The files in progress are not checked, since a partial archive is never valid.
+        """
+        completed = self.progress.pop('completed', [])
+
+        for name in completed:
+            entry = self.path / name
+
+            if entry.is_file() and not self.validate(str(entry)):
+                logging.warning(f'Removing invalid staged file {str(entry)}')
+                entry.unlink()
+
+    def __enter__(self):
+        """Lock and prepare the staging directory and restore the previous progress."""
+        self._lock()
+
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            if self.checkpoint_file.exists():
+                try:
+                    self.progress = json.loads(self.checkpoint_file.read_text())
+                except ValueError:
+                    self.progress = dict()
+
+            attempt = self.progress.get('attempts', 0) + 1
+
+            if attempt > 1:
+                if self.validate is not None:
+                    self._discard_invalid()
+
+                logging.info(f'Resuming download of {self.scene_id} (attempt {attempt}, '
+                             f'{self.staged_bytes()} bytes staged in {str(self.path)})')
+
+            self.checkpoint(attempts=attempt)
+        except BaseException:
+            self._unlock()
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Remove the staging directory or keep the partial files for the next retry."""
+        try:
+            if exc_type is None or not isinstance(exc_val, self.retry_errors):
+                if exc_type is not None:
+                    logging.warning(f'Removing staged files of {self.scene_id} - {str(exc_val)}')
+
+                self._remove()
+            elif self.path.exists():
+                completed = self.progress.get('completed', [])
+                in_progress = [
+                    str(entry.relative_to(self.path)) for entry in self.staged_files()
+                    if str(entry.relative_to(self.path)) not in completed
+                ]
+
+                self.checkpoint(staged_bytes=self.staged_bytes(), in_progress=in_progress, error=str(exc_val))
+        finally:
+            self._unlock()
+
+
+def _checkpoint_path(target: Path) -> Path:
+    return target.with_name(f'{target.name}.checkpoint.json')
+
+
+def resumable_download(url: str, target: str, session: Optional[requests.Session] = None,
+                       chunk_size: int = 64 * 1024, max_retries: int = 5,
+                       retry_delay: float = 1, **request_options) -> Path:
+    """Download a file through HTTP, resuming the partial file with HTTP Range requests.
+
+    The data is written into ``<target>.part`` and the progress is stored in ``<target>.checkpoint.json``.
+    When the server does not support range requests, or the remote file changed (ETag/Last-Modified),
+    the download is restarted from the first byte.
+
+    Args:
+        url: The URL to download.
+        target: The final file path.
+        session: Optional requests session (authentication, cookies).
+        chunk_size: Size of the chunks written to the partial file.
+        max_retries: Number of times to resume an interrupted transfer in the same call.
+        retry_delay: Seconds to wait before resuming.
+        **request_options: Extra parameters to ``session.get``.
+
+    Returns:
+        The target path.
+
+    Raises:
+        requests.exceptions.RequestException When the transfer can not be completed after all retries.
+    """
+    target = Path(target)
+    partial = target.with_name(f'{target.name}.part')
+    checkpoint_file = _checkpoint_path(target)
+    session = session or requests.Session()
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    checkpoint = dict()
+    if checkpoint_file.exists() and partial.exists():
+        try:
+            checkpoint = json.loads(checkpoint_file.read_text())
+        except ValueError:
+            checkpoint = dict()
+
+    if checkpoint.get('url') != url:
+        checkpoint = dict(url=url)
+
+        if partial.exists():
+            partial.unlink()
+
+    base_headers = request_options.pop('headers', None) or dict()
+    attempt = 0
+
+    while True:
+        offset = partial.stat().st_size if partial.exists() else 0
+        headers = dict(**base_headers)
+
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            # Only resume if the remote file is the same
+            validator = checkpoint.get('etag') or checkpoint.get('last_modified')
+            if validator:
+                headers['If-Range'] = validator
+
+        try:
+            with session.get(url, headers=headers, stream=True, **request_options) as response:
+                if response.status_code == 416 and offset and offset == checkpoint.get('size'):
+                    break  # Already complete
+
+                response.raise_for_status()
+
+                if offset and response.status_code != 206:
+                    logging.info(f'Server does not resume {url}. Restarting from the first byte.')
+                    offset = 0
+
+                if response.status_code != 206:
+                    length = response.headers.get('Content-Length')
+                    checkpoint.update(
+                        size=int(length) if length is not None else None,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified')
+                    )
+                elif offset:
+                    logging.info(f'Resuming {url} from byte {offset}')
+
+                checkpoint_file.write_text(json.dumps(checkpoint))
+
+                with partial.open('ab' if offset else 'wb') as fd:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        fd.write(chunk)
+
+            size = checkpoint.get('size')
+            if size is not None and partial.stat().st_size < size:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f'Incomplete transfer {partial.stat().st_size}/{size} bytes of {url}'
+                )
+
+            break
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            attempt += 1
+
+            if attempt > max_retries:
+                raise
+
+            logging.warning(f'Transfer of {url} interrupted ({str(e)}). Retrying {attempt}/{max_retries}')
+            time.sleep(retry_delay)
+
+    partial.replace(target)
+    checkpoint_file.unlink()
+
+    return target
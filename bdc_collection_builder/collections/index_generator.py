@@ -26,7 +26,7 @@ import numpy
 import rasterio
 from bdc_catalog.models import Band, Collection
 
-from ..interpreter import execute_expression
+from ..interpreter import compile_expression
 from .utils import generate_cogs
 
 BandMapFile = Dict[str, str]
@@ -64,6 +64,9 @@ def generate_band_indexes(scene_id: str, collection: Collection, scenes: dict) -
     Notes:
         When collection does not have any index band, returns empty dict.
 
+        The source bands are read block by block only once and all the expressions are evaluated
+        against the same block, writing to the index band files in the same pass.
+
     Raises:
         RuntimeError when an error occurs while interpreting the band expression in Python Virtual Machine.
 
@@ -79,6 +82,22 @@ def generate_band_indexes(scene_id: str, collection: Collection, scenes: dict) -
     if not collection_band_indexes:
         return dict()
 
+    # Parse and compile the expressions only once per collection
+    expressions = dict()
+    used_bands = set()
+
+    for band_index in collection_band_indexes:
+        band_name = band_index.name
+
+        try:
+            expressions[band_name] = compile_expression(band_index.metadata_['expression']['value'])
+            used_bands.update(expressions[band_name].names)
+        except Exception as e:
+            logging.warning(f'Could not generate band {band_name} due {str(e)}')
+
+    if not expressions:
+        return dict()
+
     map_data_set_context = dict()
     profile = None
     blocks = []
@@ -86,64 +105,97 @@ def generate_band_indexes(scene_id: str, collection: Collection, scenes: dict) -
     base_path = None
 
     for band_name, file_path in scenes.items():
-        map_data_set_context[band_name] = AutoCloseDataSet(str(file_path), mode='r')
-
         if profile is None:
-            profile = map_data_set_context[band_name].dataset.profile.copy()
-            blocks = list(map_data_set_context[band_name].dataset.block_windows())
+            with rasterio.open(str(file_path)) as ref_dataset:
+                profile = ref_dataset.profile.copy()
+                blocks = list(ref_dataset.block_windows())
 
             base_path = Path(file_path).parent
 
-    output = dict()
+        # Only open the bands referenced by any expression
+        if band_name in used_bands:
+            map_data_set_context[band_name] = AutoCloseDataSet(str(file_path), mode='r')
+
+    outputs = dict()
+    data_type_ranges = dict()
 
     for band_index in collection_band_indexes:
         band_name = band_index.name
 
+        if band_name not in expressions:
+            continue
+
         custom_band_path = base_path / f'{scene_id}_{band_name}.tif'
 
         try:
-            band_expression = band_index.metadata_['expression']['value']
-
             band_data_type = band_index.data_type
 
             data_type_info = numpy.iinfo(band_data_type)
 
-            data_type_max_value = data_type_info.max
-            data_type_min_value = data_type_info.min
-
-            profile['dtype'] = band_data_type
+            data_type_ranges[band_name] = band_data_type, data_type_info.min, data_type_info.max
 
-            output_dataset = AutoCloseDataSet(str(custom_band_path), mode='w', **profile)
+            outputs[band_name] = custom_band_path, AutoCloseDataSet(str(custom_band_path), mode='w',
+                                                                    **dict(profile, dtype=band_data_type))
 
             logging.info(f'Generating band {band_name} for collection {collection.name}...')
+        except Exception as e:
+            logging.warning(f'Could not generate band {band_name} due {str(e)}')
 
-            for _, window in blocks:
-                machine_context = {
-                    # TODO: Should we multiply by scale before pass to the Python Machine?
-                    k: ds.dataset.read(1, masked=True, window=window).astype(numpy.float32)
-                    for k, ds in map_data_set_context.items()
-                }
+            _remove_file(custom_band_path)
 
-                expr = f'{band_name} = {band_expression}'
+    # Read each block of the source bands once and evaluate all the expressions against it.
+    for _, window in blocks:
+        if not outputs:
+            break
 
-                result = execute_expression(expr, context=machine_context)
-                raster = result[band_name]
-                raster[raster == numpy.ma.masked] = profile['nodata']
+        block_context = {
+            # TODO: Should we multiply by scale before pass to the Python Machine?
+            k: ds.dataset.read(1, masked=True, window=window).astype(numpy.float32)
+            for k, ds in map_data_set_context.items()
+        }
+
+        for band_name in list(outputs.keys()):
+            custom_band_path, output_dataset = outputs[band_name]
+            band_data_type, data_type_min_value, data_type_max_value = data_type_ranges[band_name]
+
+            try:
+                result = expressions[band_name].evaluate(block_context)
+                raster = numpy.ma.filled(result, profile['nodata'])
                 # Persist the expected band data type to cast value safely.
-                raster[raster < data_type_min_value] = data_type_min_value
-                raster[raster > data_type_max_value] = data_type_max_value
+                raster = numpy.clip(raster, data_type_min_value, data_type_max_value)
 
                 output_dataset.dataset.write(raster.astype(band_data_type), window=window, indexes=1)
+            except Exception as e:
+                logging.warning(f'Could not generate band {band_name} due {str(e)}')
+
+                output_dataset.close()
+                outputs.pop(band_name)
+                _remove_file(custom_band_path)
 
-            output_dataset.close()
+    for data_set in map_data_set_context.values():
+        data_set.close()
 
+    for band_name, expression in expressions.items():
+        logging.debug(f'Expression {band_name} ({expression.engine}): {expression.calls} calls, '
+                      f'{expression.elapsed:.3f}s since worker start')
+
+    output = dict()
+
+    for band_name, (custom_band_path, output_dataset) in outputs.items():
+        output_dataset.close()
+
+        try:
             generate_cogs(str(custom_band_path), str(custom_band_path))
 
             output[band_name] = str(custom_band_path)
         except Exception as e:
             logging.warning(f'Could not generate band {band_name} due {str(e)}')
 
-            if custom_band_path.exists():
-                custom_band_path.unlink()
+            _remove_file(custom_band_path)
 
     return output
+
+
+def _remove_file(path: Path):
+    if path.exists():
+        path.unlink()
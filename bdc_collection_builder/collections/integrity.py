@@ -0,0 +1,200 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to verify the integrity of downloaded archives (zip/tar.gz) in-process.
+
+The archives are verified with streaming reads (constant memory) and, once verified, a
+fingerprint (size, modification time and checksum) is stored in a sidecar file inside
+``Config.INTEGRITY_CACHE_DIR``. Further verifications of the same unchanged file are skipped.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+from zipfile import BadZipfile, ZipFile
+
+from ..config import Config
+
+CHUNK_SIZE = 4 * 1024 * 1024
+"""Size of the chunks read while verifying."""
+
+
+class _HashReader:
+    """Wrap a binary file to compute the checksum of raw bytes while reading."""
+
+    def __init__(self, fd):
+        self._fd = fd
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._fd.read(size)
+        self.hash.update(data)
+        return data
+
+
+def _fingerprint_file(file_path: str) -> Path:
+    """Retrieve the sidecar file path which stores the fingerprint of a verified file."""
+    key = hashlib.sha1(str(Path(file_path).absolute()).encode()).hexdigest()
+
+    return Path(Config.INTEGRITY_CACHE_DIR) / f'{key}.json'
+
+
+def get_fingerprint(file_path: str) -> Optional[dict]:
+    """Retrieve the stored fingerprint of a verified file, if it still matches the file on disk."""
+    sidecar = _fingerprint_file(file_path)
+
+    try:
+        stat = os.stat(file_path)
+
+        with sidecar.open() as fd:
+            fingerprint = json.load(fd)
+    except (OSError, ValueError):
+        return None
+
+    if fingerprint.get('size') != stat.st_size or fingerprint.get('mtime_ns') != stat.st_mtime_ns:
+        return None
+
+    return fingerprint
+
+
+def save_fingerprint(file_path: str, checksum: str):
+    """Store the fingerprint of a verified file."""
+    stat = os.stat(file_path)
+    sidecar = _fingerprint_file(file_path)
+
+    try:
+        sidecar.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = sidecar.with_suffix('.tmp')
+        tmp.write_text(json.dumps(dict(file=str(file_path), size=stat.st_size,
+                                       mtime_ns=stat.st_mtime_ns, checksum=checksum)))
+        tmp.replace(sidecar)
+    except OSError as e:
+        logging.warning(f'Could not store integrity fingerprint of {file_path} - {str(e)}')
+
+
+def invalidate_fingerprint(file_path: str):
+    """Remove the stored fingerprint of a file."""
+    sidecar = _fingerprint_file(file_path)
+
+    if sidecar.exists():
+        sidecar.unlink()
+
+
+def verify_gzip(file_path: str) -> Optional[str]:
+    """Verify a gzip (tar.gz) file decompressing it as stream, similar to ``gunzip -t``.
+
+    Returns:
+        The sha256 checksum of the file when valid, otherwise None.
+    """
+    try:
+        with open(file_path, 'rb') as fd:
+            reader = _HashReader(fd)
+
+            with gzip.GzipFile(fileobj=reader, mode='rb') as stream:
+                while stream.read(CHUNK_SIZE):
+                    pass
+
+            return reader.hash.hexdigest()
+    except (OSError, EOFError, zlib.error) as e:
+        logging.warning(f'Invalid gzip file {file_path} - {str(e)}')
+        return None
+
+
+def _verify_zip_members(file_path: str, members: List[str]) -> bool:
+    with ZipFile(file_path) as archive:
+        for member in members:
+            # ZipExtFile checks the member CRC once it reaches the end of stream
+            with archive.open(member) as stream:
+                while stream.read(CHUNK_SIZE):
+                    pass
+
+    return True
+
+
+def verify_zip(file_path: str, workers: int = None) -> Optional[str]:
+    """Verify the CRC of all zip members, splitting the members among threads.
+
+    Returns:
+        A checksum based in members CRC when valid, otherwise None.
+    """
+    workers = max(1, workers or Config.INTEGRITY_WORKERS)
+
+    try:
+        with ZipFile(file_path) as archive:
+            infos = [info for info in archive.infolist() if not info.is_dir()]
+
+        # Balance the groups by member size
+        groups = [[] for _ in range(min(workers, len(infos)) or 1)]
+        for idx, info in enumerate(sorted(infos, key=lambda i: i.file_size, reverse=True)):
+            groups[idx % len(groups)].append(info.filename)
+
+        if len(groups) == 1:
+            _verify_zip_members(file_path, groups[0])
+        else:
+            with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+                for future in [executor.submit(_verify_zip_members, file_path, group) for group in groups]:
+                    future.result()
+    except (BadZipfile, OSError, EOFError, zlib.error) as e:
+        logging.warning(f'Invalid zip file {file_path} - {str(e)}')
+        return None
+
+    checksum = hashlib.sha256()
+    for info in infos:
+        checksum.update(f'{info.filename}:{info.CRC}:{info.file_size};'.encode())
+
+    return checksum.hexdigest()
+
+
+def verify_archive(file_path: str, use_cache: bool = True, workers: int = None) -> bool:
+    """Verify the integrity of a zip or tar.gz file.
+
+    When ``use_cache`` is set, the files verified before and not changed since are not verified again.
+
+    Args:
+        file_path: Path to the archive.
+        use_cache: Use the stored fingerprint to skip verification. Default is True.
+        workers: Number of threads to verify zip members. Default is ``Config.INTEGRITY_WORKERS``.
+    """
+    file_path = str(file_path)
+
+    if use_cache and get_fingerprint(file_path) is not None:
+        logging.info(f'File {file_path} verified before. Skipping integrity check.')
+        return True
+
+    if file_path.endswith('.zip'):
+        checksum = verify_zip(file_path, workers=workers)
+    elif file_path.endswith('.tar.gz') or file_path.endswith('.tgz'):
+        checksum = verify_gzip(file_path)
+    else:
+        raise ValueError(f'File {file_path} is not a supported archive.')
+
+    if checksum is None:
+        invalidate_fingerprint(file_path)
+        return False
+
+    if use_cache:
+        save_fingerprint(file_path, checksum)
+
+    return True
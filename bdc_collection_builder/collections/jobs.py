@@ -0,0 +1,186 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to track the state and the partial results of asynchronous jobs in Redis."""
+
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+from ..config import Config
+from .cache import get_redis_connection
+
+PENDING = 'PENDING'
+RUNNING = 'RUNNING'
+SUCCESS = 'SUCCESS'
+FAILURE = 'FAILURE'
+
+FINISHED_STATES = (SUCCESS, FAILURE)
+
+
+class Job:
+    """Represent an asynchronous job stored in Redis.
+
+    A job consists in a hash with the job state (``<prefix>:<id>``), a list with the partial
+    results appended as they are processed (``<prefix>:<id>:results``) and the final result
+    (``<prefix>:<id>:summary``). All the keys expire after ``Config.JOB_TTL`` seconds.
+
+    Args:
+        job_id: The job identifier.
+        client: Optional Redis client. Default is :func:`bdc_collection_builder.collections.cache.get_redis_connection`.
+    """
+
+    prefix = 'job'
+
+    def __init__(self, job_id: str, client=None):
+        """Create a job reference."""
+        self.id = job_id
+        self.client = client or get_redis_connection()
+
+    @property
+    def key(self) -> str:
+        """Retrieve the key of the job state."""
+        return f'{self.prefix}:{self.id}'
+
+    @classmethod
+    def create(cls, params: dict, client=None) -> 'Job':
+        """Create a new job in the PENDING state."""
+        job = cls(str(uuid.uuid4()), client=client)
+
+        job.update(status=PENDING, params=json.dumps(params, default=str), processed=0, total=0,
+                   created=datetime.utcnow().isoformat())
+
+        return job
+
+    def update(self, **fields):
+        """Update the job state."""
+        with self.client.pipeline() as pipe:
+            pipe.hset(self.key, mapping={key: str(value) for key, value in fields.items()})
+            pipe.expire(self.key, Config.JOB_TTL)
+            pipe.execute()
+
+    def meta(self) -> Optional[dict]:
+        """Retrieve the job state or None when the job does not exist (or expired)."""
+        values = self.client.hgetall(self.key)
+
+        if not values:
+            return None
+
+        meta = {key.decode(): value.decode() for key, value in values.items()}
+        meta['id'] = self.id
+        meta['params'] = json.loads(meta.get('params', '{}'))
+        meta['processed'] = int(meta.get('processed', 0))
+        meta['total'] = int(meta.get('total', 0))
+
+        return meta
+
+    def start(self, total: int):
+        """Mark the job as running with the given number of steps."""
+        self.update(status=RUNNING, total=total, started=datetime.utcnow().isoformat())
+
+    def push(self, result: dict):
+        """Append a partial result and increment the job progress."""
+        results_key = f'{self.key}:results'
+
+        with self.client.pipeline() as pipe:
+            pipe.rpush(results_key, json.dumps(result, default=str))
+            pipe.expire(results_key, Config.JOB_TTL)
+            pipe.hincrby(self.key, 'processed', 1)
+            pipe.execute()
+
+    def results(self, start: int = 0, end: int = -1) -> List[dict]:
+        """Retrieve the partial results from ``start`` to ``end`` (inclusive)."""
+        return [json.loads(value) for value in self.client.lrange(f'{self.key}:results', start, end)]
+
+    def finish(self, summary: dict = None):
+        """Mark the job as successfully finished and store the final result."""
+        if summary is not None:
+            self.client.set(f'{self.key}:summary', json.dumps(summary, default=str), ex=Config.JOB_TTL)
+
+        self.update(status=SUCCESS, finished=datetime.utcnow().isoformat())
+
+    def fail(self, error: str):
+        """Mark the job as failed."""
+        self.update(status=FAILURE, error=error, finished=datetime.utcnow().isoformat())
+
+    def summary(self) -> Optional[dict]:
+        """Retrieve the final result of the job."""
+        value = self.client.get(f'{self.key}:summary')
+
+        return json.loads(value) if value is not None else None
+
+    def stream(self, follow: bool = False, poll_interval: float = 1, timeout: float = None) -> Iterator[dict]:
+        """Iterate over the job progress and partial results as they are appended.
+
+        The progress is yielded as ``dict(type='progress', ...)``, each partial result as
+        ``dict(type='result', ...)`` and the final result as ``dict(type='summary', ...)``.
+        When the job does not finish in ``timeout`` seconds, the stream ends with
+        ``dict(type='timeout', status, timeout)``.
+
+        Args:
+            follow: Keep waiting for new results until the job finishes.
+            poll_interval: Seconds between the checks for new results when following.
+            timeout: Maximum seconds to follow the job.
+        """
+        offset = 0
+        last_progress = None
+        started = time.monotonic()
+
+        while True:
+            # Read the state before the results: once finished, all the results are available.
+            meta = self.meta()
+
+            if meta is None:
+                yield dict(type='error', error=f'Job {self.id} not found or expired.')
+                return
+
+            for result in self.results(offset):
+                offset += 1
+                yield dict(type='result', **result)
+
+            progress = (meta['status'], meta['processed'], meta['total'])
+
+            if progress != last_progress:
+                last_progress = progress
+                meta.pop('params', None)
+                yield dict(type='progress', **meta)
+
+            if meta['status'] in FINISHED_STATES:
+                break
+
+            if not follow:
+                return
+
+            if timeout is not None and time.monotonic() - started > timeout:
+                yield dict(type='timeout', status=meta['status'], timeout=timeout)
+                return
+
+            time.sleep(poll_interval)
+
+        summary = self.summary()
+
+        if summary is not None:
+            yield dict(type='summary', **summary)
+
+
+class CheckScenesJob(Job):
+    """Job to compare the provider scenes with the published items tile by tile."""
+
+    prefix = 'check-scenes'
@@ -23,8 +23,8 @@ from bdc_catalog.models import Collection, Provider
 from bdc_catalog.models.base_sql import BaseModel, db
 from celery.backends.database import Task
 from celery import states
-from sqlalchemy import (ARRAY, JSON, Column, DateTime, ForeignKey, Integer,
-                        Index, PrimaryKeyConstraint, String, UniqueConstraint)
+from sqlalchemy import (ARRAY, JSON, Column, Date, DateTime, ForeignKey, Integer,
+                        Index, PrimaryKeyConstraint, String, Text, UniqueConstraint)
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
@@ -59,6 +59,7 @@ class RadcorActivity(BaseModel):
 
     __table_args__ = (
         UniqueConstraint(collection_id, activity_type, sceneid),
+        Index(None, sceneid),
         dict(schema=Config.ACTIVITIES_SCHEMA),
     )
 
@@ -83,6 +84,7 @@ class ActivitySRC(BaseModel):
 
     __table_args__ = (
         PrimaryKeyConstraint(activity_id, activity_src_id),
+        Index(None, activity_src_id),
         dict(schema=Config.ACTIVITIES_SCHEMA),
     )
 
@@ -92,10 +94,12 @@ class RadcorActivityHistory(BaseModel):
 
     This model is attached with celery execution.
     An activity may have multiple executions 1..N.
+
+    The table is partitioned by month of ``start``.
+    See :mod:`bdc_collection_builder.collections.partitions`.
     """
 
     __tablename__ = 'activity_history'
-    __table_args__ = dict(schema=Config.ACTIVITIES_SCHEMA)
 
     activity_id = Column(
         ForeignKey('{}.activities.id'.format(Config.ACTIVITIES_SCHEMA, onupdate='CASCADE', ondelete='CASCADE')),
@@ -103,13 +107,20 @@ class RadcorActivityHistory(BaseModel):
     )
     task_id = Column(ForeignKey(Task.id, onupdate='CASCADE', ondelete='CASCADE'), primary_key=True, nullable=False)
 
-    start = Column('start', DateTime)
+    start = Column('start', DateTime, primary_key=True, nullable=False)
     env = Column('env', JSON)
 
     # Relations
     activity = relationship('RadcorActivity', back_populates="history")
     task = relationship(Task, uselist=False)
 
+    __table_args__ = (
+        Index(None, task_id),
+        Index(None, start),
+        Index(None, activity_id, start),
+        dict(schema=Config.ACTIVITIES_SCHEMA, postgresql_partition_by='RANGE (start)'),
+    )
+
     @classmethod
     def get_by_task_id(cls, task_id: str):
         """Retrieve a task execution from celery task id."""
@@ -128,6 +139,80 @@ class RadcorActivityHistory(BaseModel):
         return self.status in (states.SUCCESS, states.FAILURE)
 
 
+class RadcorActivityStatus(BaseModel):
+    """Keep the latest execution status of each activity.
+
+    This table is maintained by the task lifecycle (See :mod:`bdc_collection_builder.collections.status`)
+    in order to avoid the aggregation of ``activity_history`` and ``celery_taskmeta`` in the dashboards.
+    """
+
+    __tablename__ = 'activity_status'
+
+    activity_id = Column(
+        ForeignKey(RadcorActivity.id, onupdate='CASCADE', ondelete='CASCADE'),
+        primary_key=True, nullable=False
+    )
+    collection_id = Column(Integer, nullable=False)
+    activity_type = Column(String(64), nullable=False)
+    sceneid = Column(String(255), nullable=False)
+    task_id = Column(String(155), nullable=False)
+    """The Celery task id of the latest execution."""
+    status = Column(String(50), nullable=False)
+    start = Column(DateTime)
+
+    __table_args__ = (
+        Index(None, task_id),
+        Index(None, status),
+        Index(None, sceneid, start),
+        dict(schema=Config.ACTIVITIES_SCHEMA),
+    )
+
+
+class RadcorActivityDailyStatus(BaseModel):
+    """Count the executions by start date, collection, activity type and status."""
+
+    __tablename__ = 'activity_status_daily'
+
+    date = Column(Date, nullable=False)
+    collection_id = Column(Integer, nullable=False)
+    activity_type = Column(String(64), nullable=False)
+    status = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        PrimaryKeyConstraint(date, collection_id, activity_type, status),
+        dict(schema=Config.ACTIVITIES_SCHEMA),
+    )
+
+
+class RadcorSubmission(BaseModel):
+    """Track a radcor request dispatched asynchronously.
+
+    The submission is persisted by the API and processed by the task
+    :func:`bdc_collection_builder.celery.tasks.dispatch_submission`, which
+    searches the scenes, writes the activities and publishes the Celery tasks.
+    """
+
+    __tablename__ = 'submissions'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    status = Column(String(32), nullable=False, default=states.PENDING)
+    args = Column(JSON, nullable=False)
+    """The radcor request arguments."""
+    scenes_found = Column(Integer, nullable=False, default=0)
+    activities_written = Column(Integer, nullable=False, default=0)
+    tasks_queued = Column(Integer, nullable=False, default=0)
+    """The number of Celery tasks published (every task of the scene chains)."""
+    error = Column(Text)
+    started = Column(DateTime)
+    finished = Column(DateTime)
+
+    __table_args__ = (
+        Index(None, status),
+        dict(schema=Config.ACTIVITIES_SCHEMA),
+    )
+
+
 class ProviderSetting(BaseModel):
     """Model for table ``collection_builder.provider_settings``.
 
@@ -0,0 +1,278 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Manage the monthly partitions of the activity history.
+
+The table ``activity_history`` is partitioned by month of ``start`` (``activity_history_YYYY_MM``).
+The executions out of the created months are kept in the partition ``activity_history_default``,
+which is split whenever the respective month is created.
+
+The old partitions are archived by :func:`archive_history_partitions`: the executions (with the
+Celery task status) are exported to a compressed CSV (or Parquet) file, then the partition and the
+Celery task meta of the executions are removed.
+"""
+
+import gzip
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import List
+
+from celery.backends.database import Task
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import text
+
+from ..config import Config
+from .models import RadcorActivity, RadcorActivityHistory, db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+DEFAULT_PARTITION = f'{RadcorActivityHistory.__tablename__}_default'
+
+_BOUND = re.compile(r"FROM \('(?P<start>[^']+)'\) TO \('(?P<end>[^']+)'\)")
+
+_ARCHIVE_BATCH_SIZE = 10000
+
+
+def _month(value) -> date:
+    """Retrieve the first day of the month of a date."""
+    return date(value.year, value.month, 1)
+
+
+def _qualified(name: str) -> str:
+    """Retrieve the name of a table in the activities schema."""
+    return f'{Config.ACTIVITIES_SCHEMA}.{name}'
+
+
+def partition_name(month: date) -> str:
+    """Retrieve the name of the history partition of a month.
+
+    Example:
+        >>> partition_name(date(2021, 3, 1))
+        'activity_history_2021_03'
+    """
+    return f'{RadcorActivityHistory.__tablename__}_{month:%Y_%m}'
+
+
+def list_history_partitions() -> List[dict]:
+    """List the partitions of the activity history.
+
+    Returns:
+        The partitions ordered by month, with the keys ``name``, ``start``, ``end`` (None for the default
+        partition) and ``rows`` (estimated by the table statistics).
+    """
+    rows = db.session.execute(text('''
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples
+          FROM pg_inherits i
+          JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = CAST(:parent AS regclass)
+    '''), dict(parent=RadcorActivityHistory.__table__.fullname))
+
+    partitions = []
+
+    for name, bound, tuples in rows:
+        match = _BOUND.search(bound)
+
+        partitions.append(dict(
+            name=name,
+            start=datetime.fromisoformat(match.group('start')).date() if match else None,
+            end=datetime.fromisoformat(match.group('end')).date() if match else None,
+            rows=max(int(tuples), 0)
+        ))
+
+    return sorted(partitions, key=lambda partition: partition['start'] or date.max)
+
+
+def _create_partition(month: date):
+    """Create the partition of a month, moving the executions of that month from the default partition."""
+    name = _qualified(partition_name(month))
+    parent = RadcorActivityHistory.__table__.fullname
+    lower, upper = month.isoformat(), (month + relativedelta(months=1)).isoformat()
+
+    db.session.execute(f'CREATE TABLE {name} (LIKE {parent} INCLUDING DEFAULTS)')
+    db.session.execute(text(f'''
+        WITH moved AS (
+            DELETE FROM {_qualified(DEFAULT_PARTITION)} WHERE start >= :lower AND start < :upper RETURNING *
+        )
+        INSERT INTO {name} SELECT * FROM moved
+    '''), dict(lower=lower, upper=upper))
+    # The indexes and the constraints of the history are created in the partition
+    db.session.execute(f"ALTER TABLE {parent} ATTACH PARTITION {name} FOR VALUES FROM ('{lower}') TO ('{upper}')")
+
+
+def create_history_partitions(start: date = None, end: date = None) -> List[str]:
+    """Create the monthly partitions of the activity history (and the default partition, when missing).
+
+    The partitions must exist before the executions of the month start. Otherwise, the executions
+    are stored in the default partition until the month is created.
+
+    Args:
+        start: The first month. Default is the current month.
+        end: The last month (inclusive). Default is ``Config.ACTIVITY_HISTORY_PARTITIONS_AHEAD`` months
+            after the start.
+
+    Returns:
+        The names of the partitions created.
+    """
+    start = _month(start or datetime.utcnow())
+    end = _month(end or start + relativedelta(months=Config.ACTIVITY_HISTORY_PARTITIONS_AHEAD))
+
+    existing = {partition['name'] for partition in list_history_partitions()}
+    created = []
+
+    if DEFAULT_PARTITION not in existing:
+        db.session.execute(f'CREATE TABLE {_qualified(DEFAULT_PARTITION)} '
+                           f'PARTITION OF {RadcorActivityHistory.__table__.fullname} DEFAULT')
+        created.append(DEFAULT_PARTITION)
+
+    month = start
+
+    while month <= end:
+        if partition_name(month) not in existing:
+            _create_partition(month)
+            created.append(partition_name(month))
+
+        month += relativedelta(months=1)
+
+    return created
+
+
+def _export_query(name: str) -> str:
+    """Build the query of the archived executions of a partition, with the activity and the Celery task status."""
+    return f'''
+        SELECT h.activity_id, a.collection_id, a.activity_type, a.sceneid, h.start, CAST(h.env AS TEXT) AS env,
+               h.created, h.updated, t.task_id, t.status, t.date_done, t.traceback
+          FROM {_qualified(name)} h
+          LEFT JOIN {RadcorActivity.__table__.fullname} a ON a.id = h.activity_id
+          LEFT JOIN {Task.__table__.fullname} t ON t.id = h.task_id
+         ORDER BY h.start
+    '''
+
+
+def _export_csv(name: str, file_path: Path) -> int:
+    """Export the executions of a partition to a compressed CSV (``COPY``)."""
+    cursor = db.session.connection().connection.cursor()
+
+    try:
+        with gzip.open(str(file_path), 'wb') as stream:
+            cursor.copy_expert(f'COPY ({_export_query(name)}) TO STDOUT WITH (FORMAT csv, HEADER)', stream)
+
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def _export_parquet(name: str, file_path: Path) -> int:
+    """Export the executions of a partition to Parquet, reading the rows in batches."""
+    if pyarrow is None:
+        raise RuntimeError('The archive format parquet requires "pyarrow". Use "pip install pyarrow".')
+
+    timestamp, timestamp_tz = pyarrow.timestamp('us'), pyarrow.timestamp('us', tz='UTC')
+    schema = pyarrow.schema([
+        ('activity_id', pyarrow.int32()), ('collection_id', pyarrow.int32()), ('activity_type', pyarrow.string()),
+        ('sceneid', pyarrow.string()), ('start', timestamp), ('env', pyarrow.string()),
+        ('created', timestamp_tz), ('updated', timestamp_tz), ('task_id', pyarrow.string()),
+        ('status', pyarrow.string()), ('date_done', timestamp), ('traceback', pyarrow.string()),
+    ])
+
+    result = db.session.connection().execution_options(stream_results=True).execute(text(_export_query(name)))
+    total = 0
+
+    with pyarrow.parquet.ParquetWriter(str(file_path), schema, compression='zstd') as writer:
+        while True:
+            rows = result.fetchmany(_ARCHIVE_BATCH_SIZE)
+
+            if not rows:
+                break
+
+            writer.write_table(pyarrow.Table.from_pylist([dict(row) for row in rows], schema=schema))
+            total += len(rows)
+
+    return total
+
+
+def get_archive_partitions(before: date) -> List[dict]:
+    """List the partitions which are archived by :func:`archive_history_partitions` (``before``)."""
+    return [partition for partition in list_history_partitions()
+            if partition['end'] is not None and partition['end'] <= before]
+
+
+def archive_history_partitions(before: date, directory: str = None, output_format: str = 'csv',
+                               drop: bool = True) -> List[dict]:
+    """Archive the partitions of the activity history which end before a date.
+
+    Each partition is exported to ``<directory>/activity_history_YYYY_MM.csv.gz`` (or ``.parquet``).
+    Then, the partition is detached and removed with the Celery task meta of its executions
+    (the tasks which are not referenced by the remaining executions). The activities, the
+    latest activity status and the daily counters are kept.
+
+    Note:
+        Each partition is committed once archived, so an interrupted archive can be resumed.
+
+    Args:
+        before: Archive the months which end before (or at) this date.
+        directory: The output directory. Default is ``Config.ACTIVITY_HISTORY_ARCHIVE_DIR``.
+        output_format: The output format, ``csv`` (gzip) or ``parquet``.
+        drop: Remove the partitions once exported.
+
+    Returns:
+        The archived partitions with the keys ``name``, ``file`` and ``rows``.
+    """
+    if output_format not in ('csv', 'parquet'):
+        raise ValueError(f'Invalid archive format {output_format}. Use "csv" or "parquet".')
+
+    directory = Path(directory or Config.ACTIVITY_HISTORY_ARCHIVE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    exporter, extension = (_export_csv, 'csv.gz') if output_format == 'csv' else (_export_parquet, 'parquet')
+    archived = []
+
+    for partition in get_archive_partitions(before):
+        name = partition['name']
+        file_path = directory / f'{name}.{extension}'
+        tmp_file = file_path.with_name(f'.{file_path.name}.tmp')
+
+        rows = exporter(name, tmp_file)
+        tmp_file.rename(file_path)
+
+        if drop:
+            _drop_partition(name)
+
+        db.session.commit()
+
+        archived.append(dict(name=name, file=str(file_path), rows=rows))
+
+    return archived
+
+
+def _drop_partition(name: str):
+    """Remove a partition and the Celery task meta which are only referenced by its executions."""
+    history = RadcorActivityHistory.__table__.fullname
+
+    db.session.execute(f'ALTER TABLE {history} DETACH PARTITION {_qualified(name)}')
+    db.session.execute(f'''
+        DELETE FROM {Task.__table__.fullname} t
+         USING {_qualified(name)} h
+         WHERE t.id = h.task_id
+           AND NOT EXISTS (SELECT 1 FROM {history} o WHERE o.task_id = t.id)
+    ''')
+    db.session.execute(f'DROP TABLE {_qualified(name)}')
@@ -0,0 +1,238 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Module to fan out the provider searches (scenes, tiles and periods) over a thread pool."""
+
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Hashable, Iterator, List, NamedTuple, Optional, Tuple
+
+from ..config import Config
+
+
+class SearchQuery(NamedTuple):
+    """Represent a single call to ``provider.search``."""
+
+    key: Hashable
+    """Identifier of the query (scene id, tile, period) used in results and errors."""
+    kwargs: Dict[str, Any]
+    """The parameters for ``provider.search``."""
+
+
+class SearchResult(NamedTuple):
+    """Represent the merged result of several queries."""
+
+    scenes: List[Any]
+    """The scenes found, unique by ``scene_id`` (first occurrence wins)."""
+    errors: List[Dict[str, str]]
+    """The failed queries as ``dict(query, error)``."""
+    total_queries: int
+
+    @property
+    def failed(self) -> bool:
+        """Check if all the queries failed."""
+        return self.total_queries > 0 and len(self.errors) == self.total_queries
+
+
+class _ProviderLimiter:
+    """Limit the concurrent calls and the call rate to a single provider."""
+
+    def __init__(self, concurrency: int, rate_limit: float):
+        self.semaphore = threading.BoundedSemaphore(max(1, concurrency))
+        self.interval = 1. / rate_limit if rate_limit > 0 else 0
+        self._lock = threading.Lock()
+        self._next_call = 0.
+
+    def __enter__(self):
+        self.semaphore.acquire()
+
+        if self.interval:
+            with self._lock:
+                now = time.monotonic()
+                wait_time = self._next_call - now
+                self._next_call = max(now, self._next_call) + self.interval
+
+            if wait_time > 0:
+                time.sleep(wait_time)
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.semaphore.release()
+
+
+_limiters: Dict[str, _ProviderLimiter] = dict()
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider_name: str) -> _ProviderLimiter:
+    """Retrieve the limiter of a provider.
+
+    The limiter is shared by all the searches of the process, so concurrent requests to the
+    same provider respect ``Config.SEARCH_PROVIDER_CONCURRENCY`` and ``Config.SEARCH_RATE_LIMIT``.
+    """
+    with _limiters_lock:
+        if provider_name not in _limiters:
+            _limiters[provider_name] = _ProviderLimiter(Config.SEARCH_PROVIDER_CONCURRENCY,
+                                                        Config.SEARCH_RATE_LIMIT)
+
+        return _limiters[provider_name]
+
+
+class SearchExecutor:
+    """Run the provider searches concurrently using a bounded thread pool.
+
+    Example:
+        >>> executor = SearchExecutor()  # doctest: +SKIP
+        >>> queries = [SearchQuery(tile, dict(query='S2_MSI_L1C', tile=tile)) for tile in ('23LLF', '23LLG')]
+        >>> result = executor.search(provider, queries, provider_name='ESA')  # doctest: +SKIP
+        >>> result.scenes, result.errors  # doctest: +SKIP
+
+    Args:
+        max_workers: Maximum number of threads. Default is ``Config.SEARCH_WORKERS``.
+        cache: Optional search cache. See :func:`bdc_collection_builder.collections.cache.get_search_cache`.
+        cache_batch_size: Number of query results written to the cache at once.
+    """
+
+    def __init__(self, max_workers: int = None, cache=None, cache_batch_size: int = 50):
+        """Create the search executor."""
+        self.max_workers = max(1, max_workers or Config.SEARCH_WORKERS)
+        self.cache = cache
+        self.cache_batch_size = max(1, cache_batch_size)
+
+    def _run(self, provider, queries: List[SearchQuery], limiter: _ProviderLimiter):
+        def _search(query: SearchQuery):
+            with limiter:
+                return provider.search(**query.kwargs)
+
+        if len(queries) == 1 or self.max_workers == 1:
+            for query in queries:
+                try:
+                    yield query, _search(query), None
+                except Exception as e:
+                    yield query, None, e
+            return
+
+        max_workers = min(self.max_workers, len(queries))
+        pending_queries = iter(queries)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search') as executor:
+            # Keep a bounded number of submitted queries, so the finished results are not
+            # accumulated in memory while the caller is consuming the previous ones.
+            futures = {executor.submit(_search, query): query
+                       for query in itertools.islice(pending_queries, max_workers * 2)}
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    query = futures.pop(future)
+                    error = future.exception()
+
+                    yield query, None if error else future.result(), error
+
+                    next_query = next(pending_queries, None)
+
+                    if next_query is not None:
+                        futures[executor.submit(_search, next_query)] = next_query
+
+    def iter_search(self, provider, queries: List[SearchQuery],
+                    provider_name: str = None) -> Iterator[Tuple[SearchQuery, Optional[list], Optional[Exception]]]:
+        """Run the queries and yield each one as it completes.
+
+        When the executor has a cache (:class:`bdc_collection_builder.collections.cache.SearchCache`),
+        the cached queries are yielded first (read with a single request) and only the remaining ones
+        are sent to the provider. The new results are stored in the cache in batches of ``cache_batch_size``.
+
+        Yields:
+            Tuple of the query, the query result (None on failure) and the exception raised (None on success).
+        """
+        provider_name = provider_name or type(provider).__name__
+        limiter = get_limiter(provider_name)
+
+        if self.cache is None:
+            yield from self._run(provider, queries, limiter)
+            return
+
+        keys = dict()
+        for query in queries:
+            params = dict(**query.kwargs)
+            keys[id(query)] = self.cache.key(provider_name, params.pop('query', None), **params)
+
+        missing = []
+
+        for query, cached in zip(queries, self.cache.get_many([keys[id(query)] for query in queries])):
+            if cached is None:
+                missing.append(query)
+                continue
+
+            yield query, cached, None
+
+        results = dict()
+
+        try:
+            for query, result, error in self._run(provider, missing, limiter):
+                if error is None:
+                    result = list(result)
+                    results[keys[id(query)]] = result
+
+                yield query, result, error
+
+                if len(results) >= self.cache_batch_size:
+                    self.cache.set_many(results, provider=provider_name)
+                    results = dict()
+        finally:
+            if results:
+                self.cache.set_many(results, provider=provider_name)
+
+    def search(self, provider, queries: List[SearchQuery], provider_name: str = None,
+               raise_all_failed: bool = True) -> SearchResult:
+        """Run the queries and merge the results (in the queries order), removing the duplicated scenes.
+
+        The failed queries do not abort the search. They are logged and reported in ``SearchResult.errors``.
+
+        Raises:
+            Exception The first error raised when all the queries failed and ``raise_all_failed`` is set.
+        """
+        positions = {id(query): idx for idx, query in enumerate(queries)}
+        results = [None] * len(queries)
+        errors = []
+        first_error = None
+
+        for query, result, error in self.iter_search(provider, queries, provider_name=provider_name):
+            if error is not None:
+                logging.warning(f'Search {query.key} failed - {str(error)}')
+                errors.append(dict(query=str(query.key), error=str(error)))
+                first_error = first_error or error
+                continue
+
+            results[positions[id(query)]] = result
+
+        if raise_all_failed and queries and len(errors) == len(queries):
+            raise first_error
+
+        scenes = dict()
+
+        for result in results:
+            for scene in result or []:
+                scenes.setdefault(scene.scene_id, scene)
+
+        return SearchResult(scenes=list(scenes.values()), errors=errors, total_queries=len(queries))
@@ -0,0 +1,348 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Maintain the activity executions, the latest activity status and the daily execution counters.
+
+The executions are written by :func:`upsert_execution` in a single statement once a task starts.
+The tables ``activity_status`` and ``activity_status_daily`` are updated whenever an
+execution starts (:func:`bdc_collection_builder.celery.tasks.create_execution`) and finishes
+(``ContextTask.after_return``), so the dashboard counters do not aggregate the execution history.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from celery import states
+from celery.backends.database import Task
+from sqlalchemy import JSON, Date, bindparam, cast, exists, func, select, text, union_all
+from sqlalchemy.dialects.postgresql import JSONB, insert
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .models import (RadcorActivity, RadcorActivityDailyStatus, RadcorActivityHistory,
+                     RadcorActivityStatus, db)
+
+
+_execution_statement = None
+_compiled_cache = {}
+
+# Serialise the executions of the same task (concurrent redelivery, ``task_acks_late``) until commit
+_task_lock_statement = text('SELECT pg_advisory_xact_lock(hashtext(:task_id))')
+
+
+def _get_execution_statement():
+    """Build the statement which writes the Celery task, the activity and the execution.
+
+    The statement consists in data-modifying CTEs:
+
+    - ``new_task``/``task``: insert the ``celery_taskmeta`` row or read the existing one;
+    - ``activity``: insert the activity or merge the ``args`` (JSON) of the existing one;
+    - ``new_history``/``history``: insert the execution or read the existing one (task retry).
+
+    The CTEs share the same snapshot, so the existing rows are read only when the insert is skipped.
+    The statement is built once with bind parameters and its compilation is cached (``compiled_cache``).
+    """
+    global _execution_statement
+
+    if _execution_statement is not None:
+        return _execution_statement
+
+    task_table = Task.__table__
+    activities = RadcorActivity.__table__
+    history = RadcorActivityHistory.__table__
+
+    task_columns = [task_table.c.id, task_table.c.task_id, task_table.c.status, task_table.c.date_done]
+
+    new_task = (
+        insert(task_table)
+        .values(id=Task.id.default.next_value(), task_id=bindparam('task_id'), status=states.PENDING,
+                date_done=bindparam('date_done'))
+        .on_conflict_do_nothing(index_elements=[task_table.c.task_id])
+        .returning(*task_columns)
+        .cte('new_task')
+    )
+    task = union_all(
+        select(list(new_task.c)),
+        select(task_columns).where(task_table.c.task_id == bindparam('task_id'))
+    ).cte('task')
+
+    upsert = insert(activities).values(
+        collection_id=bindparam('collection_id'),
+        activity_type=bindparam('activity_type'),
+        sceneid=bindparam('sceneid'),
+        tags=bindparam('tags'),
+        scene_type=bindparam('scene_type'),
+        args=bindparam('args'),
+    )
+    # Ensure that args values is always updated
+    args = func.coalesce(cast(activities.c.args, JSONB), cast('{}', JSONB)).op('||')(cast(upsert.excluded.args, JSONB))
+    activity_row = (
+        upsert
+        .on_conflict_do_update(
+            index_elements=[activities.c.collection_id, activities.c.activity_type, activities.c.sceneid],
+            set_=dict(args=cast(args, JSON), updated=func.now())
+        )
+        .returning(*activities.c)
+        .cte('activity')
+    )
+
+    history_columns = [history.c.activity_id, history.c.task_id, history.c.start, history.c.env,
+                       history.c.created, history.c.updated]
+
+    # The primary key includes the partition key (start), so the retries are checked by NOT EXISTS.
+    # The concurrent executions of a task are serialised by the advisory lock (See upsert_execution)
+    existing = select(history_columns)\
+        .where(history.c.activity_id == activity_row.c.id)\
+        .where(history.c.task_id == task.c.id)
+
+    new_history = (
+        insert(history)
+        .from_select(['activity_id', 'task_id', 'start'],
+                     select([activity_row.c.id, task.c.id, bindparam('start', type_=history.c.start.type)])
+                     .where(~exists(existing)))
+        .on_conflict_do_nothing()
+        .returning(*history_columns)
+        .cte('new_history')
+    )
+    execution = union_all(select(list(new_history.c)), existing).cte('history')
+
+    columns = [column.label(f'activity_{column.name}') for column in activity_row.c] + \
+        [column.label(f'task_{column.name}') for column in task.c] + \
+        [column.label(f'history_{column.name}') for column in execution.c]
+
+    _execution_statement = select(columns)
+
+    return _execution_statement
+
+
+def _make_instance(model, row, prefix: str):
+    """Create a detached model instance of a row returned by :func:`_get_execution_statement`."""
+    mapper = model.__mapper__
+    instance = mapper.class_manager.new_instance()
+
+    for column in mapper.columns:
+        # The columns not returned (Celery result and traceback) are loaded on access
+        key = f'{prefix}_{column.name}'
+
+        if key in row:
+            set_committed_value(instance, mapper.get_property_by_column(column).key, row[key])
+
+    make_transient_to_detached(instance)
+
+    return instance
+
+
+def upsert_execution(activity: dict, task_id: str, start: datetime = None) -> RadcorActivityHistory:
+    """Create (or retrieve) the execution of an activity for a Celery task in a single statement.
+
+    The activity is identified by ``collection_id``, ``activity_type`` and ``sceneid``. When it already
+    exists, the given ``args`` are merged into the activity arguments. When the task is retried, the
+    previous execution (same task id) is returned.
+
+    The changes are not committed. The transaction holds an advisory lock on the task id until it ends,
+    so a task delivered twice at the same time (``task_acks_late``) does not create two executions.
+
+    Args:
+        activity: The radcor activity as dict.
+        task_id: The Celery task id.
+        start: The execution start. Default is now (UTC).
+
+    Returns:
+        The activity execution, with the relations ``activity`` and ``task`` loaded.
+    """
+    connection = db.session.connection().execution_options(compiled_cache=_compiled_cache)
+    statement = _get_execution_statement()
+    params = dict(
+        task_id=task_id,
+        date_done=datetime.utcnow(),
+        collection_id=activity['collection_id'],
+        activity_type=activity['activity_type'],
+        sceneid=activity['sceneid'],
+        tags=activity.get('tags', []),
+        scene_type=activity.get('scene_type'),
+        args=activity.get('args') or dict(),
+        start=start or datetime.utcnow(),
+    )
+
+    # The lock must be taken before the statement, whose snapshot must see the execution of the lock holder
+    connection.execute(_task_lock_statement, dict(task_id=task_id))
+
+    row = connection.execute(statement, params).first()
+
+    if row is None:
+        # The task meta was written by a concurrent transaction after the statement snapshot.
+        row = connection.execute(statement, params).first()
+
+    row = dict(row)
+    execution = _make_instance(RadcorActivityHistory, row, 'history')
+
+    set_committed_value(execution, 'activity', _make_instance(RadcorActivity, row, 'activity'))
+    set_committed_value(execution, 'task', _make_instance(Task, row, 'task'))
+
+    # Add the rows as persistent objects without any query
+    return db.session.merge(execution, load=False)
+
+
+def _increment(date, collection_id: int, activity_type: str, status: str, value: int, session=None):
+    """Increment the daily counter of executions (atomic upsert)."""
+    if date is None:
+        return
+
+    table = RadcorActivityDailyStatus.__table__
+
+    statement = insert(table).values(date=date.date() if isinstance(date, datetime) else date,
+                                     collection_id=collection_id, activity_type=activity_type,
+                                     status=status, count=value)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.date, table.c.collection_id, table.c.activity_type, table.c.status],
+        set_=dict(count=table.c.count + statement.excluded.count, updated=func.now())
+    )
+
+    (session or db.session).execute(statement)
+
+
+def _transition(current: Optional[RadcorActivityStatus], task_id: str, status: str, start: datetime,
+                collection_id: int, activity_type: str, session=None):
+    """Move the execution between the daily counters when the status changes."""
+    if current is not None and current.task_id == task_id:
+        if current.status == status:
+            return False
+
+        _increment(current.start, current.collection_id, current.activity_type, current.status, -1, session=session)
+
+    _increment(start, collection_id, activity_type, status, 1, session=session)
+
+    return True
+
+
+def register_execution(execution: RadcorActivityHistory, task_id: str, status: str = states.STARTED):
+    """Set the status of the latest execution of an activity.
+
+    It must be called in the same transaction of the execution.
+
+    Args:
+        execution: The activity execution.
+        task_id: The Celery task id.
+        status: The execution status. Default is ``STARTED``.
+    """
+    activity = execution.activity
+
+    current = (
+        RadcorActivityStatus.query()
+        .filter(RadcorActivityStatus.activity_id == activity.id)
+        .with_for_update()
+        .first()
+    )
+
+    if not _transition(current, task_id, status, execution.start, activity.collection_id, activity.activity_type):
+        return
+
+    table = RadcorActivityStatus.__table__
+
+    values = dict(activity_id=activity.id, collection_id=activity.collection_id,
+                  activity_type=activity.activity_type, sceneid=activity.sceneid,
+                  task_id=task_id, status=status, start=execution.start)
+
+    statement = insert(table).values(**values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.activity_id],
+        set_=dict(**{key: value for key, value in values.items() if key != 'activity_id'}, updated=func.now())
+    )
+
+    db.session.execute(statement)
+
+
+def update_execution_status(task_id: str, status: str, session=None) -> bool:
+    """Update the status of an activity execution once the Celery task returns.
+
+    Note:
+        Only the latest execution of each activity is tracked. When an activity is
+        restarted while a previous execution is still running, the previous execution
+        remains with the status ``STARTED`` in the daily counters.
+
+    Args:
+        task_id: The Celery task id.
+        status: The Celery task state (``SUCCESS``, ``FAILURE``, ``RETRY``).
+        session: The session used to write the status. Default is ``db.session``.
+
+    Returns:
+        Whether the task belongs to an activity execution.
+    """
+    session = session or db.session
+
+    current = (
+        session.query(RadcorActivityStatus)
+        .filter(RadcorActivityStatus.task_id == task_id)
+        .with_for_update()
+        .first()
+    )
+
+    if current is None:
+        return False
+
+    if _transition(current, task_id, status, current.start, current.collection_id, current.activity_type,
+                   session=session):
+        current.status = status
+
+    return True
+
+
+def backfill_activity_status() -> dict:
+    """Rebuild the activity status and the daily counters from the execution history.
+
+    Returns:
+        The number of rows written in each table (``activities`` and ``daily``).
+    """
+    status_table = RadcorActivityStatus.__table__
+    daily_table = RadcorActivityDailyStatus.__table__
+    history = RadcorActivityHistory.__table__
+    activities = RadcorActivity.__table__
+    task = Task.__table__
+
+    source = activities.join(history, history.c.activity_id == activities.c.id)\
+        .join(task, task.c.id == history.c.task_id)
+
+    latest = (
+        select([activities.c.id, activities.c.collection_id, activities.c.activity_type, activities.c.sceneid,
+                task.c.task_id, func.coalesce(task.c.status, states.PENDING), history.c.start])
+        .select_from(source)
+        .distinct(activities.c.id)
+        .order_by(activities.c.id, history.c.start.desc().nullslast())
+    )
+
+    start_date = cast(history.c.start, Date)
+    task_status = func.coalesce(task.c.status, states.PENDING)
+
+    daily = (
+        select([start_date, activities.c.collection_id, activities.c.activity_type, task_status, func.count()])
+        .select_from(source)
+        .where(history.c.start.isnot(None))
+        .group_by(start_date, activities.c.collection_id, activities.c.activity_type, task_status)
+    )
+
+    db.session.execute(status_table.delete())
+    db.session.execute(daily_table.delete())
+
+    activity_rows = db.session.execute(status_table.insert().from_select(
+        ['activity_id', 'collection_id', 'activity_type', 'sceneid', 'task_id', 'status', 'start'], latest
+    )).rowcount
+    daily_rows = db.session.execute(daily_table.insert().from_select(
+        ['date', 'collection_id', 'activity_type', 'status', 'count'], daily
+    )).rowcount
+
+    return dict(activities=activity_rows, daily=daily_rows)
@@ -21,20 +21,22 @@
 
 # Python Native
 import contextlib
+import copy
 import logging
 import os
 import shutil
 import tarfile
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from json import loads as json_parser
 from os import path as resource_path
 from os import remove as resource_remove
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Tuple
+from typing import Dict, NamedTuple, Optional, Tuple, Type
 from urllib3.exceptions import InsecureRequestWarning
-from zipfile import BadZipfile, ZipFile
-from zlib import error as zlib_error
+from zipfile import ZipFile
 
 # 3rdparty
 import boto3
@@ -42,6 +44,7 @@ import numpy
 import rasterio
 import rasterio.features
 import rasterio.warp
+import rasterio.windows
 import requests
 
 import shapely
@@ -51,13 +54,18 @@ from bdc_collectors.base import BaseProvider
 from bdc_collectors.ext import CollectorExtension
 from botocore.exceptions import ClientError
 from flask import current_app
+from rasterio.io import MemoryFile
 from rasterio.warp import Resampling
 from rio_cogeo.cogeo import cog_translate
 from rio_cogeo.profiles import cog_profiles
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 # Builder
 from werkzeug.exceptions import abort
 
 from ..config import CURRENT_DIR, Config
+from .cache import get_provider_cache, provider_key
+from .integrity import verify_archive, verify_gzip, verify_zip
 from .models import ProviderSetting, CollectionProviderSetting
 
 
@@ -154,19 +162,72 @@ def generate_cogs(input_data_set_path, file_path, profile='deflate', profile_opt
     return str(file_path)
 
 
-def is_valid_compressed(file):
-    """Check tar gz or zip is valid."""
-    try:
-        archive = ZipFile(file, 'r')
-        try:
-            corrupt = archive.testzip()
-        except zlib_error:
-            corrupt = True
-        archive.close()
-    except BadZipfile:
-        corrupt = True
+def get_cog_workers(max_workers: int = None) -> int:
+    """Retrieve the number of concurrent COG translations allowed in this host.
+
+    When ``max_workers`` is not set (or zero), the available CPUs are split among
+    the ``GDAL_NUM_THREADS`` used by each translation.
+    """
+    if max_workers:
+        return max(1, int(max_workers))
+
+    gdal_threads = max(1, int(os.getenv("GDAL_NUM_THREADS", "2")))
+
+    return max(1, (os.cpu_count() or 1) // gdal_threads)
+
 
-    return not corrupt
+def generate_cogs_parallel(tasks: Dict[str, Tuple[str, str]], max_workers: int = None, **options) -> Dict[str, str]:
+    """Generate several Cloud Optimized GeoTIFF files (COG) concurrently.
+
+    The translation is all-or-nothing: when any file fails, the already generated
+    outputs are removed (sources are never touched) and the first error is raised.
+
+    Example:
+        >>> generate_cogs_parallel({'B02': ('/path/B02.jp2', '/path/B02.tif'),
+        ...                         'B03': ('/path/B03.jp2', '/path/B03.tif')}, max_workers=2)
+
+    Args:
+        tasks (dict) - Map of key and a tuple of (input data set, target data set)
+        max_workers (int) - Maximum number of concurrent translations. See :func:`get_cog_workers`.
+        **options - Extra parameters to :func:`generate_cogs`.
+
+    Returns:
+        Map of key and the generated COG.
+    """
+    if not tasks:
+        return dict()
+
+    workers = min(get_cog_workers(max_workers), len(tasks))
+
+    output = dict()
+    errors = []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(generate_cogs, source, target, **options): key
+            for key, (source, target) in tasks.items()
+        }
+
+        for future, key in futures.items():
+            try:
+                output[key] = future.result()
+            except Exception as e:
+                logging.error(f'Could not generate COG for {key} - {str(e)}')
+                errors.append(e)
+
+    if errors:
+        for key, (source, target) in tasks.items():
+            if str(target) != str(source) and resource_path.exists(str(target)):
+                resource_remove(str(target))
+
+        raise errors[0]
+
+    return output
+
+
+def is_valid_compressed(file):
+    """Check zip file is valid, verifying the members CRC in parallel."""
+    return verify_zip(file) is not None
 
 
 def extract_and_get_internal_name(zip_file_name, extract_to=None):
@@ -274,7 +335,85 @@ def raster_convexhull(file_path: str, epsg='EPSG:4326', no_data=None) -> dict:
         return multi_polygons.convex_hull
 
 
-def post_processing(quality_file_path: str, collection: Collection, scenes: dict, resample_to=None):
+RasterFootprint = NamedTuple('RasterFootprint', [('extent', shapely.geometry.Polygon),
+                                                  ('convex_hull', shapely.geometry.base.BaseGeometry),
+                                                  ('srid', Optional[int])])
+"""Type to represent the spatial extent, the valid data convex hull and the EPSG code of a raster."""
+
+
+def raster_footprint(file_path: str, epsg='EPSG:4326', no_data=None, resolution: float = None,
+                     max_size: int = None, with_convex_hull: bool = True) -> RasterFootprint:
+    """Compute the extent, the valid data footprint and the EPSG code of a raster in a single pass.
+
+    The valid data mask is read in a decimated grid (GDAL uses the dataset overviews or
+    JPEG2000 resolution levels when available), so the full resolution array is never loaded.
+    The resulting convex hull has an error up to one decimated pixel.
+
+    Example:
+        >>> footprint = raster_footprint('/path/to/B02.tif', no_data=0, resolution=300)
+        >>> footprint.extent, footprint.convex_hull, footprint.srid
+
+    Args:
+        file_path (str): Path to image
+        epsg (str): EPSG Code of result geometries
+        no_data: Use custom no data value. Default is dataset.nodata
+        resolution (float): Pixel size (in dataset CRS units) of the grid used to compute the valid data mask.
+        max_size (int): When resolution is not set, limits the largest side of the mask grid (in pixels).
+            Default is ``Config.FOOTPRINT_MAX_SIZE``.
+        with_convex_hull (bool): Compute the valid data convex hull. Default is True.
+
+    See:
+        https://rasterio.readthedocs.io/en/latest/topics/resampling.html
+    """
+    with rasterio.open(str(file_path)) as data_set:
+        _geom = shapely.geometry.mapping(shapely.geometry.box(*data_set.bounds))
+        extent = shapely.geometry.shape(rasterio.warp.transform_geom(data_set.crs, epsg, _geom))
+
+        srid = data_set.crs.to_epsg() if data_set.crs is not None else None
+
+        convex_hull = None
+
+        if with_convex_hull:
+            if resolution:
+                factor = max(1., resolution / abs(data_set.res[0]))
+            else:
+                factor = max(1., max(data_set.width, data_set.height) / (max_size or Config.FOOTPRINT_MAX_SIZE))
+
+            width = max(1, int(round(data_set.width / factor)))
+            height = max(1, int(round(data_set.height / factor)))
+
+            data = data_set.read(1, masked=True, out_shape=(height, width), resampling=Resampling.nearest)
+
+            # Create mask, which 1 represents valid data and 0 nodata
+            valid = ~numpy.ma.getmaskarray(data)
+            if no_data is not None:
+                valid &= data.data != no_data
+            valid = valid.astype(numpy.uint8)
+
+            transform = data_set.transform * data_set.transform.scale(data_set.width / width,
+                                                                      data_set.height / height)
+
+            geoms = [
+                shapely.geometry.shape(geom)
+                for geom, _ in rasterio.features.shapes(valid, mask=valid, transform=transform)
+            ]
+
+            if geoms:
+                # Compute the hull in native CRS and reproject only its vertices.
+                native_hull = shapely.geometry.MultiPolygon(geoms).convex_hull
+                hull = rasterio.warp.transform_geom(data_set.crs, epsg,
+                                                    shapely.geometry.mapping(native_hull), precision=6)
+                convex_hull = shapely.geometry.shape(hull).convex_hull
+            else:
+                convex_hull = shapely.geometry.Polygon()
+
+    if srid is None:
+        srid = get_epsg_srid(str(file_path))
+
+    return RasterFootprint(extent, convex_hull, srid)
+
+
+def post_processing(quality_file_path: str, collection: Collection, scenes: dict, resample_to=None, workers=None):
     """Stack the merge bands in order to apply a filter on the quality band.
 
     We have faced some issues regarding `nodata` value in spectral bands, which was resulting
@@ -289,14 +428,12 @@ def post_processing(quality_file_path: str, collection: Collection, scenes: dict
         0 0 0 0      687  987 1022 1029      =>    0 0 0 0
         0 2 2 4    -9999 7100 7322 9564      =>  255 2 2 4
 
-    Notes:
-        It may take too long to execute for a large grid.
-
     Args:
          quality_file_path: Path to the cloud masking file.
          collection: The collection instance.
          scenes: Map of band and file path
          resample_to: Resolution to re-sample. Default is None, which uses default value.
+         workers: Number of threads to process the blocks. Default is ``Config.POST_PROCESSING_WORKERS``.
     """
     quality_file_path = Path(quality_file_path)
     band_names = [band_name for band_name in scenes.keys() if band_name.lower() not in ('ndvi', 'evi', 'fmask4')]
@@ -306,109 +443,123 @@ def post_processing(quality_file_path: str, collection: Collection, scenes: dict
         Band.name.in_(band_names)
     ).all()
 
-    options = dict()
+    with rasterio.open(str(quality_file_path)) as ds:
+        profile = ds.profile.copy()
+        transform = ds.transform
 
-    with TemporaryDirectory() as tmp:
-        temp_file = Path(tmp) / quality_file_path.name
+        if resample_to:
+            factor = ds.transform[0] / resample_to
 
-        # Copy to temp dir
-        shutil.copyfile(quality_file_path, temp_file)
+            width = int(ds.width * factor)
+            height = int(ds.height * factor)
 
-        if resample_to:
-            with rasterio.open(str(quality_file_path)) as ds:
-                ds_transform = ds.profile['transform']
+            transform = ds.transform * ds.transform.scale((ds.width / width), (ds.height / height))
 
-                options.update(ds.meta.copy())
+            profile.update(width=width, height=height, transform=transform)
 
-                factor = ds_transform[0] / resample_to
+            raster_merge = ds.read(1, out_shape=(height, width), resampling=Resampling.nearest)
+        else:
+            raster_merge = ds.read(1)
 
-                options['width'] = ds.profile['width'] * factor
-                options['height'] = ds.profile['height'] * factor
+    nodata = profile.get('nodata') or 255
+    profile['nodata'] = nodata
 
-                transform = ds.transform * ds.transform.scale((ds.width / options['width']), (ds.height / options['height']))
+    block_size = profile.get('blockxsize', 512) if profile.get('tiled') else 512
+    windows = [
+        rasterio.windows.Window(col_off, row_off,
+                                min(block_size, profile['width'] - col_off),
+                                min(block_size, profile['height'] - row_off))
+        for row_off in range(0, profile['height'], block_size)
+        for col_off in range(0, profile['width'], block_size)
+    ]
+    band_files = [scenes[band.name] for band in bands]
 
-                options['transform'] = transform
+    mask_nodata_blocks(raster_merge, transform, band_files, windows, nodata=nodata, workers=workers)
 
-                nodata = options.get('nodata') or 255
-                options['nodata'] = nodata
+    with TemporaryDirectory() as tmp:
+        temp_file = Path(tmp) / quality_file_path.name
 
-                raster = ds.read(
-                    out_shape=(
-                        ds.count,
-                        int(options['height']),
-                        int(options['width'])
-                    ),
-                    resampling=Resampling.nearest
-                )
+        # The patched raster is kept in memory and translated to COG only once
+        with MemoryFile() as memory_file:
+            with memory_file.open(**profile) as dataset:
+                dataset.write_band(1, raster_merge)
 
-                with rasterio.open(str(temp_file), mode='w', **options) as temp_ds:
-                    temp_ds.write_band(1, raster[0])
+            generate_cogs(memory_file.name, str(temp_file), overview_resampling='nearest')
 
-                # Build COG
-                generate_cogs(str(temp_file), str(temp_file))
+        # Move right place
+        shutil.move(str(temp_file), str(quality_file_path))
 
-        with rasterio.open(str(temp_file), **options) as quality_ds:
-            blocks = list(quality_ds.block_windows())
-            profile = quality_ds.profile
-            nodata = profile.get('nodata') or 255
-            raster_merge = quality_ds.read(1)
-            for _, block in blocks:
-                nodata_positions = []
 
-                row_offset = block.row_off + block.height
-                col_offset = block.col_off + block.width
+def mask_nodata_blocks(raster, transform, band_files: list, windows: list, nodata,
+                       band_nodata=-9999, workers: int = None):
+    """Set ``nodata`` in raster pixels which any of band files has ``band_nodata``.
 
-                for band in bands:
-                    band_file = scenes[band.name]
+    The band files are opened only once (per worker) and, for each block window, a boolean
+    mask is accumulated across bands and applied directly in the raster.
+    The band files are read in the raster grid, so bands with different resolutions are supported.
 
-                    with rasterio.open(str(band_file)) as ds:
-                        raster = ds.read(1, window=block)
+    Args:
+        raster: Numpy raster to be changed in place.
+        transform: Affine transform of the raster.
+        band_files: List of band files paths.
+        windows: The raster block windows to process.
+        nodata: Value to set in raster.
+        band_nodata: Nodata value to seek in bands. Default is -9999.
+        workers: Number of threads to process the blocks concurrently.
+            Default is ``Config.POST_PROCESSING_WORKERS``.
+    """
+    workers = max(1, workers or Config.POST_PROCESSING_WORKERS)
 
-                    nodata_found = numpy.where(raster == -9999)
-                    raster_nodata_pos = numpy.ravel_multi_index(nodata_found, raster.shape)
-                    nodata_positions = numpy.union1d(nodata_positions, raster_nodata_pos)
+    def _process(chunk):
+        with contextlib.ExitStack() as stack:
+            # Each worker keeps its own handlers since a dataset must not be shared among threads
+            datasets = [stack.enter_context(rasterio.open(str(band_file))) for band_file in band_files]
 
-                if len(nodata_positions):
-                    raster_merge[block.row_off: row_offset, block.col_off: col_offset][
-                        numpy.unravel_index(nodata_positions.astype(numpy.int64), raster.shape)] = nodata
+            for window in chunk:
+                shape = int(window.height), int(window.width)
+                bounds = rasterio.windows.bounds(window, transform)
+                mask = numpy.zeros(shape, dtype=bool)
 
-        save_as_cog(str(temp_file), raster_merge, **profile)
+                for ds in datasets:
+                    if ds.transform == transform:
+                        band = ds.read(1, window=window)
+                    else:
+                        band_window = rasterio.windows.from_bounds(*bounds, transform=ds.transform)
+                        band = ds.read(1, window=band_window, out_shape=shape, resampling=Resampling.nearest)
 
-        # Move right place
-        shutil.move(str(temp_file), str(quality_file_path))
+                    mask |= band == band_nodata
 
+                raster[window.row_off: window.row_off + shape[0], window.col_off: window.col_off + shape[1]][mask] = nodata
 
-def save_as_cog(destination: str, raster, mode='w', **profile):
-    """Save the raster file as Cloud Optimized GeoTIFF.
+    if not band_files or not windows:
+        return raster
 
-    See Also:
-        Cloud Optimized GeoTiff https://gdal.org/drivers/raster/cog.html
+    if workers == 1:
+        _process(windows)
+        return raster
 
-    Args:
-        destination: Path to store the data set.
-        raster: Numpy raster values to persist in disk
-        mode: Default rasterio mode. Default is 'w' but you also can set 'r+'.
-        **profile: Rasterio profile values to add in dataset.
-    """
-    with rasterio.open(str(destination), mode, **profile) as dataset:
-        if profile.get('nodata'):
-            dataset.nodata = profile['nodata']
+    # Blocks are disjoint, so the workers may write in the raster concurrently.
+    chunks = [windows[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(_process, chunk) for chunk in chunks if chunk]:
+            future.result()
 
-        dataset.write_band(1, raster)
-        dataset.build_overviews([2, 4, 8, 16, 32, 64], Resampling.nearest)
-        dataset.update_tags(ns='rio_overview', resampling='nearest')
+    return raster
 
-    generate_cogs(str(destination), str(destination))
 
+def is_valid_compressed_file(file_path: str, use_cache: bool = None) -> bool:
+    """Check if given file is a compressed file and hen check file integrity.
 
-def is_valid_compressed_file(file_path: str) -> bool:
-    """Check if given file is a compressed file and hen check file integrity."""
-    if file_path.endswith('.zip'):
-        return is_valid_compressed(file_path)
+    The zip and tar.gz files verified before (and not modified since) are not verified again
+    when ``use_cache`` is set. Default is ``Config.INTEGRITY_CACHE``.
+    """
+    if use_cache is None:
+        use_cache = Config.INTEGRITY_CACHE
+
+    if file_path.endswith('.zip') or file_path.endswith('.tar.gz'):
+        return verify_archive(file_path, use_cache=use_cache)
     if file_path.endswith('.tar'):
         return is_valid_tar(file_path)
-    if file_path.endswith('.tar.gz'):
-        return is_valid_tar_gz(file_path)
     if file_path.endswith('.hdf'):
         from .hdf import is_valid
         return is_valid(file_path)
@@ -428,27 +579,103 @@ def is_valid_tar(file_path: str) -> bool:
 
 def is_valid_tar_gz(file_path: str):
     """Check tar file integrity."""
-    import subprocess
-    try:
-        retcode = subprocess.call(['gunzip', '-t', file_path])
-        return retcode == 0
-    except BaseException:
-        return False
+    return verify_gzip(file_path) is not None
+
+
+def _get_provider_setting(catalog: str) -> ProviderSetting:
+    """Retrieve the ProviderSetting of a catalog (bdc_catalog.models.Provider name).
+
+    The setting values are cached in process (See :func:`bdc_collection_builder.collections.cache.get_provider_cache`)
+    and the cached setting is added to the session without any query.
+    """
+    cache = get_provider_cache()
+    key = provider_key('setting', catalog)
+    values = cache.get_many([key])[0] if cache is not None else None
+
+    if values is None:
+        provider = (
+            Provider.query()
+            .filter(Provider.name == catalog)
+            .first_or_404(f'Provider {catalog} not found')
+        )
+
+        provider_setting: ProviderSetting = (
+            ProviderSetting.query()
+            .filter(ProviderSetting.provider_id == provider.id)
+            .first_or_404(f'Provider "{catalog}" is not related with ProviderSetting.')
+        )
+
+        if cache is not None:
+            values = {column.key: getattr(provider_setting, column.key) for column in ProviderSetting.__table__.c}
+            cache.set_many({key: copy.deepcopy(values)}, {key: Config.PROVIDER_CACHE_TTL})
+
+        return provider_setting
+
+    provider_setting = ProviderSetting.__mapper__.class_manager.new_instance()
+
+    for name, value in copy.deepcopy(values).items():
+        set_committed_value(provider_setting, name, value)
+
+    make_transient_to_detached(provider_setting)
+
+    return db.session.merge(provider_setting, load=False)
+
+
+def _create_provider_instance(provider_type: Type[BaseProvider], credentials, **options) -> BaseProvider:
+    if isinstance(credentials, dict):
+        opts = dict(**credentials)
+        opts.update(options)
+        return provider_type(**opts)
+
+    return provider_type(*credentials, **options)
+
+
+def get_provider_instance(provider_type: Type[BaseProvider], credentials, **options) -> BaseProvider:
+    """Retrieve an instance of a data collector provider (bdc_collectors) with the given credentials.
+
+    The instances are reused in process while cached, keyed by the driver, the credentials (hashed)
+    and the options. See :func:`bdc_collection_builder.collections.cache.get_provider_cache`.
+
+    Note:
+        The providers keep a HTTP session, which is not thread-safe. The cache keeps a
+        :class:`threading.local` holder, so each thread gets its own instance, which may be handed
+        to another thread (like :class:`bdc_collection_builder.collections.collect.DownloadRace`)
+        as long as they do not use it at the same time.
+
+    Args:
+        provider_type: The provider class (See :func:`get_provider_type`).
+        credentials: The provider credentials (``dict`` or ``list``).
+        **options: Extra parameters to the provider.
+    """
+    cache = get_provider_cache()
+
+    if cache is None:
+        return _create_provider_instance(provider_type, credentials, **options)
+
+    key = provider_key('collector', f'{provider_type.__module__}.{provider_type.__qualname__}',
+                       credentials=credentials, **options)
+
+    holder = cache.get_many([key])[0]
+
+    if holder is None:
+        holder = threading.local()
+        cache.set_many({key: holder}, {key: Config.PROVIDER_CACHE_TTL})
+
+    instance = getattr(holder, 'instance', None)
+
+    if instance is None:
+        instance = _create_provider_instance(provider_type, credentials, **options)
+        holder.instance = instance
+
+    return instance
 
 
 def get_provider(catalog, **kwargs) -> Tuple[ProviderSetting, BaseProvider]:
-    """Retrieve ProviderSetting related with bdc_catalog.models.Provider."""
-    provider = (
-        Provider.query()
-        .filter(Provider.name == catalog)
-        .first_or_404(f'Provider {catalog} not found')
-    )
+    """Retrieve ProviderSetting related with bdc_catalog.models.Provider.
 
-    provider_setting: ProviderSetting = (
-        ProviderSetting.query()
-        .filter(ProviderSetting.provider_id == provider.id)
-        .first_or_404(f'Provider "{catalog}" is not related with ProviderSetting.')
-    )
+    The provider setting and the provider instance are cached in process for ``Config.PROVIDER_CACHE_TTL`` seconds.
+    """
+    provider_setting = _get_provider_setting(catalog)
 
     provider_type = get_provider_type(provider_setting.driver_name)
 
@@ -459,12 +686,7 @@ def get_provider(catalog, **kwargs) -> Tuple[ProviderSetting, BaseProvider]:
     options.setdefault('lazy', True)
     options.setdefault('progress', False)
 
-    if isinstance(provider_setting.credentials, dict):
-        opts = dict(**provider_setting.credentials)
-        opts.update(options)
-        provider_ext = provider_type(**opts)
-    else:
-        provider_ext = provider_type(*provider_setting.credentials, **options)
+    provider_ext = get_provider_instance(provider_type, provider_setting.credentials, **options)
 
     return provider_setting, provider_ext
 
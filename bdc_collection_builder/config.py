@@ -18,6 +18,7 @@
 
 """Define config file for Brazil Data Cube Collection Builder."""
 
+import json
 import os
 import tempfile
 from distutils.util import strtobool
@@ -101,6 +102,69 @@ class Config:
 
     TASK_RETRY_DELAY = int(os.environ.get('TASK_RETRY_DELAY', 60 * 15))  # a hour
 
+    # Maximum number of bands translated to Cloud Optimized GeoTIFF concurrently while publishing an item.
+    # Use 0 to derive it from the CPU count and GDAL_NUM_THREADS.
+    PUBLISH_COG_WORKERS = int(os.getenv('PUBLISH_COG_WORKERS', '0'))
+    # Maximum raster size (in pixels) read to compute the item footprint. Lower values are faster but less accurate.
+    FOOTPRINT_MAX_SIZE = int(os.getenv('FOOTPRINT_MAX_SIZE', '2048'))
+    # Number of threads used to propagate the spectral bands nodata into quality band (post processing).
+    POST_PROCESSING_WORKERS = int(os.getenv('POST_PROCESSING_WORKERS', '1'))
+    # Skip the integrity check of archives already verified and not changed since (size/modification time).
+    INTEGRITY_CACHE = strtobool(os.getenv('INTEGRITY_CACHE', 'YES'))
+    # Directory to store the fingerprint of verified archives.
+    INTEGRITY_CACHE_DIR = os.getenv('INTEGRITY_CACHE_DIR', os.path.join(WORKING_DIR, '.integrity'))
+    # Number of threads used to verify the zip members CRC.
+    INTEGRITY_WORKERS = int(os.getenv('INTEGRITY_WORKERS', '4'))
+    # Number of providers racing concurrently to download a scene. The first valid file wins.
+    # Use 1 to try the providers one by one following the priority order.
+    DOWNLOAD_RACE_PROVIDERS = int(os.getenv('DOWNLOAD_RACE_PROVIDERS', '1'))
+    # Seconds to wait before starting the next provider in the race (hedged download). Use 0 to start all at once.
+    DOWNLOAD_HEDGE_DELAY = float(os.getenv('DOWNLOAD_HEDGE_DELAY', '0'))
+    # Seconds to wait for the losers of a download race to finish, before leaving the staging directory.
+    DOWNLOAD_RACE_CANCEL_TIMEOUT = int(os.getenv('DOWNLOAD_RACE_CANCEL_TIMEOUT', '60'))
+    # Directory to keep the partial downloads between task retries.
+    DOWNLOAD_STAGING_DIR = os.getenv('DOWNLOAD_STAGING_DIR', os.path.join(WORKING_DIR, 'staging'))
+    # Seconds to wait for the staging directory locked by another task of the same scene. The task is retried later.
+    DOWNLOAD_STAGING_LOCK_TIMEOUT = int(os.getenv('DOWNLOAD_STAGING_LOCK_TIMEOUT', '60'))
+    # Number of activities written per INSERT statement while dispatching tasks.
+    ACTIVITY_BATCH_SIZE = int(os.getenv('ACTIVITY_BATCH_SIZE', '1000'))
+    # Maximum number of threads searching scenes/tiles in the data providers for a single request.
+    SEARCH_WORKERS = int(os.getenv('SEARCH_WORKERS', '8'))
+    # Maximum number of concurrent searches in the same data provider (per process).
+    SEARCH_PROVIDER_CONCURRENCY = int(os.getenv('SEARCH_PROVIDER_CONCURRENCY', '4'))
+    # Maximum number of searches per second in the same data provider. Use 0 to disable.
+    SEARCH_RATE_LIMIT = float(os.getenv('SEARCH_RATE_LIMIT', '0'))
+    # Cache the data provider search results.
+    SEARCH_CACHE_ENABLED = strtobool(os.getenv('SEARCH_CACHE_ENABLED', 'YES'))
+    # The search cache backend: "redis" (shared, falls back to memory when unavailable) or "memory".
+    SEARCH_CACHE_BACKEND = os.getenv('SEARCH_CACHE_BACKEND', 'redis')
+    # Default time to live (seconds) of the cached searches.
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', str(60 * 60 * 6)))
+    # Time to live (seconds) by provider name as JSON. i.e '{"USGS": 3600, "MODIS": 86400}'
+    SEARCH_CACHE_PROVIDER_TTL = json.loads(os.getenv('SEARCH_CACHE_PROVIDER_TTL', '{}'))
+    # Maximum number of cached searches.
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '10000'))
+    # Seconds to keep the provider settings and the data collector instances in the process (0 disables the cache).
+    PROVIDER_CACHE_TTL = int(os.getenv('PROVIDER_CACHE_TTL', '300'))
+    # Maximum number of cached provider settings and data collector instances in the process.
+    PROVIDER_CACHE_MAX_ENTRIES = int(os.getenv('PROVIDER_CACHE_MAX_ENTRIES', '256'))
+    # Seconds between the checks of the provider settings version in Redis (changes made by other processes).
+    PROVIDER_CACHE_VERSION_INTERVAL = int(os.getenv('PROVIDER_CACHE_VERSION_INTERVAL', '10'))
+    # Seconds to keep the state and results of asynchronous jobs (check scenes) in Redis.
+    JOB_TTL = int(os.getenv('JOB_TTL', str(60 * 60 * 24)))
+    # Maximum seconds to follow a job stream (follow=true) in a single request.
+    JOB_STREAM_TIMEOUT = int(os.getenv('JOB_STREAM_TIMEOUT', '300'))
+    # Persist the radcor requests (action=start) as submissions and build/publish the tasks in a dispatcher worker.
+    RADCOR_ASYNC_DISPATCH = strtobool(os.getenv('RADCOR_ASYNC_DISPATCH', 'NO'))
+    # Number of scene task chains published per Celery group while dispatching a radcor request.
+    DISPATCH_CHUNK_SIZE = int(os.getenv('DISPATCH_CHUNK_SIZE', '500'))
+    # Seconds to wait between the published chunks of tasks.
+    DISPATCH_CHUNK_DELAY = float(os.getenv('DISPATCH_CHUNK_DELAY', '0'))
+    # Number of monthly partitions of activity history created ahead of the current month.
+    ACTIVITY_HISTORY_PARTITIONS_AHEAD = int(os.getenv('ACTIVITY_HISTORY_PARTITIONS_AHEAD', '3'))
+    # Directory where the archived partitions of activity history are exported.
+    ACTIVITY_HISTORY_ARCHIVE_DIR = os.getenv('ACTIVITY_HISTORY_ARCHIVE_DIR', os.path.join(WORKING_DIR, 'history'))
+
 
 class ProductionConfig(Config):
     """Production Mode."""
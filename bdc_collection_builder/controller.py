@@ -20,26 +20,31 @@
 
 # Python Native
 import json
+import logging
+from copy import deepcopy
 from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
 
 # 3rdparty
 from bdc_catalog.models import Collection, GridRefSys, Item, Provider, Tile
-from celery import chain, group
+from celery import chain, group, states
 from celery.backends.database import Task
 from dateutil.relativedelta import relativedelta
-from flask import current_app
-from sqlalchemy import Date, and_, func, or_
+from sqlalchemy import and_, func, or_, select, true
+from sqlalchemy.dialects.postgresql import insert
 from werkzeug.exceptions import BadRequest, abort
 
 # Builder
-from .celery.tasks import correction, download, post, publish
+from .celery.tasks import correction, dispatch_submission, download, post, publish
+from .celery.utils import publish_in_chunks
 from .collections.collect import get_provider_order
-from .collections.models import (ActivitySRC, RadcorActivity,
-                                 RadcorActivityHistory, db)
+from .collections.models import (ActivitySRC, RadcorActivity, RadcorActivityDailyStatus,
+                                 RadcorActivityHistory, RadcorActivityStatus, RadcorSubmission, db)
+from .collections.cache import get_search_cache
+from .collections.search import SearchExecutor, SearchQuery
 from .collections.utils import get_or_create_model, get_provider, safe_request
-from .forms import CollectionForm, RadcorActivityForm, SimpleActivityForm
-
-from copy import deepcopy
+from .config import Config
+from .forms import CollectionForm, SimpleActivityForm, SubmissionForm
 
 
 def _generate_periods(start_date: datetime, end_date: datetime, unit='m'):
@@ -75,13 +80,17 @@ class RadcorBusiness:
     def restart(cls, ids=None, status=None, activity_type=None, sceneid=None, collection_id=None, action=None, **kwargs):
         """Restart celery task execution.
 
+        The activities are read in batches of ``Config.ACTIVITY_BATCH_SIZE`` and the
+        task canvases are published in chunks (See :func:`bdc_collection_builder.celery.utils.publish_in_chunks`).
+
         Args:
             ids - List of Activity ID
             status - Filter by task status
             activity_type - Filter by activity type
 
         Returns:
-            Affected activities
+            The number of activities found (``total``). When ``action`` is ``start``, the number of
+            activities dispatched (``queued``). Otherwise, the activities found (``activities``).
         """
         restrictions = []
 
@@ -89,7 +98,7 @@ class RadcorBusiness:
             restrictions.append(RadcorActivity.id.in_(ids))
 
         if status:
-            restrictions.append(RadcorActivityHistory.task.has(status=status))
+            restrictions.append(RadcorActivity.history.any(RadcorActivityHistory.task.has(status=status)))
 
         if activity_type:
             restrictions.append(RadcorActivity.activity_type == activity_type)
@@ -107,20 +116,102 @@ class RadcorBusiness:
         if len(restrictions) == 0:
             raise BadRequest('Invalid restart. Requires "ids", "activity_type" or "status"')
 
-        activities = db.session.query(RadcorActivity).filter(*restrictions).all()
+        activity_ids = [
+            row.id for row in (
+                db.session.query(RadcorActivity.id)
+                .filter(*restrictions)
+                .order_by(RadcorActivity.id)
+                .yield_per(Config.ACTIVITY_BATCH_SIZE)
+            )
+        ]
+
+        if str(action).lower() != 'start':
+            serializer = SimpleActivityForm()
+            activities = []
+
+            for offset in range(0, len(activity_ids), Config.ACTIVITY_BATCH_SIZE):
+                batch = activity_ids[offset:offset + Config.ACTIVITY_BATCH_SIZE]
+
+                activities.extend(serializer.dump(RadcorActivity.query().filter(RadcorActivity.id.in_(batch))
+                                                  .order_by(RadcorActivity.id).all(), many=True))
+                db.session.expunge_all()
+
+            return dict(total=len(activity_ids), activities=activities)
+
+        def _canvases():
+            for offset in range(0, len(activity_ids), Config.ACTIVITY_BATCH_SIZE):
+                batch = activity_ids[offset:offset + Config.ACTIVITY_BATCH_SIZE]
+                activities, children = cls._load_activity_trees(batch)
+
+                for activity_id in batch:
+                    yield cls._restart_canvas(activity_id, activities, children)
+
+        queued = publish_in_chunks(_canvases())
+
+        return dict(total=len(activity_ids), queued=queued)
+
+    @classmethod
+    def _load_activity_trees(cls, activity_ids: List[int]) -> Tuple[Dict[int, dict], Dict[int, List[int]]]:
+        """Load the activities and their descendants with a query per tree level.
+
+        Only the columns used in the task arguments are loaded. The history is not
+        required since the tasks create a new execution.
+
+        Returns:
+            Tuple of the activities (task arguments) by id and the children ids by activity id.
+        """
+        activities = dict()
+        children = dict()
+        level = list(activity_ids)
+
+        while level:
+            rows = (
+                db.session.query(RadcorActivity.id, RadcorActivity.collection_id, RadcorActivity.activity_type,
+                                 RadcorActivity.args, RadcorActivity.tags, RadcorActivity.scene_type,
+                                 RadcorActivity.sceneid)
+                .filter(RadcorActivity.id.in_(level))
+                .all()
+            )
+
+            for row in rows:
+                activities[row.id] = cls._activity_dump(row.id, row._asdict())
+
+            relations = (
+                db.session.query(ActivitySRC.activity_src_id, ActivitySRC.activity_id)
+                .filter(ActivitySRC.activity_src_id.in_(level))
+                .order_by(ActivitySRC.activity_id)
+                .all()
+            )
+
+            for parent_id, child_id in relations:
+                children.setdefault(parent_id, []).append(child_id)
 
-        # Define a start wrapper in order to preview or start activity
-        start_activity = cls.dispatch if str(action).lower() == 'start' else lambda _: _
+            level = list({child_id for _, child_id in relations if child_id not in activities})
 
-        serializer = SimpleActivityForm()
+        return activities, children
 
-        serialized_activities = []
+    @classmethod
+    def _restart_canvas(cls, activity_id: int, activities: Dict[int, dict], children: Dict[int, List[int]],
+                        parent_id: int = None):
+        """Create the task canvas of an activity and its descendants (chained)."""
+        activity = activities[activity_id]
+
+        _task = cls._task_definition(activity['activity_type'])
+
+        if parent_id is None:
+            handler = _task.s(activity)
+        else:
+            handler = _task.s(collection_id=int(activity['collection_id']), activity_type=activity['activity_type'])
+
+        if not children.get(activity_id):
+            return handler
 
-        for activity in activities:
-            start_activity(activity)
-            serialized_activities.append(serializer.dump(activity))
+        tasks = [
+            cls._restart_canvas(child_id, activities, children, parent_id=activity_id)
+            for child_id in children[activity_id]
+        ]
 
-        return serialized_activities
+        return handler | chain(*tasks)
 
     @classmethod
     def create_activity(cls, activity, parent=None):
@@ -150,41 +241,6 @@ class RadcorBusiness:
 
         return model, created
 
-    @classmethod
-    def dispatch(cls, activity: RadcorActivity, skip_collection_id=None):
-        """Search by activity and dispatch the respective task.
-
-        TODO: Support object to skip tasks using others values.
-
-        Args:
-            activity - Activity to dispatch
-            skip_collection_id - Skip the tasks with has the given collection id.
-        """
-        def _dispatch_task(_activity, parent=None):
-            dump = RadcorActivityForm().dump(_activity)
-
-            _task = cls._task_definition(_activity.activity_type)
-
-            if not _activity.children:
-                if parent is None:
-                    return _task.s(dump)
-                return _task.s()
-
-            tasks = []
-
-            for child in _activity.children:
-                if skip_collection_id == child.activity.collection_id:
-                    continue
-
-                tasks.append(_dispatch_task(child.activity, parent=_activity))
-
-            handler = _task.s(dump) if parent is None else _task.s()
-
-            return handler | chain(*tasks)
-
-        task = _dispatch_task(activity, parent=None)
-        task.apply_async()
-
     @classmethod
     def _task_definition(cls, task_type):
         """Get a task by string.
@@ -225,21 +281,20 @@ class RadcorBusiness:
         )
 
     @classmethod
-    def radcor(cls, args: dict):
-        """Search for Landsat/Sentinel Images and dispatch download task."""
-        args.setdefault('cloud', 100)
-
-        cloud = float(args['cloud'])
-        action = args.get('action', 'preview')
+    def _radcor_queries(cls, args: dict, split_periods: bool = False) -> Tuple[object, List[SearchQuery]]:
+        """Create the data provider and the search queries of a radcor request.
 
-        collections = Collection.query().filter(Collection.collection_type.in_(['collection', 'cube'])).all()
-
-        # TODO: Review this code. The collection name is not unique anymore.
-        collections_map = {f'{c.name}-{c.version}': c.id for c in collections}
+        Args:
+            args: The radcor arguments. See :class:`bdc_collection_builder.forms.SearchImageForm`.
+            split_periods: Split a single search (bbox or geom) into monthly periods. The results of
+                each period are available as soon as the period search is done.
 
-        tasks = args.get('tasks', [])
+        Returns:
+            Tuple of the data provider instance and the list of queries.
+        """
+        args.setdefault('cloud', 100)
 
-        force = args.get('force', False)
+        cloud = float(args['cloud'])
         catalog_args = args.get('catalog_args', dict())
         options = dict()
         options.update(args.get("catalog_search_args", {}))
@@ -256,43 +311,180 @@ class RadcorBusiness:
             bbox = [w, s, e, n]
             options['bbox'] = bbox
 
+        _, provider = get_provider(catalog=args['catalog'], **catalog_args)
+
+        if 'scenes' in args:
+            queries = [
+                SearchQuery(scene, dict(query=args['dataset'], filename=f'{scene}*', **options))
+                for scene in sorted(set(args['scenes']))
+            ]
+        elif 'tiles' in args:
+            queries = [
+                SearchQuery(tile, dict(query=args['dataset'], tile=tile, start_date=args['start'],
+                                       end_date=args['end'], cloud_cover=cloud, **options))
+                for tile in args['tiles']
+            ]
+        elif split_periods and args.get('start') and args.get('end'):
+            start_date, end_date = args['start'].replace(tzinfo=None), args['end'].replace(tzinfo=None)
+            queries = []
+
+            for start, end in _generate_periods(start_date, end_date):
+                # The periods end at the beginning of the last day of month
+                end = min(end + timedelta(days=1, microseconds=-1), end_date)
+
+                queries.append(SearchQuery(f'{start.date()}/{end.date()}',
+                                           dict(query=args['dataset'], start_date=start, end_date=end,
+                                                cloud_cover=cloud, **options)))
+        else:
+            queries = [
+                SearchQuery(args['dataset'], dict(query=args['dataset'], start_date=args['start'],
+                                                  end_date=args['end'], cloud_cover=cloud, **options))
+            ]
+
+        return provider, queries
+
+    @staticmethod
+    def _search_cache(args: dict):
+        """Retrieve the search cache of a radcor request.
+
+        The ``action=start`` searches the provider unless ``cache`` is explicitly set, so the
+        newly published scenes are not skipped by a cached search.
+        """
+        use_cache = args.get('cache')
+
+        if use_cache is None:
+            use_cache = args.get('action', 'preview') != 'start'
+
+        return get_search_cache() if use_cache else None
+
+    @classmethod
+    def radcor_preview_stream(cls, args: dict) -> Iterator[dict]:
+        """Search for the scenes of a radcor preview and yield them as soon as each search is done.
+
+        Differently from :meth:`radcor`, the scenes are not merged in memory: each query result
+        (scene, tile or month) is yielded and released before the next one. Only the scene
+        identifiers are kept in order to skip the duplicated scenes between the queries.
+
+        The data provider is created before returning the iterator, so invalid catalogs
+        fail before the response starts.
+
+        Returns:
+            Iterator of the scenes as ``dict(type='scene', scene_id, cloud_cover, link)`` and, at the end,
+            ``dict(type='summary', Results, errors)`` with the number of scenes and the failed queries.
+        """
+        provider, queries = cls._radcor_queries(args, split_periods=True)
+
+        executor = SearchExecutor(cache=cls._search_cache(args))
+
+        def _stream():
+            seen = set()
+            errors = []
+
+            with safe_request():
+                for query, scenes, error in executor.iter_search(provider, queries, provider_name=args['catalog']):
+                    if error is not None:
+                        logging.warning(f'Search {query.key} failed - {str(error)}')
+                        errors.append(dict(query=str(query.key), error=str(error)))
+                        continue
+
+                    for scene in scenes:
+                        if scene.scene_id in seen:
+                            continue
+
+                        seen.add(scene.scene_id)
+
+                        yield dict(type='scene', scene_id=scene.scene_id, cloud_cover=scene.cloud_cover,
+                                   link=scene.link)
+
+            yield dict(type='summary', Results=len(seen), errors=errors)
+
+        return _stream()
+
+    @classmethod
+    def submit(cls, args: dict) -> RadcorSubmission:
+        """Persist a radcor request and dispatch it asynchronously.
+
+        The request is processed by :func:`bdc_collection_builder.celery.tasks.dispatch_submission`.
+        When the task can not be published (broker unavailable), the submission is marked as ``FAILURE``.
+
+        Args:
+            args: The radcor request (not loaded). See :class:`bdc_collection_builder.forms.SearchImageForm`.
+        """
+        submission = RadcorSubmission(args=args, status=states.PENDING)
+        submission.save()
+
         try:
-            catalog_provider, provider = get_provider(catalog=args['catalog'], **catalog_args)
+            dispatch_submission.apply_async(args=(submission.id,))
+        except Exception as e:
+            logging.error(f'Could not dispatch the submission {submission.id} - {str(e)}')
+
+            submission.status = states.FAILURE
+            submission.error = f'Could not dispatch the submission - {str(e)}'
+            submission.finished = datetime.utcnow()
+            submission.save()
+
+            abort(503, f'Could not dispatch the submission {submission.id}. Try again later.')
+
+        return submission
+
+    @classmethod
+    def get_submission(cls, submission_id: int) -> dict:
+        """Retrieve the status of a radcor submission."""
+        submission = RadcorSubmission.query().get(submission_id)
+
+        if submission is None:
+            abort(404, f'Submission {submission_id} not found.')
+
+        return SubmissionForm().dump(submission)
+
+    @classmethod
+    def radcor(cls, args: dict, submission: RadcorSubmission = None) -> dict:
+        """Search for Landsat/Sentinel Images and dispatch download task.
+
+        When any search fails (tile, scene or period), the ``action=start`` is aborted unless
+        ``partial`` is set. The failed searches are always returned in ``errors``.
+
+        Args:
+            args: The radcor arguments. See :class:`bdc_collection_builder.forms.SearchImageForm`.
+            submission: Optional submission to track the number of scenes, activities and queued tasks.
+
+        Returns:
+            The scenes found as ``dict(tiles, Results, errors)``.
+        """
+        action = args.get('action', 'preview')
+
+        collections = Collection.query().filter(Collection.collection_type.in_(['collection', 'cube'])).all()
+
+        # TODO: Review this code. The collection name is not unique anymore.
+        collections_map = {f'{c.name}-{c.version}': c.id for c in collections}
+
+        tasks = args.get('tasks', [])
+
+        force = args.get('force', False)
+        catalog_args = args.get('catalog_args', dict())
+
+        try:
+            provider, queries = cls._radcor_queries(args)
 
             with safe_request():
-                if 'scenes' in args:
-                    result = []
+                executor = SearchExecutor(cache=cls._search_cache(args))
+                search = executor.search(provider, queries, provider_name=args['catalog'])
 
-                    unique_scenes = set(args['scenes'])
+            if search.errors:
+                message = f'{len(search.errors)} of {search.total_queries} searches failed in {args["catalog"]}'
+                logging.warning(f'{message}: {search.errors}')
 
-                    for scene in unique_scenes:
-                        query_result = provider.search(
-                            query=args['dataset'],
-                            filename=f'{scene}*',
-                            **options
-                        )
+                if action == 'start':
+                    if not args.get('partial', False):
+                        abort(502, f'{message}. Use "partial" to start the scenes found anyway: {search.errors}')
 
-                        result.extend(query_result)
-                elif 'tiles' in args:
-                    result = []
-                    for tile in args['tiles']:
-                        query_result = provider.search(
-                            query=args['dataset'],
-                            tile=tile,
-                            start_date=args['start'],
-                            end_date=args['end'],
-                            cloud_cover=cloud,
-                            **options
-                        )
-                        result.extend(query_result)
-                else:
-                    result = provider.search(
-                        query=args['dataset'],
-                        start_date=args['start'],
-                        end_date=args['end'],
-                        cloud_cover=cloud,
-                        **options
-                    )
+                    if submission is not None:
+                        submission.error = f'{message}: {search.errors}'
+
+            result = search.scenes
+
+            if submission is not None:
+                submission.scenes_found = len(result)
 
             tasks_collections = _get_tasks_collections(tasks)
             where = [
@@ -315,19 +507,22 @@ class RadcorBusiness:
                 items_map.setdefault(item.name, [])
                 items_map[item.name].append(item.collection_id)
 
-            def _recursive(scene, task, parent=None, parallel=True, pass_args=True):
-                """Create task dispatcher recursive."""
+            activities = dict()
+            lineage = set()
+
+            def _plan(scene, task, parent_key=None):
+                """Compute the activity rows of a scene task tree in memory."""
                 collection_id = collections_map[task['collection']]
                 # Create activity definition example
                 activity = cls._activity_definition(collection_id, task['type'], scene, **task['args'])
                 activity['args'].update(dict(catalog=args['catalog'], dataset=args['dataset'], catalog_args=catalog_args))
 
-                _task = cls._task_definition(task['type'])
-                # Try to create activity in database and the parent if there is.
-                instance, created = cls.create_activity(activity, parent)
+                key = (collection_id, task['type'], activity['sceneid'])
+                # The activity args are always overwritten with the latest definition
+                activities[key] = activity
 
-                instance.args = deepcopy(activity['args'])
-                instance.save(commit=False)
+                if parent_key is not None:
+                    lineage.add((key, parent_key))
 
                 if activity["sceneid"] in items_map:
                     cached_collections = items_map[activity["sceneid"]]
@@ -336,59 +531,162 @@ class RadcorBusiness:
                     if collection_id in cached_collections and not force:
                         return None
 
-                dump = RadcorActivityForm().dump(instance)
-                dump['args'].update(activity['args'])
+                children = []
+
+                for child in task.get('tasks') or []:
+                    child_node = _plan(scene, child, parent_key=key)
+
+                    if child_node:
+                        children.append(child_node)
 
-                keywords = dict(collection_id=collection_id, activity_type=task['type'])
+                return dict(key=key, task=task, has_children=bool(task.get('tasks')), children=children)
+
+            def _recursive(node, activity_ids, parent=None, parallel=True, pass_args=True):
+                """Create task dispatcher recursive."""
+                collection_id, activity_type, _ = node['key']
+                activity = activities[node['key']]
+
+                _task = cls._task_definition(activity_type)
+
+                keywords = dict(collection_id=collection_id, activity_type=activity_type)
                 # If no children
-                if not task.get('tasks'):
+                if not node['has_children']:
                     if parent is None:
-                        return _task.s(dump, force=force)
+                        return _task.s(cls._activity_dump(activity_ids[node['key']], activity), force=force)
                     return _task.s(**keywords)
 
-                res = []
-
-                for child in task['tasks']:
-                    # When triggering children, use parallel=False to use chain workflow
-                    child_task = _recursive(scene, child, parent=instance, parallel=False, pass_args=False)
-
-                    if child_task:
-                        res.append(child_task)
+                # When triggering children, use parallel=False to use chain workflow
+                res = [
+                    _recursive(child, activity_ids, parent=node, parallel=False, pass_args=False)
+                    for child in node['children']
+                ]
 
                 handler = group(*res) if parallel else chain(*res)
 
                 arguments = []
 
                 if pass_args:
-                    arguments.append(dump)
+                    arguments.append(cls._activity_dump(activity_ids[node['key']], activity))
 
                 return _task.s(*arguments, **keywords) | handler
 
             if action == 'start':
-                to_dispatch = []
+                nodes = []
 
-                with db.session.begin_nested():
-                    for task in tasks:
-                        if task['type'] == 'download':
-                            cls.validate_provider(collections_map[task['collection']])
+                for task in tasks:
+                    if task['type'] == 'download':
+                        cls.validate_provider(collections_map[task['collection']])
 
-                        for scene_result in result:
-                            children_task = _recursive(scene_result, task, parent=None)
+                    for scene_result in result:
+                        node = _plan(scene_result, task)
 
-                            if children_task:
-                                to_dispatch.append(children_task)
+                        if node:
+                            nodes.append(node)
+
+                with db.session.begin_nested():
+                    activity_ids = cls._bulk_upsert_activities(list(activities.values()))
+                    cls._bulk_create_lineage([
+                        (activity_ids[key], activity_ids[parent_key]) for key, parent_key in lineage
+                    ])
+
+                    if submission is not None:
+                        submission.activities_written = len(activity_ids)
 
                 db.session.commit()
 
-                if len(to_dispatch) > 0:
-                    group(to_dispatch).apply_async()
+                def _count_tasks(node):
+                    """Count the tasks of a scene canvas (one task per activity)."""
+                    return 1 + sum(_count_tasks(child) for child in node['children'])
+
+                # Number of tasks of each canvas built and not published yet (in the publish order)
+                pending_tasks = []
+
+                def _canvases():
+                    for node in nodes:
+                        pending_tasks.append(_count_tasks(node))
+                        yield _recursive(node, activity_ids)
+
+                def _on_publish(count):
+                    published = sum(pending_tasks[:count])
+                    del pending_tasks[:count]
+
+                    if submission is not None:
+                        submission.tasks_queued += published
+                        db.session.commit()
+
+                # Build the canvas lazily and publish in chunks in order to avoid a single giant group message
+                publish_in_chunks(_canvases(), on_publish=_on_publish)
         except Exception:
             db.session.rollback()
             raise
 
-        return [{"scene_id": scene.scene_id,
-                 "cloud_cover": scene.cloud_cover,
-                 "link": scene.link} for scene in result]
+        scenes = [{"scene_id": scene.scene_id,
+                   "cloud_cover": scene.cloud_cover,
+                   "link": scene.link} for scene in result]
+
+        return dict(tiles=scenes, Results=len(scenes), errors=search.errors)
+
+    @classmethod
+    def _activity_dump(cls, activity_id: int, activity: dict) -> dict:
+        """Serialize an activity definition as task argument.
+
+        It has the same fields of ``RadcorActivityForm`` without loading the model and its history.
+        """
+        return dict(
+            id=activity_id,
+            collection_id=str(activity['collection_id']),
+            activity_type=activity['activity_type'],
+            args=deepcopy(activity['args']),
+            tags=activity.get('tags', []),
+            scene_type=activity.get('scene_type'),
+            sceneid=activity['sceneid'],
+        )
+
+    @classmethod
+    def _bulk_upsert_activities(cls, activities: List[dict]) -> Dict[Tuple[int, str, str], int]:
+        """Insert or update the activities in batches of ``Config.ACTIVITY_BATCH_SIZE``.
+
+        The existing activities (collection_id, activity_type, sceneid) have the args overwritten.
+
+        Returns:
+            Map of activity key (collection_id, activity_type, sceneid) and the activity id.
+        """
+        table = RadcorActivity.__table__
+        activity_ids = dict()
+
+        for offset in range(0, len(activities), Config.ACTIVITY_BATCH_SIZE):
+            batch = activities[offset:offset + Config.ACTIVITY_BATCH_SIZE]
+
+            statement = insert(table).values([
+                dict(collection_id=activity['collection_id'], activity_type=activity['activity_type'],
+                     sceneid=activity['sceneid'], args=activity['args'],
+                     tags=activity.get('tags', []), scene_type=activity.get('scene_type'))
+                for activity in batch
+            ])
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.collection_id, table.c.activity_type, table.c.sceneid],
+                set_=dict(args=statement.excluded.args)
+            ).returning(table.c.id, table.c.collection_id, table.c.activity_type, table.c.sceneid)
+
+            for row in db.session.execute(statement):
+                activity_ids[(row.collection_id, row.activity_type, row.sceneid)] = row.id
+
+        return activity_ids
+
+    @classmethod
+    def _bulk_create_lineage(cls, relations: List[Tuple[int, int]]):
+        """Create the activity lineage (activity_id, activity_src_id) ignoring the existing ones."""
+        table = ActivitySRC.__table__
+
+        for offset in range(0, len(relations), Config.ACTIVITY_BATCH_SIZE):
+            batch = relations[offset:offset + Config.ACTIVITY_BATCH_SIZE]
+
+            statement = insert(table).values([
+                dict(activity_id=activity_id, activity_src_id=activity_src_id)
+                for activity_id, activity_src_id in batch
+            ]).on_conflict_do_nothing()
+
+            db.session.execute(statement)
 
     @classmethod
     def validate_provider(cls, collection_id):
@@ -401,8 +699,8 @@ class RadcorBusiness:
             abort(400, f'Collection {collection.name} does not have any data provider set.')
 
     @classmethod
-    def list_activities(cls, args: dict):
-        """List task activities from database."""
+    def _activity_filters(cls, args: dict) -> list:
+        """Create the activity filters of the listing (scene_id, collection, type and period)."""
         filters = []
         if args.get('scene_id'):
             filters.append(RadcorActivity.sceneid == args['scene_id'])
@@ -414,58 +712,130 @@ class RadcorBusiness:
             dates = args['period'].split('/')
             if len(dates) != 2:
                 raise BadRequest('Incorrect dates! Format: YYYY-mm-dd/YYYY-mm-dd')
-            filters.append(RadcorActivity.history.any(
-                    RadcorActivityHistory.start >= datetime.strptime(dates[0], '%Y-%m-%d')))
-            filters.append(RadcorActivity.history.any(
-                    RadcorActivityHistory.start <= datetime.strptime(dates[1]+' 23:59', '%Y-%m-%d %H:%M')))
+            # A single EXISTS with both bounds, so the executions are searched by the start index
+            filters.append(RadcorActivity.history.any(and_(
+                RadcorActivityHistory.start >= datetime.strptime(dates[0], '%Y-%m-%d'),
+                RadcorActivityHistory.start <= datetime.strptime(dates[1]+' 23:59', '%Y-%m-%d %H:%M')
+            )))
+
+        return filters
 
-        activities = RadcorActivity.query().filter(*filters)
+    @classmethod
+    def list_activities(cls, args: dict):
+        """List task activities from database."""
+        activities = RadcorActivity.query().filter(*cls._activity_filters(args))
         return activities
 
     @classmethod
-    def count_activities(cls, args: dict):
-        """Count grouped by status on database."""
-        filters = []
-        if args.get('start_date'):
-            filters.append(RadcorActivityHistory.start >= '{}T00:00'.format(args['start_date']))
-        if args.get('last_date'):
-            filters.append(RadcorActivityHistory.start <= '{}T23:59'.format(args['last_date']))
-        if args.get('collection'):
-            filters.append(RadcorActivity.collection_id == args['collection'])
-        if args.get('type'):
-            filters.append(RadcorActivity.activity_type.contains(args['type']))
+    def list_activities_with_execution(cls, args: dict):
+        """List task activities with the latest execution and its Celery task status in a single query.
+
+        The latest execution of each activity is retrieved with a ``LATERAL`` join,
+        so the serialization does not load the history and task of each activity.
+
+        Returns:
+            Query of tuples with the activity and the latest execution columns (``start``, ``env``,
+            ``created``, ``updated``, ``status`` and ``date_done``), which are None when
+            the activity has no execution.
+        """
+        history = RadcorActivityHistory.__table__
+        task = Task.__table__
+
+        last_execution = (
+            select([history.c.start, history.c.env, history.c.created, history.c.updated,
+                    task.c.status, task.c.date_done])
+            .select_from(history.join(task, task.c.id == history.c.task_id))
+            .where(history.c.activity_id == RadcorActivity.id)
+            .order_by(history.c.start.desc())
+            .limit(1)
+            .lateral('last_execution')
+        )
+
+        return (
+            db.session.query(RadcorActivity, last_execution)
+            .outerjoin(last_execution, true())
+            .filter(*cls._activity_filters(args))
+        )
+
+    @classmethod
+    def list_activities_by_cursor(cls, args: dict, cursor: int = None, per_page: int = 10,
+                                  order: str = 'asc') -> Tuple[list, int]:
+        """List task activities using keyset pagination by activity id.
 
-        result = db.session.query(Task.status, func.count('*'))\
-            .join(RadcorActivityHistory, RadcorActivityHistory.task_id == Task.id)\
-            .join(RadcorActivity, RadcorActivity.id == RadcorActivityHistory.activity_id)\
-            .filter(*filters)\
-            .group_by(Task.status)\
+        Differently from page pagination (``OFFSET``), the deep pages have the same cost as the first one.
+
+        Args:
+            args: The activity filters. See :meth:`list_activities`.
+            cursor: The last activity id of the previous page. Use None for the first page.
+            per_page: Number of activities per page.
+            order: The activity id order, ``asc`` or ``desc``.
+
+        Returns:
+            Tuple of the page rows (See :meth:`list_activities_with_execution`) and the cursor
+            of the next page (None at the last page).
+        """
+        if order not in ('asc', 'desc'):
+            raise BadRequest('Invalid order. Use "asc" or "desc".')
+
+        query = cls.list_activities_with_execution(args)
+
+        if cursor is not None:
+            query = query.filter(RadcorActivity.id > cursor if order == 'asc' else RadcorActivity.id < cursor)
+
+        rows = (
+            query.order_by(RadcorActivity.id.asc() if order == 'asc' else RadcorActivity.id.desc())
+            .limit(per_page + 1)
             .all()
+        )
 
-        return {r[0]: r[1] for r in result}
+        next_cursor = rows[per_page - 1][0].id if len(rows) > per_page else None
+
+        return rows[:per_page], next_cursor
 
     @classmethod
-    def count_activities_with_date(cls, args: dict):
-        """Count activities by date."""
+    def _daily_status_filters(cls, args: dict) -> list:
+        """Create the filters of the daily execution counters."""
         filters = []
         if args.get('start_date'):
-            filters.append(RadcorActivityHistory.start >= '{}T00:00'.format(args['start_date']))
+            filters.append(RadcorActivityDailyStatus.date >= args['start_date'])
         if args.get('last_date'):
-            filters.append(RadcorActivityHistory.start <= '{}T23:59'.format(args['last_date']))
+            filters.append(RadcorActivityDailyStatus.date <= args['last_date'])
         if args.get('collection'):
-            filters.append(RadcorActivity.collection_id == args['collection'])
+            filters.append(RadcorActivityDailyStatus.collection_id == args['collection'])
         if args.get('type'):
-            filters.append(RadcorActivity.activity_type.contains(args['type']))
+            filters.append(RadcorActivityDailyStatus.activity_type.contains(args['type']))
+
+        return filters
+
+    @classmethod
+    def count_activities(cls, args: dict):
+        """Count the executions grouped by status.
 
-        result = db.session.query(RadcorActivityHistory.start.cast(Date), Task.status, func.count('*'))\
-            .join(RadcorActivityHistory, RadcorActivityHistory.task_id == Task.id)\
-            .join(RadcorActivity, RadcorActivity.id == RadcorActivityHistory.activity_id)\
-            .filter(*filters)\
-            .group_by(RadcorActivityHistory.start.cast(Date), Task.status)\
-            .order_by(RadcorActivityHistory.start.cast(Date))\
+        It reads the daily counters (See :mod:`bdc_collection_builder.collections.status`).
+        """
+        total = func.sum(RadcorActivityDailyStatus.count)
+
+        result = db.session.query(RadcorActivityDailyStatus.status, total)\
+            .filter(*cls._daily_status_filters(args))\
+            .group_by(RadcorActivityDailyStatus.status)\
+            .having(total > 0)\
             .all()
 
-        return [{'date': r[0].strftime('%Y-%m-%d'), 'status': r[1], 'count': r[2]} for r in result]
+        return {r[0]: int(r[1]) for r in result}
+
+    @classmethod
+    def count_activities_with_date(cls, args: dict):
+        """Count the executions by date and status."""
+        total = func.sum(RadcorActivityDailyStatus.count)
+
+        result = db.session.query(RadcorActivityDailyStatus.date, RadcorActivityDailyStatus.status, total)\
+            .filter(*cls._daily_status_filters(args))\
+            .group_by(RadcorActivityDailyStatus.date, RadcorActivityDailyStatus.status)\
+            .having(total > 0)\
+            .order_by(RadcorActivityDailyStatus.date)\
+            .all()
+
+        return [{'date': r[0].strftime('%Y-%m-%d'), 'status': r[1], 'count': int(r[2])} for r in result]
 
     @classmethod
     def get_collections_activities(cls):
@@ -475,30 +845,22 @@ class RadcorBusiness:
 
     @classmethod
     def get_unsuccessfully_activities(cls):
-        """Retrieve all failed activities."""
-        result = db.engine.execute("\
-            WITH activity_tasks AS (\
-                SELECT a.sceneid AS sceneid,\
-                    max(h.start) AS start_date\
-                FROM activity_history h, celery_taskmeta t, activities a\
-                WHERE h.task_id = t.id AND a.id = h.activity_id\
-                GROUP BY 1\
-            ), failed_tasks AS (\
-                SELECT a.id AS id,\
-                a.sceneid AS sceneid,\
-                a.activity_type AS type\
-                FROM activity_tasks act, activity_history h, celery_taskmeta t, activities a\
-                WHERE a.sceneid = act.sceneid AND h.start = act.start_date AND a.id = h.activity_id \
-                    AND t.id = h.task_id AND t.status != 'SUCCESS' ORDER BY a.id\
-            ) \
-            SELECT count(*) FROM failed_tasks").first()
-        return {"result": result.count}
+        """Count the scenes which the latest execution is not successful."""
+        latest = (
+            db.session.query(RadcorActivityStatus.status)
+            .distinct(RadcorActivityStatus.sceneid)
+            .order_by(RadcorActivityStatus.sceneid, RadcorActivityStatus.start.desc().nullslast())
+            .subquery()
+        )
+
+        result = db.session.query(func.count()).select_from(latest).filter(latest.c.status != states.SUCCESS).scalar()
+
+        return {"result": result}
 
     @classmethod
-    def check_scenes(cls, collections: str, start_date: datetime, end_date: datetime,
-                     catalog: str = None, dataset: str = None,
-                     grid: str = None, tiles: list = None, bbox: list = None, catalog_kwargs=None, only_tiles=False):
-        """Check for the scenes in remote provider and compares with the Collection Builder."""
+    def _check_scenes_setup(cls, collections: List[str], catalog: str, grid: str = None,
+                            tiles: list = None, bbox: list = None):
+        """Retrieve the collections, the tiles bounding box and the data provider to check scenes."""
         bbox_list = []
         if grid and tiles:
             grid = GridRefSys.query().filter(GridRefSys.name == grid).first_or_404(f'Grid "{grid}" not found.')
@@ -519,7 +881,6 @@ class RadcorBusiness:
         instance, provider = get_provider(catalog)
 
         collection_map = dict()
-        collection_ids = list()
 
         for _collection in collections:
             collection, version = _collection.split('-')
@@ -529,81 +890,105 @@ class RadcorBusiness:
                 Collection.version == version
             ).first_or_404(f'Collection "{collection}-{version}" not found.')
 
-            collection_ids.append(collection.id)
             collection_map[_collection] = collection
 
-        options = dict(start_date=start_date, end_date=end_date)
-        if catalog_kwargs:
-            options.update(catalog_kwargs)
+        return collection_map, bbox_list, provider
 
-        redis = current_app.redis
-        output = dict(
-            collections={cname: dict(total_scenes=0, total_missing=0, missing_external=[]) for cname in collections}
-        )
-
-        items = {cid: set() for cid in collection_ids}
-        external_scenes = set()
+    @classmethod
+    def _check_scenes_queries(cls, catalog: str, dataset: str, bbox_list: list, periods: list,
+                              options: dict, only_tiles=False) -> List[SearchQuery]:
+        """Create the provider search for each tile and period."""
+        queries = []
 
         for tile, _bbox in bbox_list:
-            with redis.pipeline() as pipe:
-                if only_tiles:
-                    entry = tile
+            tile_options = dict(**options)
 
-                    if catalog == 'MODIS':
-                        tile = f'h{tile[1:3]}v{tile[-2:]}'
+            if only_tiles:
+                entry = tile
 
-                    options['tile'] = tile
-                else:
-                    options['bbox'] = _bbox
-                    entry = _bbox
+                if catalog == 'MODIS':
+                    tile = f'h{tile[1:3]}v{tile[-2:]}'
 
-                periods = _generate_periods(start_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
+                tile_options['tile'] = tile
+            else:
+                tile_options['bbox'] = _bbox
+                entry = _bbox
 
-                for period_start, period_end in periods:
-                    _items = db.session.query(Item.name, Item.collection_id).filter(
-                        Item.collection_id.in_(collection_ids),
-                        func.ST_Intersects(
-                            func.ST_MakeEnvelope(
-                                *_bbox, func.ST_SRID(Item.geom)
-                            ),
-                            Item.geom
-                        ),
-                        or_(
-                            and_(Item.start_date >= period_start, Item.start_date <= period_end),
-                            and_(Item.end_date >= period_start, Item.end_date <= period_end),
-                            and_(Item.start_date < period_start, Item.end_date > period_end),
-                        )
-                    ).order_by(Item.name).all()
+            for period_start, period_end in periods:
+                label = f'{entry}:{period_start.strftime("%Y%m%d")}_{period_end.strftime("%Y%m%d")}'
 
-                    for item in _items:
-                        items[item.collection_id].add(item.name)
+                query_options = dict(**tile_options)
+                query_options['start_date'] = period_start.strftime('%Y-%m-%d')
+                query_options['end_date'] = period_end.strftime('%Y-%m-%d')
 
-                    options['start_date'] = period_start.strftime('%Y-%m-%d')
-                    options['end_date'] = period_end.strftime('%Y-%m-%d')
+                queries.append(SearchQuery(label, dict(query=dataset, **query_options)))
 
-                    key = f'scenes:{catalog}:{dataset}:{period_start.strftime("%Y%m%d")}_{period_end.strftime("%Y%m%d")}_{entry}'
+        return queries
 
-                    pipe.get(key)
-                    provider_scenes = []
+    @classmethod
+    def _check_scenes_items(cls, collection_map: dict, bbox_list: list, periods: list) -> Dict[str, set]:
+        """Retrieve the published items of all tiles and periods in a single query."""
+        items = {name: set() for name in collection_map}
+
+        if not periods:
+            return items
+
+        names = {collection.id: name for name, collection in collection_map.items()}
+        range_start, range_end = periods[0][0], periods[-1][1]
+
+        _items = db.session.query(Item.name, Item.collection_id).filter(
+            Item.collection_id.in_(list(names)),
+            or_(*[
+                func.ST_Intersects(func.ST_MakeEnvelope(*_bbox, func.ST_SRID(Item.geom)), Item.geom)
+                for _, _bbox in bbox_list
+            ]),
+            or_(
+                and_(Item.start_date >= range_start, Item.start_date <= range_end),
+                and_(Item.end_date >= range_start, Item.end_date <= range_end),
+                and_(Item.start_date < range_start, Item.end_date > range_end),
+            )
+        ).all()
 
-                    if not redis.exists(key):
-                        provider_scenes = provider.search(dataset, **options)
-                        provider_scenes = [s.scene_id for s in provider_scenes]
+        for item in _items:
+            items[names[item.collection_id]].add(item.name)
 
-                        pipe.set(key, json.dumps(provider_scenes))
+        return items
 
-                    external_scenes = external_scenes.union(set(provider_scenes))
+    @classmethod
+    def _check_scenes_search(cls, provider, catalog: str, queries: List[SearchQuery]) -> Tuple[set, list]:
+        """Search the scenes in the provider. The cached periods are read at once and only the missing are searched."""
+        external_scenes = set()
+        errors = []
+
+        executor = SearchExecutor(cache=get_search_cache())
+
+        for query, provider_scenes, error in executor.iter_search(provider, queries, provider_name=catalog):
+            if error is not None:
+                logging.warning(f'Search {query.key} failed - {str(error)}')
+                errors.append(dict(query=query.key, error=str(error)))
+                continue
+
+            external_scenes.update(s.scene_id for s in provider_scenes)
 
-                cached_scenes = pipe.execute()
+        return external_scenes, errors
+
+    @classmethod
+    def check_scenes_report(cls, items: Dict[str, set], external_scenes: set, errors: list = None) -> dict:
+        """Compare the provider scenes with the published items of each collection.
+
+        Args:
+            items: Map of collection identifier (name-version) and the published item names.
+            external_scenes: The scenes found in the provider.
+            errors: The failed searches.
+        """
+        output = dict(
+            collections={cname: dict(total_scenes=0, total_missing=0, missing_external=[]) for cname in items}
+        )
 
-                for cache in cached_scenes:
-                    # When cache is True, represents set the value were cached.
-                    if cache is not None and cache is not True:
-                        external_scenes = external_scenes.union(set(json.loads(cache)))
+        output['errors'] = errors or []
 
         output['total_external'] = len(external_scenes)
-        for _collection_name, _collection in collection_map.items():
-            _items = set(items[_collection.id])
+        for _collection_name, _items in items.items():
             diff = list(external_scenes.difference(_items))
 
             output['collections'][_collection_name]['total_scenes'] = len(_items)
@@ -611,14 +996,79 @@ class RadcorBusiness:
             output['collections'][_collection_name]['scenes'] = list(external_scenes)
             output['collections'][_collection_name]['missing_external'] = diff
 
-            for cname, _internal_collection in collection_map.items():
+            for cname, _internal_items in items.items():
                 if cname != _collection_name:
-                    diff = list(_items.difference(set(items[_internal_collection.id])))
+                    diff = list(_items.difference(_internal_items))
                     output['collections'][_collection_name][f'total_missing_{cname}'] = len(diff)
                     output['collections'][_collection_name][f'missing_{cname}'] = diff
 
         return output
 
+    @classmethod
+    def check_scenes(cls, collections: str, start_date: datetime, end_date: datetime,
+                     catalog: str = None, dataset: str = None,
+                     grid: str = None, tiles: list = None, bbox: list = None, catalog_kwargs=None, only_tiles=False):
+        """Check for the scenes in remote provider and compares with the Collection Builder."""
+        collection_map, bbox_list, provider = cls._check_scenes_setup(collections, catalog, grid=grid,
+                                                                      tiles=tiles, bbox=bbox)
+
+        options = dict(start_date=start_date, end_date=end_date)
+        if catalog_kwargs:
+            options.update(catalog_kwargs)
+
+        periods = _generate_periods(start_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
+
+        queries = cls._check_scenes_queries(catalog, dataset, bbox_list, periods, options, only_tiles=only_tiles)
+
+        items = cls._check_scenes_items(collection_map, bbox_list, periods)
+
+        external_scenes, errors = cls._check_scenes_search(provider, catalog, queries)
+
+        return cls.check_scenes_report(items, external_scenes, errors)
+
+    @classmethod
+    def check_scenes_by_tile(cls, collections: str, start_date: datetime, end_date: datetime,
+                             catalog: str = None, dataset: str = None,
+                             grid: str = None, tiles: list = None, bbox: list = None, catalog_kwargs=None,
+                             only_tiles=False) -> Tuple[int, Iterator[dict]]:
+        """Check for the scenes tile by tile.
+
+        It receives the same parameters of :meth:`RadcorBusiness.check_scenes`. The collections, grid and provider
+        are validated right away and the tiles are only processed while iterating.
+
+        Returns:
+            The number of tiles and an iterator of the tile comparison as ``dict(tile, total, scenes, items, missing,
+            errors)``, where ``items`` and ``missing`` are maps of collection identifier and scenes.
+        """
+        collection_map, bbox_list, provider = cls._check_scenes_setup(collections, catalog, grid=grid,
+                                                                      tiles=tiles, bbox=bbox)
+
+        options = dict(start_date=start_date, end_date=end_date)
+        if catalog_kwargs:
+            options.update(catalog_kwargs)
+
+        periods = _generate_periods(start_date.replace(tzinfo=None), end_date.replace(tzinfo=None))
+
+        def _check_tiles():
+            for tile_bbox in bbox_list:
+                queries = cls._check_scenes_queries(catalog, dataset, [tile_bbox], periods, options,
+                                                    only_tiles=only_tiles)
+
+                items = cls._check_scenes_items(collection_map, [tile_bbox], periods)
+
+                external_scenes, errors = cls._check_scenes_search(provider, catalog, queries)
+
+                yield dict(
+                    tile=tile_bbox[0] or tile_bbox[1],
+                    total=len(external_scenes),
+                    scenes=sorted(external_scenes),
+                    items={cname: sorted(_items) for cname, _items in items.items()},
+                    missing={cname: sorted(external_scenes.difference(_items)) for cname, _items in items.items()},
+                    errors=errors
+                )
+
+        return len(bbox_list), _check_tiles()
+
     @classmethod
     def list_collections(cls):
         """List the available collections in database."""
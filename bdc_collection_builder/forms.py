@@ -31,7 +31,7 @@ from shapely.errors import ShapelyError, WKTReadingError
 from shapely.geometry import shape
 
 # Builder
-from .collections.models import RadcorActivity, RadcorActivityHistory
+from .collections.models import RadcorActivity, RadcorActivityHistory, RadcorSubmission
 
 
 class TaskSchema(Schema):
@@ -107,16 +107,56 @@ class SimpleActivityForm(SQLAlchemyAutoSchema):
         exclude = ('collection', 'history')
 
 
+class LastExecutionForm(Schema):
+    """Define schema for the latest execution columns of ``RadcorBusiness.list_activities_with_execution``.
+
+    It has the same output of :class:`HistoryForm`.
+    """
+
+    start = fields.DateTime()
+    env = fields.Raw()
+    created = fields.DateTime()
+    updated = fields.DateTime()
+    status = fields.Str()
+    end = fields.Method('dump_end')
+
+    def dump_end(self, obj):
+        """Dump celery execution date_done on schema."""
+        return str(obj.date_done or '')
+
+
 class RadcorActivityForm(SimpleActivityForm):
-    """Define schema for Brazil Data Cube Collection Builder Activity."""
+    """Define schema for Brazil Data Cube Collection Builder Activity.
+
+    The latest executions may be given in the context ``last_execution`` (a map of activity id
+    and the latest execution columns) in order to not load the history of each activity.
+    """
 
     last_execution = fields.Method('dump_last_execution')
 
     def dump_last_execution(self, obj):
         """Dump last task execution."""
+        if 'last_execution' in self.context:
+            execution = self.context['last_execution'].get(obj.id)
+
+            if execution is None or (execution.start is None and execution.status is None):
+                return None
+
+            return LastExecutionForm().dump(execution)
+
         return HistoryForm().dump(obj.history[0]) if len(obj.history) > 0 else None
 
 
+class SubmissionForm(SQLAlchemyAutoSchema):
+    """Define schema for the radcor submissions dispatched asynchronously."""
+
+    class Meta:
+        """Define internal model handling."""
+
+        model = RadcorSubmission
+        sqla_session = db.session
+
+
 class TaskDispatcher(Schema):
     """Define the minimal structure for a Task."""
 
@@ -148,6 +188,10 @@ class SearchImageForm(Schema):
     catalog_search_args = fields.Dict(required=False, default=dict(), allow_none=False)
     scenes = fields.List(fields.String(), allow_none=False)
     tiles = fields.List(fields.String(), allow_none=False)
+    cache = fields.Boolean(required=False, allow_none=False)
+    """Use the cached provider searches. Default is ``true`` for ``preview`` and ``false`` for ``start``."""
+    partial = fields.Boolean(required=False, allow_none=False, default=False)
+    """Start the scenes found even when some searches failed (action=start)."""
 
     @post_load
     def pre_load_dates(self, data, **kwargs) -> dict:
@@ -19,23 +19,276 @@
 """Define the utilities to execute string expressions in Python Interpreter."""
 
 import ast
-from typing import Any, Dict
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Union
+
+import numpy
+
+try:
+    import numexpr
+except ImportError:  # pragma: no cover
+    numexpr = None
 
 # Type for Python Execution Code Context.
 ExecutionContext = Dict[str, Any]
 
+EXPRESSION_CACHE_SIZE = 256
+"""Maximum number of compiled expressions kept in memory."""
+
+_ALLOWED_NODES = (
+    ast.Module, ast.Expr, ast.Expression, ast.Assign, ast.Name, ast.Load, ast.Store,
+    ast.Constant, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Attribute,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr, ast.BitXor,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+)
+
+_FUNCTIONS = dict(
+    abs=numpy.ma.abs, sqrt=numpy.ma.sqrt, log=numpy.ma.log, log10=numpy.ma.log10, exp=numpy.ma.exp,
+    sin=numpy.ma.sin, cos=numpy.ma.cos, tan=numpy.ma.tan, arctan=numpy.ma.arctan,
+    where=numpy.ma.where, minimum=numpy.ma.minimum, maximum=numpy.ma.maximum, clip=numpy.ma.clip,
+)
+"""Functions available in expressions. They may also be referenced as ``numpy.<name>`` or ``np.<name>``."""
+
+_NUMEXPR_FUNCTIONS = {'abs', 'sqrt', 'log', 'log10', 'exp', 'sin', 'cos', 'tan', 'arctan', 'where'}
+"""Functions supported by ``numexpr`` fused evaluation."""
+
+_NUMPY_ALIASES = ('numpy', 'np')
+
+
+class _NumpyNamespace:
+    """Expose only the allowed functions as ``numpy.<name>`` inside an expression."""
+
+    def __init__(self):
+        self.__dict__.update(_FUNCTIONS)
+
+
+_NUMPY_NAMESPACE = _NumpyNamespace()
+
+
+class CompiledExpression:
+    """Represent a band expression parsed, validated and compiled once.
+
+    An expression is made by a single arithmetic statement using the variables given
+    in the evaluation context, optionally assigned to a name, like ``NDVI = (B8 - B4) / (B8 + B4)``.
+    Only arithmetic, comparison and bitwise operators and the functions in
+    ``_FUNCTIONS`` are allowed, which avoids to execute arbitrary code (like ``os`` calls).
+
+    When ``numexpr`` is installed and the expression is supported by it, the expression
+    is evaluated in a single fused pass, avoiding the intermediate arrays created by NumPy.
+    Masked arrays are supported: the result mask is the union of input masks and the non-finite values.
+
+    Each instance keeps the counters ``calls`` and ``elapsed`` (seconds) of evaluations.
+    """
+
+    def __init__(self, expression: str):
+        """Parse and validate the given expression."""
+        self.expression = expression
+        self.target: Optional[str] = None
+
+        tree = ast.parse(expression.strip(), mode='exec')
+
+        if len(tree.body) != 1 or not isinstance(tree.body[0], (ast.Assign, ast.Expr)):
+            raise ValueError(f'Expression "{expression}" must be a single statement.')
+
+        statement = tree.body[0]
+
+        if isinstance(statement, ast.Assign):
+            if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Name):
+                raise ValueError(f'Expression "{expression}" must assign a single name.')
+
+            self.target = statement.targets[0].id
+
+        self._validate(statement.value)
+
+        self.names: Set[str] = {
+            node.id for node in ast.walk(statement.value)
+            if isinstance(node, ast.Name) and node.id not in _FUNCTIONS and node.id not in _NUMPY_ALIASES
+        }
+
+        self._code = compile(ast.Expression(body=statement.value), '<expression>', 'eval')
+        self._numexpr = self._numexpr_source(statement.value)
+
+        self.calls = 0
+        self.elapsed = 0.
+
+    def __repr__(self):
+        """Retrieve the string representation of a compiled expression."""
+        return f'CompiledExpression({self.expression!r})'
+
+    @property
+    def engine(self) -> str:
+        """Retrieve the engine name used to evaluate the expression."""
+        return 'numexpr' if self._numexpr else 'numpy'
+
+    def _validate(self, node: ast.AST):
+        for child in ast.walk(node):
+            if not isinstance(child, _ALLOWED_NODES):
+                raise ValueError(f'Operation "{type(child).__name__}" not allowed in "{self.expression}".')
+
+            if isinstance(child, ast.Attribute):
+                if not isinstance(child.value, ast.Name) or child.value.id not in _NUMPY_ALIASES or \
+                        child.attr not in _FUNCTIONS:
+                    raise ValueError(f'Attribute "{child.attr}" not allowed in "{self.expression}".')
+
+            if isinstance(child, ast.Call):
+                func = child.func
+                name = func.attr if isinstance(func, ast.Attribute) else getattr(func, 'id', None)
+
+                if name not in _FUNCTIONS or child.keywords:
+                    raise ValueError(f'Function "{name}" not allowed in "{self.expression}".')
+
+    def _numexpr_source(self, node: ast.AST) -> Optional[str]:
+        """Retrieve the expression source supported by numexpr, if any."""
+        if numexpr is None or not hasattr(ast, 'unparse'):
+            return None
+
+        for child in ast.walk(node):
+            if isinstance(child, (ast.FloorDiv, ast.Invert, ast.BitXor)):
+                return None
+            if isinstance(child, ast.Call):
+                func = child.func
+                name = func.attr if isinstance(func, ast.Attribute) else func.id
+                if name not in _NUMEXPR_FUNCTIONS:
+                    return None
+
+        class _StripNumpy(ast.NodeTransformer):
+            def visit_Attribute(self, attribute):
+                return ast.copy_location(ast.Name(id=attribute.attr, ctx=ast.Load()), attribute)
+
+        # Work in a copy of the tree since the compiled code still depends on it
+        tree = ast.parse(ast.unparse(node), mode='eval')
+
+        return ast.unparse(_StripNumpy().visit(tree))
+
+    def evaluate(self, context: Dict[str, Any]):
+        """Evaluate the expression against the given variables.
 
-def execute_expression(expression: str, context: dict) -> ExecutionContext:
+        The context is never changed.
+
+        Args:
+            context: Map of variable name and values (usually NumPy arrays).
+
+        Returns:
+            The expression result.
+        """
+        missing = self.names.difference(context.keys())
+        if missing:
+            raise NameError(f'Variables {sorted(missing)} not found for "{self.expression}".')
+
+        start = time.perf_counter()
+
+        try:
+            values = {name: context[name] for name in self.names}
+
+            if self._numexpr and all(isinstance(v, numpy.ndarray) for v in values.values()):
+                result = self._evaluate_numexpr(values)
+            else:
+                scope = dict(_FUNCTIONS, __builtins__={})
+                for alias in _NUMPY_ALIASES:
+                    scope[alias] = _NUMPY_NAMESPACE
+
+                result = eval(self._code, scope, values)
+        finally:
+            self.calls += 1
+            self.elapsed += time.perf_counter() - start
+
+        return result
+
+    def _evaluate_numexpr(self, values: Dict[str, numpy.ndarray]):
+        masks = [numpy.ma.getmask(v) for v in values.values() if numpy.ma.is_masked(v)]
+        data = {name: numpy.ma.getdata(v) for name, v in values.items()}
+
+        result = numexpr.evaluate(self._numexpr, local_dict=data)
+
+        if not any(isinstance(v, numpy.ma.MaskedArray) for v in values.values()):
+            return result
+
+        mask = numpy.logical_or.reduce(masks) if masks else numpy.zeros(result.shape, dtype=bool)
+        if result.dtype.kind == 'f':
+            mask = mask | ~numpy.isfinite(result)
+
+        return numpy.ma.array(result, mask=mask)
+
+
+class _ExpressionCache:
+    """Thread-safe LRU cache of compiled expressions keyed by expression text."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[str, CompiledExpression]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, expression: str) -> CompiledExpression:
+        with self._lock:
+            compiled = self._entries.get(expression)
+            if compiled is not None:
+                self._entries.move_to_end(expression)
+                return compiled
+
+        compiled = CompiledExpression(expression)
+
+        with self._lock:
+            compiled = self._entries.setdefault(expression, compiled)
+            self._entries.move_to_end(expression)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        return compiled
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = _ExpressionCache(EXPRESSION_CACHE_SIZE)
+
+
+def compile_expression(expression: str) -> CompiledExpression:
+    """Retrieve a compiled expression from cache, parsing and validating it only in the first call.
+
+    Raises:
+        ValueError when the expression contains an operation not allowed.
+
+    Examples:
+        >>> ndvi = compile_expression('(B8 - B4) / (B8 + B4)')
+        >>> sorted(ndvi.names)
+        ['B4', 'B8']
+    """
+    return _cache.get(expression)
+
+
+def expression_stats() -> Dict[str, dict]:
+    """Retrieve the evaluation counters of the cached expressions.
+
+    Returns:
+        Map of expression and its counters (calls, elapsed time in seconds and engine).
+    """
+    return {
+        compiled.expression: dict(calls=compiled.calls, elapsed=compiled.elapsed, engine=compiled.engine)
+        for compiled in _cache.values()
+    }
+
+
+def execute_expression(expression: Union[str, CompiledExpression], context: dict) -> ExecutionContext:
     """Evaluate a string expression as Python object and execute in Python Interpreter.
 
     This method allows to execute dynamic expression into a Python Virtual Machine.
     With this, you can generate custom bands based in user-defined values. The `context`
     defines the scope of which values will be available by default.
 
-    TODO: Ensure that non-exported variables (context) can't be executed like `os` to avoid internal issues.
+    Only a single statement made of arithmetic operators and the allowed functions is supported.
+    See :class:`CompiledExpression`.
 
     Args:
-        expression: String-like python expression
+        expression: String-like python expression or an expression from :func:`compile_expression`.
         context: Context loaded variables
 
     Examples:
@@ -46,14 +299,20 @@ def execute_expression(expression: str, context: dict) -> ExecutionContext:
 
     Notes:
         You can set loaded variables in `context` and it will be available during code execution.
+        The assigned variable is set in the given `context`. Use :meth:`CompiledExpression.evaluate`
+        to keep the context unchanged.
 
     Returns:
         Map of context values loaded in memory.
     """
-    ast_expression = ast.parse(expression)
+    compiled_expression = expression
+
+    if isinstance(expression, str):
+        compiled_expression = compile_expression(expression)
 
-    compiled_expression = compile(ast_expression, '<ast>', 'exec')
+    result = compiled_expression.evaluate(context)
 
-    exec(compiled_expression, context)
+    if compiled_expression.target:
+        context[compiled_expression.target] = result
 
-    return context
\ No newline at end of file
+    return context
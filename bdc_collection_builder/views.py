@@ -18,12 +18,20 @@
 
 """Define flask views for collections."""
 
+# Python Native
+import json
+from distutils.util import strtobool
+
 # 3rdparty
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, abort, jsonify, request, stream_with_context, url_for
 from werkzeug.exceptions import RequestURITooLarge
 
 # Builder
+from .celery.tasks import check_scenes as check_scenes_task
 from .celery.utils import list_pending_tasks, list_running_tasks
+from .collections.jobs import PENDING, CheckScenesJob
+from .collections.models import RadcorActivity
+from .config import Config
 from .controller import RadcorBusiness
 from .forms import CheckScenesForm, RadcorActivityForm, SearchImageForm
 
@@ -32,12 +40,31 @@ bp = Blueprint('radcor', import_name=__name__, url_prefix='/api')
 
 @bp.route('/activities', methods=('GET',))
 def list_activities():
-    """Retrieve all radcor activities from database."""
+    """Retrieve all radcor activities from database.
+
+    Use the query parameter ``cursor`` for keyset pagination: leave it empty for the first page
+    and use the ``next_cursor`` of the response for the next ones (``order=asc|desc`` by activity id).
+    Otherwise, it uses the ``page`` pagination.
+    """
     args = request.args
-    page = int(args.get('page', 1))
     per_page = int(args.get('per_page', 10))
 
-    activities = RadcorBusiness.list_activities(args)\
+    if 'cursor' in args:
+        cursor = int(args['cursor']) if args['cursor'] else None
+
+        rows, next_cursor = RadcorBusiness.list_activities_by_cursor(args, cursor=cursor, per_page=per_page,
+                                                                     order=args.get('order', 'asc'))
+
+        return {
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+            "items": _dump_activities(rows)
+        }
+
+    page = int(args.get('page', 1))
+
+    activities = RadcorBusiness.list_activities_with_execution(args)\
+        .order_by(RadcorActivity.id)\
         .paginate(page, per_page)
 
     return {
@@ -45,10 +72,17 @@ def list_activities():
         "page": activities.page,
         "per_page": activities.per_page,
         "pages": activities.pages,
-        "items": RadcorActivityForm().dump(activities.items, many=True)
+        "items": _dump_activities(activities.items)
     }
 
 
+def _dump_activities(rows) -> list:
+    """Serialize the rows of ``RadcorBusiness.list_activities_with_execution``."""
+    form = RadcorActivityForm(context=dict(last_execution={row[0].id: row for row in rows}))
+
+    return form.dump([row[0] for row in rows], many=True)
+
+
 @bp.route('/radcor', methods=('POST', ))
 def dispatch_collector():
     """Dispatch task execution of collection.
@@ -56,6 +90,16 @@ def dispatch_collector():
     curl -XPOST -H "Content-Type: application/json" \
         --data '{"w": -46.40, "s": -13.1, "n": -13, "e": -46.3, "satsen": "S2", "start": "2019-01-01", "end": "2019-01-30", "cloud": 90, "action": "start"}' \
         localhost:5000/api/radcor/
+
+    Use the query parameter ``stream=true`` with ``action=preview`` to receive the scenes as NDJSON
+    while the data provider is searched (one ``scene`` entry per line and a ``summary`` at the end).
+
+    When ``RADCOR_ASYNC_DISPATCH`` is set (or with the query parameter ``async=true``), the requests
+    with ``action=start`` are persisted as submissions and dispatched by a worker. Use
+    ``/radcor/submissions/<submission_id>`` to follow the submission.
+
+    The searches which failed are returned in ``errors``. When any search fails, the ``action=start``
+    is aborted (``502``) unless ``partial`` is set in the request body.
     """
     args = request.get_json()
 
@@ -68,15 +112,34 @@ def dispatch_collector():
 
     data = form.load(args)
 
+    if strtobool(request.args.get('stream', 'false')):
+        if data.get('action', 'preview') != 'preview':
+            abort(400, 'The stream mode is only available for action=preview.')
+
+        # Create the data provider before the response starts, so the invalid catalogs return an error status
+        entries = RadcorBusiness.radcor_preview_stream(data)
+
+        def _stream():
+            for entry in entries:
+                yield json.dumps(entry, default=str) + '\n'
+
+        return Response(stream_with_context(_stream()), mimetype='application/x-ndjson')
+
+    if data.get('action') == 'start' and \
+            strtobool(request.args.get('async', 'true' if Config.RADCOR_ASYNC_DISPATCH else 'false')):
+        submission = RadcorBusiness.submit(args)
+
+        return dict(submission_id=submission.id, status=submission.status,
+                    location=url_for('radcor.get_submission', submission_id=submission.id)), 202
+
     # Prepare radcor activity and start
-    result = RadcorBusiness.radcor(data)
+    return RadcorBusiness.radcor(data)
 
-    scenes = {
-        'tiles': result,
-        'Results': len(result)
-    }
 
-    return scenes
+@bp.route('/radcor/submissions/<int:submission_id>', methods=('GET', ))
+def get_submission(submission_id: int):
+    """Retrieve the status of a radcor submission (scenes found, activities written and tasks queued)."""
+    return RadcorBusiness.get_submission(submission_id)
 
 
 def _restart(args: dict):
@@ -98,12 +161,11 @@ def _restart(args: dict):
     args.setdefault('action', None)
     args.setdefault('use_aws', False)
 
-    activities = RadcorBusiness.restart(**args)
+    result = RadcorBusiness.restart(**args)
 
     return dict(
         action='PREVIEW' if args['action'] is None else args['action'],
-        total=len(activities),
-        activities=activities
+        **result
     )
 
 
@@ -175,7 +237,12 @@ def count_failed_activities():
 
 @bp.route('/check-scenes', methods=('POST',))
 def check_scenes():
-    """Check for scene availability in collection builder."""
+    """Check for scene availability in collection builder.
+
+    The check runs asynchronously in the queue ``check-scenes`` and returns the job identifier.
+    Use ``/check-scenes/<job_id>`` to follow the results. The query parameter ``sync=true`` runs
+    the check in the request context.
+    """
     data = request.get_json()
 
     form = CheckScenesForm()
@@ -185,11 +252,46 @@ def check_scenes():
     if errors:
         return errors, 400
 
-    data = form.load(data)
+    if strtobool(request.args.get('sync', 'false')):
+        data = form.load(data)
+
+        result = RadcorBusiness.check_scenes(**data)
+
+        return result, 200
+
+    job = CheckScenesJob.create(data)
+
+    check_scenes_task.apply_async(args=(job.id, data))
+
+    return dict(job_id=job.id, status=PENDING,
+                location=url_for('radcor.check_scenes_job', job_id=job.id)), 202
+
+
+@bp.route('/check-scenes/<job_id>', methods=('GET',))
+def check_scenes_job(job_id: str):
+    """Stream the check scenes job progress and the results of each tile as NDJSON.
+
+    The query parameter ``follow=true`` keeps the response open until the job finishes or
+    ``timeout`` seconds (limited to ``Config.JOB_STREAM_TIMEOUT``) elapse.
+    """
+    job = CheckScenesJob(job_id)
+
+    if job.meta() is None:
+        abort(404, f'Job {job_id} not found.')
+
+    follow = strtobool(request.args.get('follow', 'false'))
+
+    try:
+        timeout = float(request.args.get('timeout', Config.JOB_STREAM_TIMEOUT))
+        timeout = min(max(timeout, 0), Config.JOB_STREAM_TIMEOUT)
+    except ValueError:
+        abort(400, 'Invalid timeout.')
 
-    result = RadcorBusiness.check_scenes(**data)
+    def _stream():
+        for entry in job.stream(follow=follow, timeout=timeout):
+            yield json.dumps(entry) + '\n'
 
-    return result, 200
+    return Response(stream_with_context(_stream()), mimetype='application/x-ndjson')
 
 
 @bp.route('/collections', methods=('GET', ))
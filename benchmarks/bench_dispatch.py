@@ -0,0 +1,133 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Benchmark the publishing of radcor canvases against an in-memory broker.
+
+It compares the previous dispatch (a single group with a chain for every scene) against
+:func:`bdc_collection_builder.celery.utils.publish_in_chunks`, measuring the publish time
+and the peak memory (``tracemalloc``) of each strategy.
+
+Usage::
+
+    python benchmarks/bench_dispatch.py --scenes 1000 --scenes 10000 --scenes 50000 --chunk-size 500
+"""
+
+import time
+import tracemalloc
+
+import click
+from celery import Celery, chain, group
+
+from bdc_collection_builder.celery.utils import publish_in_chunks
+
+app = Celery('bench_dispatch', broker='memory://', backend='cache+memory://')
+app.conf.task_always_eager = False
+
+
+@app.task(name='bench.download')
+def download(activity, **kwargs):
+    """Represent the download task."""
+    return activity
+
+
+@app.task(name='bench.correction')
+def correction(activity, collection_id=None, activity_type=None, **kwargs):
+    """Represent the correction task."""
+    return activity
+
+
+@app.task(name='bench.publish')
+def publish(activity, collection_id=None, activity_type=None, **kwargs):
+    """Represent the publish task."""
+    return activity
+
+
+def make_activity(idx: int) -> dict:
+    """Create an activity like the ones dispatched by radcor (Sentinel-2 L1C)."""
+    sceneid = f'S2A_MSIL1C_20210101T132241_N0209_R038_T23LLF_{idx:020d}'
+
+    return dict(
+        id=idx, collection_id=1, activity_type='download', sceneid=sceneid, tags=[], scene_type='SCENE',
+        args=dict(catalog='ESA', dataset='S2_MSI_L1C', cloud=12.5, catalog_args=dict(),
+                  link=f'https://scihub.copernicus.eu/dhus/odata/v1/Products(\'{idx}\')/$value'),
+    )
+
+
+def make_canvas(idx: int):
+    """Create the canvas of a scene: download | (correction | publish)."""
+    keywords = dict(collection_id=2, activity_type='correction')
+
+    return download.s(make_activity(idx), force=False) | \
+        group(chain(correction.s(**keywords), publish.s(collection_id=2, activity_type='publish')))
+
+
+def single_group(scenes: int, **kwargs):
+    """Reproduce the previous dispatch: every scene in a single group."""
+    group([make_canvas(idx) for idx in range(scenes)]).apply_async()
+
+
+def chunked(scenes: int, chunk_size: int, delay: float = 0):
+    """Dispatch with :func:`publish_in_chunks` building the canvases lazily."""
+    publish_in_chunks((make_canvas(idx) for idx in range(scenes)), chunk_size=chunk_size, delay=delay)
+
+
+def measure(connection, strategy, *args, **kwargs):
+    """Measure the elapsed time (seconds) and the peak memory (MB) of a dispatch strategy.
+
+    The strategy runs twice since ``tracemalloc`` slows down the allocations: the first run
+    measures the publish time and the second one the peak memory.
+    """
+    start = time.perf_counter()
+    strategy(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+
+    purge(connection)
+
+    tracemalloc.start()
+    strategy(*args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    purge(connection)
+
+    return elapsed, peak / 1024 / 1024
+
+
+def purge(connection):
+    """Drain the in-memory queue between the runs."""
+    connection.default_channel.queue_purge(app.conf.task_default_queue)
+
+
+@click.command()
+@click.option('--scenes', type=int, multiple=True, default=(1000, 10000, 50000))
+@click.option('--chunk-size', type=int, default=500)
+@click.option('--skip-legacy', is_flag=True, default=False)
+def main(scenes, chunk_size, skip_legacy):
+    """Run the dispatch benchmark."""
+    with app.connection_for_write() as connection:
+        for total in scenes:
+            if not skip_legacy:
+                elapsed, peak = measure(connection, single_group, total)
+                click.echo(f'single group   scenes={total}: {elapsed:.2f}s peak={peak:.1f}MB')
+
+            elapsed, peak = measure(connection, chunked, total, chunk_size=chunk_size)
+            click.echo(f'chunks of {chunk_size} scenes={total}: {elapsed:.2f}s peak={peak:.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
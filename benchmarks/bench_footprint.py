@@ -0,0 +1,88 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Benchmark the raster footprint engine against raster_extent + raster_convexhull.
+
+Usage::
+
+    python benchmarks/bench_footprint.py --size 10980 --max-size 2048 --max-size 512
+"""
+
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import click
+import numpy
+import rasterio
+from rasterio.transform import from_origin
+
+from bdc_collection_builder.collections.utils import (raster_convexhull, raster_extent,
+                                                      raster_footprint)
+
+
+def create_scene(path: Path, size: int, nodata=0):
+    """Create a synthetic Sentinel-2 like band with a diagonal nodata wedge."""
+    profile = dict(
+        driver='GTiff', width=size, height=size, count=1, dtype='uint16', nodata=nodata,
+        crs='EPSG:32723', transform=from_origin(199980, 8900020, 10, 10),
+        tiled=True, blockxsize=512, blockysize=512, compress='deflate'
+    )
+
+    with rasterio.open(str(path), 'w', **profile) as ds:
+        for _, window in ds.block_windows():
+            rows, cols = numpy.mgrid[window.row_off:window.row_off + window.height,
+                                     window.col_off:window.col_off + window.width]
+            block = numpy.full((window.height, window.width), 1000, dtype=numpy.uint16)
+            block[cols > rows + size // 3] = nodata
+            ds.write(block, 1, window=window)
+
+
+def _timeit(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+@click.command()
+@click.option('--size', type=int, default=10980, help='Raster width/height in pixels.')
+@click.option('--max-size', type=int, multiple=True, default=(4096, 2048, 512))
+def main(size, max_size):
+    """Run the footprint benchmark."""
+    with TemporaryDirectory() as tmp:
+        scene = Path(tmp) / 'B02.tif'
+        create_scene(scene, size)
+
+        def _legacy():
+            with rasterio.open(str(scene)) as ds:
+                srid = ds.crs.to_epsg()
+            return raster_extent(str(scene)), raster_convexhull(str(scene), no_data=0), srid
+
+        (extent, hull, _), elapsed = _timeit(_legacy)
+        click.echo(f'legacy: {elapsed:.3f}s area={hull.area:.6f}')
+
+        for value in max_size:
+            footprint, elapsed = _timeit(raster_footprint, str(scene), no_data=0, max_size=value)
+            error = footprint.convex_hull.symmetric_difference(hull).area / hull.area
+
+            click.echo(f'footprint(max_size={value}): {elapsed:.3f}s '
+                       f'area={footprint.convex_hull.area:.6f} relative error={error:.4%}')
+
+
+if __name__ == '__main__':
+    main()
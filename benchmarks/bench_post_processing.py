@@ -0,0 +1,123 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Benchmark the nodata propagation of post processing on a synthetic scene.
+
+It compares the previous implementation (re-open bands per block and ``numpy.union1d``
+of flat indices) against :func:`bdc_collection_builder.collections.utils.mask_nodata_blocks`.
+
+Usage::
+
+    python benchmarks/bench_post_processing.py --size 10980 --bands 6 --workers 1 --workers 4
+"""
+
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import click
+import numpy
+import rasterio
+from rasterio.transform import from_origin
+
+from bdc_collection_builder.collections.utils import mask_nodata_blocks
+
+PROFILE = dict(driver='GTiff', count=1, crs='EPSG:32723', transform=from_origin(199980, 8900020, 10, 10),
+               tiled=True, blockxsize=512, blockysize=512, compress='deflate')
+
+
+def create_band(path: Path, size: int, seed: int):
+    """Create a synthetic spectral band with a nodata (-9999) edge, like a partial Sentinel-2 tile."""
+    random = numpy.random.default_rng(seed)
+
+    with rasterio.open(str(path), 'w', width=size, height=size, dtype='int16', nodata=-9999, **PROFILE) as ds:
+        for _, window in ds.block_windows():
+            rows, cols = numpy.mgrid[window.row_off:window.row_off + window.height,
+                                     window.col_off:window.col_off + window.width]
+            block = random.integers(0, 10000, size=(window.height, window.width), dtype=numpy.int16)
+            block[cols > rows + size // 3 + seed] = -9999
+            ds.write(block, 1, window=window)
+
+
+def legacy(raster_merge, band_files, windows, nodata):
+    """Reproduce the previous implementation of post processing."""
+    raster = None
+
+    for block in windows:
+        nodata_positions = []
+
+        row_offset = block.row_off + block.height
+        col_offset = block.col_off + block.width
+
+        for band_file in band_files:
+            with rasterio.open(str(band_file)) as ds:
+                raster = ds.read(1, window=block)
+
+            nodata_found = numpy.where(raster == -9999)
+            raster_nodata_pos = numpy.ravel_multi_index(nodata_found, raster.shape)
+            nodata_positions = numpy.union1d(nodata_positions, raster_nodata_pos)
+
+        if len(nodata_positions):
+            raster_merge[block.row_off: row_offset, block.col_off: col_offset][
+                numpy.unravel_index(nodata_positions.astype(numpy.int64), raster.shape)] = nodata
+
+    return raster_merge
+
+
+@click.command()
+@click.option('--size', type=int, default=10980, help='Raster width/height in pixels.')
+@click.option('--bands', type=int, default=6, help='Number of spectral bands.')
+@click.option('--workers', type=int, multiple=True, default=(1, 4))
+@click.option('--skip-legacy', is_flag=True, default=False)
+def main(size, bands, workers, skip_legacy):
+    """Run the post processing benchmark."""
+    with TemporaryDirectory() as tmp:
+        band_files = [Path(tmp) / f'B{idx}.tif' for idx in range(bands)]
+        for idx, band_file in enumerate(band_files):
+            create_band(band_file, size, seed=idx)
+
+        with rasterio.open(str(band_files[0])) as ds:
+            windows = [window for _, window in ds.block_windows()]
+            transform = ds.transform
+
+        quality = numpy.zeros((size, size), dtype=numpy.uint8)
+
+        expected = None
+        legacy_elapsed = None
+
+        if not skip_legacy:
+            start = time.perf_counter()
+            expected = legacy(quality.copy(), band_files, windows, nodata=255)
+            legacy_elapsed = time.perf_counter() - start
+            click.echo(f'legacy: {legacy_elapsed:.2f}s')
+
+        for value in workers:
+            start = time.perf_counter()
+            result = mask_nodata_blocks(quality.copy(), transform, band_files, windows, nodata=255, workers=value)
+            elapsed = time.perf_counter() - start
+
+            message = f'mask_nodata_blocks(workers={value}): {elapsed:.2f}s'
+            if expected is not None:
+                assert numpy.array_equal(result, expected), 'Results differ from legacy implementation'
+                message += f' speedup={legacy_elapsed / elapsed:.1f}x'
+
+            click.echo(message)
+
+
+if __name__ == '__main__':
+    main()
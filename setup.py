@@ -40,6 +40,7 @@ tests_require = [
     'pytest-cov>=2.8',
     'pytest-pep8>=1.0',
     'isort>4.3',
+    'fakeredis>=1.0',
 ]
 
 extras_require = {
@@ -50,6 +51,12 @@ extras_require = {
     ],
     'amqp': [
         'amqp>=5.0',
+    ],
+    'numexpr': [
+        'numexpr>=2.7',
+    ],
+    'parquet': [
+        'pyarrow>=6',
     ]
 }
 
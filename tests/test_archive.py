@@ -0,0 +1,60 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder selective archive extraction."""
+
+import tarfile
+from zipfile import ZipFile
+
+from bdc_collection_builder.collections.archive import ArchiveIndex
+
+
+def test_extract_tar_single_pass(tmp_path):
+    """Test that the tar members are indexed while extracting the selected members."""
+    scene = tmp_path / 'scene'
+    scene.mkdir()
+
+    for name in ('LC08_B2.TIF', 'LC08_B3.TIF', 'LC08_MTL.txt'):
+        (scene / name).write_bytes(name.encode())
+
+    file_path = tmp_path / 'scene.tar.gz'
+    with tarfile.open(str(file_path), 'w:gz') as archive:
+        archive.add(str(scene), arcname='scene')
+
+    index = ArchiveIndex(str(file_path))
+    extracted = index.extract_matching(lambda member: member.endswith(('_B2.TIF', '_MTL.txt')), tmp_path / 'out')
+
+    assert sorted(extracted) == ['scene/LC08_B2.TIF', 'scene/LC08_MTL.txt']
+    assert extracted['scene/LC08_B2.TIF'].read_bytes() == b'LC08_B2.TIF'
+    assert not (tmp_path / 'out' / 'scene' / 'LC08_B3.TIF').exists()
+    # The index is available without reading the archive again
+    file_path.unlink()
+    assert sorted(index.members) == ['scene/LC08_B2.TIF', 'scene/LC08_B3.TIF', 'scene/LC08_MTL.txt']
+    assert index.find('*_B3.TIF') == 'scene/LC08_B3.TIF'
+
+
+def test_extract_zip_sanitized_name(tmp_path):
+    """Test that the extracted path is the file written by zip, not the raw member name."""
+    file_path = tmp_path / 'scene.zip'
+    with ZipFile(str(file_path), 'w') as archive:
+        archive.writestr('../MTD_MSIL1C.xml', b'<xml/>')
+
+    extracted = ArchiveIndex(str(file_path)).extract(['../MTD_MSIL1C.xml'], tmp_path / 'out')
+
+    assert extracted['../MTD_MSIL1C.xml'] == tmp_path / 'out' / 'MTD_MSIL1C.xml'
+    assert extracted['../MTD_MSIL1C.xml'].read_bytes() == b'<xml/>'
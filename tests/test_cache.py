@@ -0,0 +1,155 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder provider search cache."""
+
+import time
+from collections import namedtuple
+
+import fakeredis
+import pytest
+
+from bdc_collection_builder.collections import cache as cache_module
+from bdc_collection_builder.collections.cache import (MemoryCacheBackend, RedisCacheBackend, SearchCache,
+                                                      get_provider_cache, invalidate_provider_cache,
+                                                      provider_key, search_key)
+from bdc_collection_builder.collections.search import SearchExecutor, SearchQuery
+from bdc_collection_builder.config import Config
+
+Scene = namedtuple('Scene', ('scene_id', 'cloud_cover', 'link'))
+
+
+class CountingProvider:
+    """Count the calls to the provider search."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def search(self, query, tile, **kwargs):
+        self.calls += 1
+        return [Scene(f'{query}_{tile}', 0, '')]
+
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    """Create a search cache for each backend."""
+    if request.param == 'redis':
+        backend = RedisCacheBackend(fakeredis.FakeStrictRedis(), max_entries=3)
+    else:
+        backend = MemoryCacheBackend(max_entries=3)
+
+    return SearchCache(backend, ttl=60, provider_ttl=dict(MODIS=5))
+
+
+def test_search_key():
+    """Test that equivalent searches generate the same key."""
+    geom = dict(type='Polygon', coordinates=[[[-54, -12], [-53, -12], [-53, -11], [-54, -12]]])
+
+    assert search_key('USGS', 'LC8', geom=geom, start_date='2020-01-01', cloud_cover=100) == \
+        search_key('USGS', 'LC8', cloud_cover=100.0, start_date='2020-01-01T00:00:00', geom=geom)
+    assert search_key('USGS', 'LC8', tile='220069') != search_key('USGS', 'LC8', tile='220070')
+    assert search_key('USGS', 'LC8', tile='220069').startswith('search:USGS:LC8:')
+
+
+def test_search_cache(cache):
+    """Test the cache reads, size bound and invalidation."""
+    keys = [cache.key('USGS', 'LC8', tile=str(tile)) for tile in range(4)]
+
+    assert cache.get_many(keys) == [None] * 4
+    assert cache.get_ttl('MODIS') == 5 and cache.get_ttl('USGS') == 60
+
+    cache.set_many({key: [Scene(f'LC8_{idx}', idx, '')] for idx, key in enumerate(keys)}, provider='USGS')
+
+    # Bounded to 3 entries
+    assert len([value for value in cache.get_many(keys) if value is not None]) == 3
+
+    cache.set(cache.key('ESA', 'S2', tile='23LLF'), [Scene('S2A', 12.5, 'https://scihub/S2A')], provider='ESA')
+
+    assert cache.invalidate(provider='USGS') >= 1
+    assert all(value is None for value in cache.get_many(keys))
+
+    scene, = cache.get(cache.key('ESA', 'S2', tile='23LLF'))
+    assert (scene.scene_id, scene.cloud_cover, scene.link) == ('S2A', 12.5, 'https://scihub/S2A')
+
+
+def test_redis_cache_index_ttl(monkeypatch):
+    """Test that a short lived entry does not remove the index of the longer ones."""
+    client = fakeredis.FakeStrictRedis()
+    cache = SearchCache(RedisCacheBackend(client), ttl=3600, provider_ttl=dict(MODIS=1))
+
+    key = cache.key('USGS', 'LC8', tile='220069')
+    cache.set(key, [Scene('LC8', 0, '')], provider='USGS')
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 60)
+
+    cache.set(cache.key('MODIS', 'MOD13Q1', tile='h13v10'), [Scene('MOD13Q1', 0, '')], provider='MODIS')
+
+    assert client.zscore(cache.backend.index_key, key) is not None
+    assert cache.invalidate(provider='USGS') == 1
+    assert client.zscore(cache.backend.index_key, key) is None
+
+
+def test_search_executor_cache(cache):
+    """Test that the executor only searches the missing queries."""
+    provider = CountingProvider()
+    executor = SearchExecutor(max_workers=2, cache=cache)
+    queries = [SearchQuery(tile, dict(query='LC8', tile=tile)) for tile in ('220069', '220070')]
+
+    first = executor.search(provider, queries, provider_name='USGS')
+    assert provider.calls == 2
+
+    second = executor.search(provider, queries + [SearchQuery('220071', dict(query='LC8', tile='220071'))],
+                             provider_name='USGS')
+
+    assert provider.calls == 3
+    assert [s.scene_id for s in second.scenes] == [s.scene_id for s in first.scenes] + ['LC8_220071']
+
+
+def test_provider_cache(monkeypatch):
+    """Test the provider keys, the invalidation and the disabled provider cache."""
+    client = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(cache_module, 'get_redis_connection', lambda: client)
+    monkeypatch.setattr(cache_module, '_provider_version_checked', float('-inf'))
+    monkeypatch.setattr(Config, 'PROVIDER_CACHE_VERSION_INTERVAL', 60)
+
+    credentials = dict(username='user', password='secret')
+    key = provider_key('collector', 'SciHub', credentials=credentials, lazy=True)
+
+    assert 'secret' not in key and key.startswith('provider:collector:SciHub:')
+    assert key != provider_key('collector', 'SciHub', credentials=dict(credentials, password='other'), lazy=True)
+
+    cache = get_provider_cache()
+    cache.set_many({key: object()}, {key: 60})
+
+    assert invalidate_provider_cache() >= 1
+    assert cache.get_many([key]) == [None]
+
+    # Invalidated by another process: only seen in the next version check
+    cache.set_many({key: object()}, {key: 60})
+    client.incr(cache_module.PROVIDER_VERSION_KEY)
+
+    assert get_provider_cache().get_many([key]) != [None]
+
+    monkeypatch.setattr(Config, 'PROVIDER_CACHE_VERSION_INTERVAL', 0)
+
+    assert get_provider_cache().get_many([key]) == [None]
+
+    monkeypatch.setattr(Config, 'PROVIDER_CACHE_TTL', 0)
+
+    assert get_provider_cache() is None and invalidate_provider_cache() == 0
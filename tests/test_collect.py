@@ -0,0 +1,95 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder download race between providers."""
+
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from bdc_collection_builder.collections.collect import DownloadRace
+
+ProviderInstance = namedtuple('ProviderInstance', ['id'])
+
+
+class FakeCollector:
+    """Simulate a data collector which takes ``delay`` seconds to download a scene."""
+
+    def __init__(self, provider_id: int, delay: float = 0, error: Exception = None):
+        """Create the fake collector."""
+        self.instance = ProviderInstance(provider_id)
+        self.provider_name = f'Fake{provider_id}'
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def download(self, scene_id, output, **kwargs):
+        """Write the scene file after the delay or raise the error."""
+        self.calls += 1
+        time.sleep(self.delay)
+
+        if self.error is not None:
+            raise self.error
+
+        file_path = Path(output) / f'{scene_id}.zip'
+        file_path.write_bytes(self.provider_name.encode())
+
+        return str(file_path)
+
+
+def _race(collectors, **options):
+    return DownloadRace(collectors, max_providers=len(collectors), validate=lambda path: True, **options)
+
+
+def test_download_race_winner(tmp_path):
+    """Test that the fastest provider wins and the loser is waited and cleaned."""
+    slow, fast = FakeCollector(1, delay=0.3), FakeCollector(2, delay=0.05)
+    race = _race([slow, fast], cancel_timeout=5)
+
+    collector, file_path = race.run('scene', str(tmp_path))
+
+    assert collector is fast and file_path.read_bytes() == b'Fake2'
+    # The loser finished before the race returns and its files are removed
+    assert slow.calls == 1 and len(race.stats) == 2
+    assert [entry.name for entry in tmp_path.iterdir()] == ['1_Fake2']
+
+
+def test_download_race_hedge(tmp_path):
+    """Test that the next provider only starts when the running one is late."""
+    first, second = FakeCollector(1, delay=0.05), FakeCollector(2)
+
+    collector, _ = _race([first, second], hedge_delay=1).run('scene', str(tmp_path))
+
+    assert collector is first and second.calls == 0
+
+    late, backup = FakeCollector(1, delay=0.5), FakeCollector(2)
+    race = _race([late, backup], hedge_delay=0.05, cancel_timeout=5)
+
+    collector, _ = race.run('scene', str(tmp_path / 'late'))
+
+    assert collector is backup and late.calls == 1
+    assert [stats['provider'] for stats in race.stats] == ['Fake2', 'Fake1']
+
+
+def test_download_race_all_fail(tmp_path):
+    """Test that the race has no winner when all providers fail."""
+    collectors = [FakeCollector(1, error=IOError('Offline')), FakeCollector(2, error=IOError('Not found'))]
+    race = _race(collectors)
+
+    assert race.run('scene', str(tmp_path)) == (None, None)
+    assert len(race.errors) == 2 and all(stats['status'] == 'FAILURE' for stats in race.stats)
@@ -0,0 +1,57 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder chunked task publishing."""
+
+from bdc_collection_builder.celery import utils
+
+
+class FakeGroup:
+    """Record the published groups instead of sending to the broker."""
+
+    published = []
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+
+    def apply_async(self):
+        self.published.append(len(self.tasks))
+
+
+def test_publish_in_chunks(monkeypatch):
+    """Test that the signatures are published in chunks and consumed lazily."""
+    monkeypatch.setattr(utils, 'group', FakeGroup)
+    FakeGroup.published = []
+
+    built = []
+
+    def _signatures():
+        for idx in range(1203):
+            built.append(idx)
+            # The generator must not run ahead of the published chunks
+            assert len(built) <= sum(FakeGroup.published) + 500
+            yield idx
+
+    queued = []
+
+    total = utils.publish_in_chunks(_signatures(), chunk_size=500, delay=0, on_publish=queued.append)
+
+    assert total == 1203
+    assert FakeGroup.published == [500, 500, 203]
+    assert queued == FakeGroup.published
+    assert utils.publish_in_chunks([], chunk_size=500, delay=0) == 0
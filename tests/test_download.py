@@ -0,0 +1,201 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder resumable downloads and staging area."""
+
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bdc_collection_builder.collections.download import (StagingArea,
+                                                         StagingLockError,
+                                                         resumable_download)
+
+PAYLOAD = os.urandom(512 * 1024)
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Serve the payload with Range support, dropping the connection in the middle of the first transfers."""
+
+    drops = 0
+    ranges = []
+    accept_ranges = True
+
+    def log_message(self, *args):
+        """Silent the server logs."""
+
+    def do_GET(self):
+        """Serve the payload."""
+        start = 0
+        range_header = self.headers.get('Range')
+        cls = type(self)
+
+        if range_header and cls.accept_ranges:
+            start = int(range_header.replace('bytes=', '').split('-')[0])
+            cls.ranges.append(start)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        else:
+            self.send_response(200)
+
+        self.send_header('Content-Length', str(len(PAYLOAD) - start))
+        self.send_header('ETag', '"payload"')
+        self.end_headers()
+
+        data = PAYLOAD[start:]
+
+        if cls.drops > 0:
+            cls.drops -= 1
+            # Drop the connection after a third of the remaining data
+            self.wfile.write(data[:len(data) // 3])
+            self.wfile.flush()
+            self.connection.close()
+            return
+
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server():
+    """Run the flaky HTTP server in background."""
+    FlakyHandler.drops = 2
+    FlakyHandler.ranges = []
+    FlakyHandler.accept_ranges = True
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    yield f'http://127.0.0.1:{httpd.server_address[1]}/scene.tar.gz'
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_resumable_download(server, tmp_path):
+    """Test that interrupted transfers are resumed with HTTP Range."""
+    target = resumable_download(server, str(tmp_path / 'scene.tar.gz'), retry_delay=0)
+
+    assert target.read_bytes() == PAYLOAD
+    assert len(FlakyHandler.ranges) == 2 and all(offset > 0 for offset in FlakyHandler.ranges)
+    assert not (tmp_path / 'scene.tar.gz.part').exists()
+
+
+def test_resumable_download_between_calls(server, tmp_path):
+    """Test that a new call (task retry) continues from the partial file."""
+    target = tmp_path / 'scene.tar.gz'
+
+    with pytest.raises(requests.exceptions.RequestException):
+        resumable_download(server, str(target), max_retries=0)
+
+    partial = tmp_path / 'scene.tar.gz.part'
+    partial_size = partial.stat().st_size
+    assert 0 < partial_size < len(PAYLOAD)
+
+    resumable_download(server, str(target), retry_delay=0)
+
+    assert target.read_bytes() == PAYLOAD
+    assert FlakyHandler.ranges[0] == partial_size
+
+
+def test_resumable_download_without_range_support(server, tmp_path):
+    """Test that the download restarts from the first byte when the server ignores Range."""
+    FlakyHandler.accept_ranges = False
+
+    target = resumable_download(server, str(tmp_path / 'scene.tar.gz'), retry_delay=0)
+
+    assert target.read_bytes() == PAYLOAD
+
+
+class OfflineError(Exception):
+    """Simulate a retried error."""
+
+
+def test_staging_area(tmp_path):
+    """Test that the staging area is kept on retried failures and removed on success."""
+    with pytest.raises(OfflineError):
+        with StagingArea('scene', 1, base_dir=str(tmp_path), retry_errors=(OfflineError,)) as staging:
+            (staging.path / 'scene.zip').write_bytes(b'complete')
+            staging.complete(staging.path / 'scene.zip')
+            (staging.path / 'scene.zip.incomplete').write_bytes(b'partial')
+            raise OfflineError('Connection lost')
+
+    assert staging.progress['in_progress'] == ['scene.zip.incomplete']
+
+    assert staging.path == tmp_path / '1' / 'scene'
+
+    # The other collections do not share the staged files
+    with StagingArea('scene', 2, base_dir=str(tmp_path)) as other:
+        assert other.progress['attempts'] == 1 and other.staged_bytes() == 0
+
+    validate = lambda path: False  # noqa: E731
+
+    with StagingArea('scene', 1, base_dir=str(tmp_path), validate=validate) as staging:
+        assert staging.progress['attempts'] == 2
+        assert staging.progress['staged_bytes'] == len(b'complete') + len(b'partial')
+        # The invalid completed file is discarded and the file in progress is kept to be resumed
+        assert [entry.name for entry in staging.staged_files()] == ['scene.zip.incomplete']
+
+    assert not staging.path.exists() and not staging.lock_file.exists()
+
+
+def test_staging_area_final_failure(tmp_path):
+    """Test that the staged files are removed when the error is not retried."""
+    with pytest.raises(RuntimeError):
+        with StagingArea('scene', 1, base_dir=str(tmp_path), retry_errors=(OfflineError,)) as staging:
+            (staging.path / 'scene.zip').write_bytes(b'partial')
+            raise RuntimeError('Scene not found')
+
+    assert not staging.path.exists()
+
+
+def test_staging_area_lock(tmp_path):
+    """Test that the concurrent tasks of the same scene do not use the staging area at the same time."""
+    events = []
+
+    def _download(name):
+        with StagingArea('scene', 1, base_dir=str(tmp_path)):
+            events.append(f'{name}-start')
+            time.sleep(0.1)
+            events.append(f'{name}-end')
+
+    threads = [threading.Thread(target=_download, args=(name,)) for name in ('a', 'b')]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert events[0][0] == events[1][0] and events[2][0] == events[3][0]
+
+
+def test_staging_area_lock_timeout(tmp_path):
+    """Test that a task does not wait forever for a staging area held by another task."""
+    with StagingArea('scene', 1, base_dir=str(tmp_path)):
+        start = time.monotonic()
+
+        with pytest.raises(StagingLockError):
+            with StagingArea('scene', 1, base_dir=str(tmp_path), lock_timeout=0.3):
+                pass
+
+        assert 0.3 <= time.monotonic() - start < 5
@@ -0,0 +1,76 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder archive integrity verification."""
+
+import io
+import os
+import tarfile
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import pytest
+
+from bdc_collection_builder.collections import integrity
+from bdc_collection_builder.config import Config
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Isolate the fingerprint cache directory."""
+    monkeypatch.setattr(Config, 'INTEGRITY_CACHE_DIR', str(tmp_path / '.integrity'))
+
+
+def _create_zip(path):
+    with ZipFile(str(path), 'w', compression=ZIP_DEFLATED) as archive:
+        for idx in range(4):
+            archive.writestr(f'scene/B0{idx}.tif', os.urandom(64 * 1024) * 4)
+
+
+def _create_tar_gz(path):
+    with tarfile.open(str(path), 'w:gz') as archive:
+        data = os.urandom(256 * 1024)
+        info = tarfile.TarInfo('scene_B1.TIF')
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+
+
+def _corrupt(path):
+    with open(str(path), 'r+b') as fd:
+        fd.seek(os.path.getsize(str(path)) // 2)
+        fd.write(b'\x00' * 1024)
+
+
+@pytest.mark.parametrize('name,factory', [('scene.zip', _create_zip), ('scene.tar.gz', _create_tar_gz)])
+def test_verify_archive(tmp_path, name, factory):
+    """Test the archive verification and the fingerprint cache."""
+    archive = tmp_path / name
+    factory(archive)
+
+    assert integrity.get_fingerprint(str(archive)) is None
+    assert integrity.verify_archive(str(archive), workers=2)
+    assert integrity.get_fingerprint(str(archive))['size'] == archive.stat().st_size
+
+    verified = archive.stat()
+    _corrupt(archive)
+    # Ensure the modification time changes, whatever the file system timestamp resolution
+    os.utime(str(archive), ns=(verified.st_atime_ns, verified.st_mtime_ns + 1_000_000_000))
+
+    # File changed since verification: the fingerprint must not be reused
+    assert integrity.get_fingerprint(str(archive)) is None
+    assert not integrity.verify_archive(str(archive), workers=2)
+    assert integrity.get_fingerprint(str(archive)) is None
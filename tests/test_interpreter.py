@@ -0,0 +1,75 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder expression interpreter."""
+
+import numpy
+import pytest
+
+from bdc_collection_builder.interpreter import (CompiledExpression, compile_expression,
+                                                execute_expression, expression_stats)
+
+
+def _bands():
+    red = numpy.ma.masked_equal(numpy.array([[1, 2], [-9999, 4]], dtype=numpy.float32), -9999)
+    nir = numpy.ma.array(numpy.array([[3, 2], [5, 8]], dtype=numpy.float32))
+    return red, nir
+
+
+def test_compile_expression_cache():
+    """Test that the same expression text is compiled only once."""
+    expression = compile_expression('NDVI = (B8 - B4) / (B8 + B4)')
+
+    assert expression is compile_expression('NDVI = (B8 - B4) / (B8 + B4)')
+    assert expression.target == 'NDVI'
+    assert expression.names == {'B4', 'B8'}
+
+
+@pytest.mark.parametrize('expression', [
+    '__import__("os").system("ls")',
+    'B8.__class__',
+    'open("/etc/passwd")',
+    'a = 1; b = 2',
+    'lambda: 1',
+])
+def test_expression_not_allowed(expression):
+    """Test that only arithmetic expressions are compiled."""
+    with pytest.raises((ValueError, SyntaxError)):
+        CompiledExpression(expression)
+
+
+def test_evaluate_masked_arrays():
+    """Test the evaluation of masked arrays keeping the context unchanged."""
+    red, nir = _bands()
+    context = dict(B4=red, B8=nir)
+
+    result = compile_expression('(B8 - B4) / (B8 + B4)').evaluate(context)
+
+    assert set(context.keys()) == {'B4', 'B8'}
+    assert result.mask.tolist() == [[False, False], [True, False]]
+    numpy.testing.assert_allclose(result.compressed(), [.5, 0., 4. / 12.], rtol=1e-6)
+
+
+def test_execute_expression_functions():
+    """Test the allowed functions and the assignment in context."""
+    _, nir = _bands()
+
+    context = execute_expression('half = numpy.sqrt(B8) / 2', context=dict(B8=nir))
+
+    numpy.testing.assert_allclose(context['half'], numpy.sqrt(nir) / 2, rtol=1e-6)
+    assert expression_stats()['half = numpy.sqrt(B8) / 2']['calls'] >= 1
@@ -0,0 +1,73 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder asynchronous jobs."""
+
+import fakeredis
+
+from bdc_collection_builder.collections.jobs import FAILURE, PENDING, SUCCESS, CheckScenesJob
+
+
+def test_check_scenes_job():
+    """Test the job lifecycle and the streamed entries."""
+    client = fakeredis.FakeStrictRedis()
+
+    job = CheckScenesJob.create(dict(catalog='USGS', tiles=['220069', '220070']), client=client)
+    assert job.meta()['status'] == PENDING
+    assert job.meta()['params']['tiles'] == ['220069', '220070']
+
+    job.start(total=2)
+    job.push(dict(tile='220069', total=1, scenes=['LC08_220069']))
+
+    entries = list(job.stream())
+    assert [entry['type'] for entry in entries] == ['result', 'progress']
+    assert entries[1]['processed'] == 1 and entries[1]['total'] == 2
+
+    job.push(dict(tile='220070', total=0, scenes=[]))
+    job.finish(dict(total_external=1))
+
+    entries = list(job.stream(follow=True, poll_interval=0))
+    assert [entry['type'] for entry in entries] == ['result', 'result', 'progress', 'summary']
+    assert entries[2]['status'] == SUCCESS
+    assert entries[-1]['total_external'] == 1
+
+
+def test_check_scenes_job_timeout():
+    """Test that a job which does not finish (worker lost) ends the stream with timeout."""
+    client = fakeredis.FakeStrictRedis()
+
+    job = CheckScenesJob.create(dict(catalog='USGS', tiles=['220069']), client=client)
+    job.start(total=1)
+
+    entries = list(job.stream(follow=True, poll_interval=0.01, timeout=0.05))
+    assert [entry['type'] for entry in entries] == ['progress', 'timeout']
+    assert entries[-1]['status'] != SUCCESS
+
+
+def test_check_scenes_job_failure():
+    """Test the failed and the missing jobs."""
+    client = fakeredis.FakeStrictRedis()
+
+    job = CheckScenesJob.create(dict(), client=client)
+    job.fail('Collection not found')
+
+    entries = list(job.stream(follow=True, poll_interval=0))
+    assert entries[-1]['status'] == FAILURE and entries[-1]['error'] == 'Collection not found'
+
+    assert CheckScenesJob('unknown', client=client).meta() is None
+    assert list(CheckScenesJob('unknown', client=client).stream())[0]['type'] == 'error'
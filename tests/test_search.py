@@ -0,0 +1,106 @@
+#
+# This file is part of Brazil Data Cube Collection Builder.
+# Copyright (C) 2022 INPE.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.html>.
+#
+
+"""Unit-test for BDC-Collection-Builder provider search executor."""
+
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from bdc_collection_builder.collections.search import SearchExecutor, SearchQuery
+from bdc_collection_builder.config import Config
+
+Scene = namedtuple('Scene', ('scene_id', 'cloud_cover', 'link'))
+
+
+class FakeProvider:
+    """Simulate a slow data provider which fails for some tiles."""
+
+    def __init__(self, fail=()):
+        self.fail = fail
+        self.running = 0
+        self.max_running = 0
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def search(self, query, tile, **kwargs):
+        with self._lock:
+            self.calls.append(tile)
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+
+        time.sleep(0.05)
+
+        with self._lock:
+            self.running -= 1
+
+        if tile in self.fail:
+            raise RuntimeError(f'Tile {tile} unavailable')
+
+        # Neighbour tiles share the scenes in the overlap
+        return [Scene(f'S2_{tile}', 10, ''), Scene('S2_OVERLAP', 10, '')]
+
+
+def _queries(tiles):
+    return [SearchQuery(tile, dict(query='S2_L1C', tile=tile)) for tile in tiles]
+
+
+def test_search_executor(monkeypatch):
+    """Test the merge, the de-duplication and the partial failures of the search."""
+    monkeypatch.setattr(Config, 'SEARCH_PROVIDER_CONCURRENCY', 3)
+
+    provider = FakeProvider(fail=('T3',))
+    tiles = [f'T{idx}' for idx in range(10)]
+
+    result = SearchExecutor(max_workers=8).search(provider, _queries(tiles), provider_name='test-executor')
+
+    assert [scene.scene_id for scene in result.scenes] == \
+        ['S2_T0', 'S2_OVERLAP'] + [f'S2_{tile}' for tile in tiles[1:] if tile != 'T3']
+    assert result.errors == [dict(query='T3', error='Tile T3 unavailable')]
+    assert not result.failed
+    assert provider.max_running <= 3
+
+
+def test_search_executor_all_failed():
+    """Test that the search raises when every query fails."""
+    provider = FakeProvider(fail=('T1', 'T2'))
+
+    with pytest.raises(RuntimeError):
+        SearchExecutor().search(provider, _queries(['T1', 'T2']), provider_name='test-failure')
+
+    result = SearchExecutor().search(provider, _queries(['T1', 'T2']), provider_name='test-failure',
+                                     raise_all_failed=False)
+    assert result.failed and result.scenes == []
+
+
+def test_iter_search_bounded():
+    """Test that the executor does not run ahead of a slow consumer."""
+    provider = FakeProvider()
+    tiles = [f'T{idx}' for idx in range(40)]
+
+    iterator = SearchExecutor(max_workers=2).iter_search(provider, _queries(tiles), provider_name='test-bounded')
+
+    next(iterator)
+    time.sleep(0.3)
+
+    # Only the submitted window (2 * max_workers) runs while the consumer is waiting
+    assert len(provider.calls) <= 5
+
+    assert len(list(iterator)) == len(tiles) - 1